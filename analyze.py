@@ -1,5 +1,6 @@
 import logging
 import json
+import os
 
 from typing import List, Dict, Set
 from dataclasses import dataclass, asdict
@@ -251,3 +252,39 @@ def recommend_tests_for_optimization(test_results: Dict) -> Set[str]:
     if smaller == len(up_to_cutoff):
         return up_to_cutoff
     return rest_of_tests
+
+
+def compare_test_results(before: Dict, after: Dict, noise_profile=None) -> List[Dict]:
+    """
+    Lines up the tests of two runs -- by path within their project, so the runs can come from different
+    checkouts -- and returns how each one's average runtime and flake rate moved, biggest slowdown first.
+    Given a noise.NoiseProfile, each delta also gets the noise floor it has to clear to be significant
+    """
+
+    def by_relpath(test_results):
+        return {
+            os.path.relpath(r["test_path"], r["project_path"] or os.curdir): r
+            for r in test_results["tests"].values()
+        }
+
+    before, after = by_relpath(before), by_relpath(after)
+    changes = []
+    for test in before.keys() & after.keys():
+        old, new = before[test], after[test]
+        delta = new["avg_runtime"] - old["avg_runtime"]
+        floor = (
+            noise_profile.floor_ms(old["avg_runtime"], new["avg_runtime"]) if noise_profile else 0.0
+        )
+        changes.append(
+            {
+                "test": test,
+                "before_ms": old["avg_runtime"],
+                "after_ms": new["avg_runtime"],
+                "delta_ms": delta,
+                "noise_floor_ms": floor,
+                "significant": abs(delta) > floor,
+                "before_flake_rate": old["flake_rate"],
+                "after_flake_rate": new["flake_rate"],
+            }
+        )
+    return sorted(changes, key=lambda c: c["delta_ms"], reverse=True)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Times each stage of the bubblewrap pipeline against a generated project, reporting throughput and
+peak memory, so we notice when the tool itself gets slower.
+
+example invocation, from the bubblewrap root:
+
+python -m benchmarks.bench --app-modules 2000 --test-files 500 --fanout 8 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+from typing import Callable, List
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+
+import run
+import collect
+import summarize
+import analyze
+
+from benchmarks.synthetic import SyntheticProject
+
+logger = logging.getLogger(__name__)
+
+EXCLUDE = [".git", "__pycache__", "__venv__", "env"]
+
+
+"""
+Represents the timing of one pipeline stage -- best wall time over the repeats, and the peak
+traced memory of a separate run, since tracing slows everything down
+"""
+
+
+@dataclass
+class StageResult:
+    stage: str
+    items: int
+    seconds: float
+    items_per_second: float
+    peak_memory_kb: float
+
+
+@contextmanager
+def simulated_trials(project: SyntheticProject, seed: int = 0):
+    """
+    swaps pytest out of Test._test for the project's simulated outcomes, so timing run_tests
+    measures bubblewrap's own scheduling and bookkeeping rather than the tests
+    """
+    rng = random.Random(seed)
+    original = run.Test._test
+
+    def _test(self, test_dir):
+        runtime, fail_probability = project.tests[self.test_path]
+        return rng.random() >= fail_probability, runtime, []
+
+    run.Test._test = _test
+    try:
+        yield
+    finally:
+        run.Test._test = original
+
+
+def measure(stage: str, items: int, fn: Callable, repeats: int) -> (StageResult, object):
+    best, output = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = StageResult(
+        stage=stage,
+        items=items,
+        seconds=best,
+        items_per_second=items / best if best else float("inf"),
+        peak_memory_kb=peak / 1024,
+    )
+    logger.info(
+        f"{stage:<42} {items:>8} items {best * 1000:>10.2f} ms "
+        f"{result.items_per_second:>12.0f} items/s {result.peak_memory_kb:>10.0f} KiB peak"
+    )
+    return result, output
+
+
+def run_benchmarks(project: SyntheticProject, trials: int, repeats: int) -> List[StageResult]:
+    """
+    runs the pipeline stage by stage, feeding each stage the real output of the one before it
+    """
+    results = []
+    root = project.root
+
+    result, all_files = measure(
+        "collect.walk_tree",
+        project.app_modules + project.test_files,
+        lambda: collect.walk_tree(root, EXCLUDE),
+        repeats,
+    )
+    results.append(result)
+
+    tests = collect.filter_tests(all_files)
+    app_modules = collect.convert_app_paths_to_modules(set(all_files) - set(tests))
+    result, module_map = measure(
+        "collect.ImportParser.run",
+        len(tests),
+        lambda: collect.ImportParser(tests=tests, app_modules=app_modules, module_map={}).run(),
+        repeats,
+    )
+    results.append(result)
+
+    with simulated_trials(project):
+        result, test_results = measure(
+            "run.run_tests (scheduling overhead)",
+            len(tests) * trials,
+            lambda: run.run_tests(root, trials, tests),
+            repeats,
+        )
+    results.append(result)
+
+    result, _ = measure(
+        "summarize.summarize_module_test_results",
+        sum(len(t) for t in module_map.values()),
+        lambda: summarize.summarize_module_test_results(module_map, test_results),
+        repeats,
+    )
+    results.append(result)
+
+    # find_slowest_modules reshapes the collection it's handed, so each repeat gets a fresh one
+    result, _ = measure(
+        "analyze.find_slowest_modules",
+        len(module_map),
+        lambda: analyze.find_slowest_modules(
+            summarize.summarize_module_test_results(module_map, test_results)
+        ),
+        repeats,
+    )
+    results.append(result)
+
+    result, _ = measure(
+        "analyze.recommend_tests_for_optimization",
+        len(tests),
+        lambda: analyze.recommend_tests_for_optimization(test_results),
+        repeats,
+    )
+    results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser("benchmark bubblewrap against a synthetic project")
+    parser.add_argument("--app-modules", type=int, default=200, help="app modules to generate")
+    parser.add_argument("--test-files", type=int, default=100, help="test files to generate")
+    parser.add_argument("--fanout", type=int, default=5, help="app modules imported per test")
+    parser.add_argument("--min-runtime", type=float, default=1.0, help="fastest test, in ms")
+    parser.add_argument("--max-runtime", type=float, default=20.0, help="slowest test, in ms")
+    parser.add_argument("--flake-probability", type=float, default=0.1, help="share of flaky tests")
+    parser.add_argument("--trials", type=int, default=3, help="simulated trials per test")
+    parser.add_argument("--repeats", type=int, default=3, help="timed repeats per stage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="write the stage results to this file")
+    args = parser.parse_args()
+
+    # keep the pipeline's own progress logging out of the results table
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logger.setLevel(logging.INFO)
+    # the recommendation search recurses once per test
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), args.test_files * 4))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        project = SyntheticProject(
+            root=os.path.join(tmp, "synthetic"),
+            app_modules=args.app_modules,
+            test_files=args.test_files,
+            fanout=args.fanout,
+            min_runtime_ms=args.min_runtime,
+            max_runtime_ms=args.max_runtime,
+            flake_probability=args.flake_probability,
+            seed=args.seed,
+        ).generate()
+        results = run_benchmarks(project, args.trials, args.repeats)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Generates synthetic projects for benchmarking bubblewrap itself: N app modules, M test files that
+each import a handful of them, and tests that take a simulated runtime and flake with a given
+probability
+"""
+
+import os
+import random
+
+from typing import Dict
+from dataclasses import dataclass, field
+
+"""
+Represents the knobs for a generated project, plus what was actually generated -- the simulated
+runtime and flake probability of every test file -- so benchmarks can stand in for pytest
+"""
+
+
+@dataclass
+class SyntheticProject:
+    root: str
+    app_modules: int = 100
+    test_files: int = 50
+    fanout: int = 5  # app modules imported by each test file
+    min_runtime_ms: float = 1.0
+    max_runtime_ms: float = 20.0
+    flake_probability: float = 0.1  # chance that any one test file is flaky at all
+    seed: int = 0
+    tests: Dict = field(default_factory=dict)  # Dict{test_path: (runtime_ms, fail_probability)}
+
+    @property
+    def package(self) -> str:
+        return os.path.basename(os.path.normpath(self.root))
+
+    def generate(self) -> "SyntheticProject":
+        rng = random.Random(self.seed)
+        app_dir = os.path.join(self.root, "app")
+        test_dir = os.path.join(self.root, "tests")
+        os.makedirs(app_dir, exist_ok=True)
+        os.makedirs(test_dir, exist_ok=True)
+
+        modules = [f"module_{i}" for i in range(self.app_modules)]
+        for i, module in enumerate(modules):
+            # app modules import a couple of their neighbors, like real code does
+            imports = rng.sample(modules[:i], min(i, 2))
+            with open(os.path.join(app_dir, f"{module}.py"), "w") as f:
+                for imported in imports:
+                    f.write(f"from {self.package}.app import {imported}\n")
+                f.write(f"\n\ndef hello():\n    return {i}\n")
+
+        for j in range(self.test_files):
+            imports = rng.sample(modules, min(self.fanout, len(modules)))
+            runtime = rng.uniform(self.min_runtime_ms, self.max_runtime_ms)
+            fail_probability = rng.uniform(0.1, 0.5) if rng.random() < self.flake_probability else 0
+            test_path = os.path.join(test_dir, f"test_{j}.py")
+            with open(test_path, "w") as f:
+                f.write("import time\nimport random\n\n")
+                for imported in imports:
+                    f.write(f"from {self.package}.app import {imported}\n")
+                f.write(
+                    "\n\ndef test_synthetic():\n"
+                    f"    time.sleep({runtime / 1000!r})\n"
+                    f"    assert random.random() >= {fail_probability!r}\n"
+                )
+            self.tests[test_path] = (runtime, fail_probability)
+        return self
+
+
+def generate_project(root: str, **knobs) -> SyntheticProject:
+    """
+    writes a synthetic project to root and returns its description
+    """
+    return SyntheticProject(root=root, **knobs).generate()
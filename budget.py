@@ -0,0 +1,180 @@
+"""
+Time-budgeted runs: instead of the same number of trials for every test, as many trials as fit in a
+time budget, handed out where they tell us the most. What we're estimating is each test's flake
+rate, and how well we know it is the width of its Wilson score interval -- so every trial goes to
+the test whose interval it's expected to narrow the most per millisecond it costs. Cheap tests and
+tests that flake (whose rate is the most uncertain) get more trials, expensive stable ones fewer.
+Trials are handed out a round at a time, each round with a share of the budget that's left, so the
+flakes one round turns up steer the next.
+
+A test's flake rate is estimated from its trials in this run and, when there's a --store, its
+recent history; its cost from its trials in this run, or its history before it has any.
+"""
+
+import os
+import re
+import math
+import heapq
+import logging
+
+from typing import Dict, Tuple
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+Z = 1.96  # 95% confidence
+HISTORY_RUNS = 20  # stored runs to pool flake rates and runtimes over
+# the most trials a test's history counts for in its flake rate estimate, so a long stable history
+# can't talk us out of looking at a test that just started flaking
+PRIOR_TRIALS = 20
+# the share of the budget left after the first trials that's handed out -- the rest covers what
+# we spend between trials and misjudged runtimes
+BUDGET_HEADROOM = 0.9
+# the share of what's left of the budget each round of trials gets, so later rounds can go where
+# the earlier ones turned up flakes
+ROUND_SHARE = 0.5
+MIN_COST_MS = 1.0
+MAX_TRIALS = 10000  # per test
+
+DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*$")
+SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(spec: str) -> float:
+    """
+    seconds in a duration like 90, 90s, 15m or 1.5h
+    """
+    match = DURATION.match(spec)
+    if not match:
+        raise ValueError(f"{spec!r} isn't a duration like 90s, 15m or 1.5h")
+    amount, unit = match.groups()
+    return float(amount) * SECONDS[unit]
+
+
+def expected_width(rate: float, trials: int, z: float = Z) -> float:
+    """
+    the width of the Wilson interval we'd expect after trials trials of a test flaking at rate
+    """
+    if not trials:
+        return 1.0
+    spread = math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    return 2 * z * spread / (1 + z * z / trials)
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z) -> Tuple[float, float]:
+    """
+    the Wilson score interval for a rate seen successes times in trials -- unlike the textbook
+    p +- z * stderr, it stays inside [0, 1] and doesn't collapse to nothing at 0 of n
+    """
+    if not trials:
+        return 0.0, 1.0
+    p = successes / trials
+    center = (p + z * z / (2 * trials)) / (1 + z * z / trials)
+    half = expected_width(p, trials, z) / 2
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+"""
+Represents what we know about a test when handing out trials: its trials and flakes so far in this
+run, and its pooled history, if any
+"""
+
+
+@dataclass
+class Estimate:
+    runtime_ms: float  # what one more trial is expected to take
+    trials: int = 0
+    flakes: int = 0
+    history_trials: int = 0
+    history_flakes: int = 0
+
+    @property
+    def flake_rate(self) -> float:
+        """
+        this run's flake rate, shrunk towards the history's (at most PRIOR_TRIALS of it) and,
+        without either, towards 1/2
+        """
+        weight = min(1.0, PRIOR_TRIALS / self.history_trials) if self.history_trials else 0.0
+        flakes = self.flakes + weight * self.history_flakes + 0.5
+        trials = self.trials + weight * self.history_trials + 1
+        return flakes / trials
+
+    def gain_per_ms(self, trials: int) -> float:
+        """
+        how much one trial more than trials is expected to narrow the interval, per ms it costs
+        """
+        rate = self.flake_rate
+        gain = expected_width(rate, trials) - expected_width(rate, trials + 1)
+        return gain / max(self.runtime_ms, MIN_COST_MS)
+
+
+def allocate(estimates: Dict[str, Estimate], budget_ms: float) -> Dict[str, int]:
+    """
+    the trials to add to each test so their expected runtime fits budget_ms, greedily giving each
+    next trial to the test it's worth the most to, per ms
+    """
+    added = {test: 0 for test in estimates}
+    heap = [(-estimate.gain_per_ms(estimate.trials), test) for test, estimate in estimates.items()]
+    heapq.heapify(heap)
+    while heap:
+        _, test = heapq.heappop(heap)
+        estimate = estimates[test]
+        cost = max(estimate.runtime_ms, MIN_COST_MS)
+        if cost > budget_ms:
+            continue  # there's no affording this one any more, but cheaper ones may still fit
+        budget_ms -= cost
+        added[test] += 1
+        trials = estimate.trials + added[test]
+        if trials < MAX_TRIALS:
+            heapq.heappush(heap, (-estimate.gain_per_ms(trials), test))
+    return added
+
+
+def estimates_for(
+    path: str, tests: Dict, history: Dict[str, Tuple[int, int, float]]
+) -> Dict[str, Estimate]:
+    """
+    an Estimate for each of the run.Tests in tests, Dict{test path: Test}, given their history as
+    store.ResultsStore.test_stats gives it
+    """
+    estimates = {}
+    for test_path, test in tests.items():
+        key = os.path.relpath(test_path, path)
+        history_trials, history_flakes, history_runtime = history.get(key, (0, 0, 0.0))
+        trials = len(test.history)
+        estimates[test_path] = Estimate(
+            runtime_ms=test.runtime_sum / trials if trials else history_runtime,
+            trials=trials,
+            flakes=_flakes(test.passes, trials),
+            history_trials=history_trials,
+            history_flakes=history_flakes,
+        )
+    return estimates
+
+
+def _flakes(passes: int, trials: int) -> int:
+    """
+    the trials that went against what should have happened, as run.Test._calculate counts them
+    """
+    if trials and passes / trials >= 0.75:
+        return trials - passes
+    return passes
+
+
+def log_confidence(test_results: Dict, spent_s: float, budget_s: float, top_n: int = 10):
+    tests = sorted(
+        test_results["tests"].values(),
+        key=lambda result: result["flake_rate_interval"][1] - result["flake_rate_interval"][0],
+        reverse=True,
+    )
+    trials = sum(result["trials"] for result in tests)
+    logger.info(
+        f"Ran {trials} trial(s) of {len(tests)} test(s) in {spent_s:.0f}s of a {budget_s:.0f}s "
+        "budget. The flake rates we're least sure of (95% confidence):"
+    )
+    for result in tests[:top_n]:
+        low, high = result["flake_rate_interval"]
+        logger.info(
+            f"{result['test_path']}: {result['flakes']} flake(s) in {result['trials']} trial(s), "
+            f"flake rate {low:.1%} to {high:.1%}"
+        )
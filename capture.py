@@ -0,0 +1,217 @@
+"""
+Output capture for trials, at the file descriptor level so the output of subprocesses and C
+extensions is caught along with Python's. Each test gets one temporary file that its trials' stdout
+and stderr are redirected into, rewound between trials. The file is a ring buffer of sorts: while a
+trial runs, whenever it's grown past MAX_TRIAL_BYTES, all but its last TAIL_BYTES are dropped, so
+a test flooding its output can't fill the disk. After a trial only the last TAIL_BYTES of its output
+are read back, and only kept at all if the trial failed or was one of the slowest of the run. Kept
+output stays in memory until there's SPILL_BYTES of it, then goes to gzipped files, so neither
+memory nor descriptors grow with the size of the suite while it runs. Without an output directory
+to keep the files in, they're read back into the results once the run's over, so no saved result
+points at a file that's gone.
+"""
+
+import os
+import sys
+import gzip
+import fcntl
+import heapq
+import shutil
+import logging
+import tempfile
+import threading
+
+from typing import Dict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TAIL_BYTES = 64 * 1024  # of each trial's output
+# the most a trial's output file grows to (give or take what's written in a CHECK_INTERVAL)
+MAX_TRIAL_BYTES = 16 * TAIL_BYTES
+CHECK_INTERVAL = 0.05  # seconds
+SPILL_BYTES = 1024 * 1024  # of kept output held in memory before it's written out
+MAX_FAILED = 3  # failing trials kept per test
+SLOWEST = 10  # slowest trials kept across the run
+
+
+"""
+Redirects fds 1 and 2 (and sys.stdout and sys.stderr) into a temporary file for each trial
+"""
+
+
+class OutputCapture:
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        # every writer (subprocesses included) appends, so the file can be cut short under them
+        flags = fcntl.fcntl(self.file.fileno(), fcntl.F_GETFL)
+        fcntl.fcntl(self.file.fileno(), fcntl.F_SETFL, flags | os.O_APPEND)
+        # line buffered, so what's printed stays in order with what's written to the fds directly
+        self.stream = open(
+            self.file.fileno(),
+            "w",
+            encoding="utf-8",
+            errors="replace",
+            closefd=False,
+            buffering=1,
+        )
+        self.last = b""  # the tail of the last trial's output
+        self._carried = b""  # the tail of what the running trial wrote before its file was cut
+        self._dropped = 0  # bytes the running trial wrote that were cut
+
+    def close(self):
+        self.stream.close()
+        self.file.close()
+
+    @contextmanager
+    def trial(self):
+        fd = self.file.fileno()
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        self._carried, self._dropped = b"", 0
+        # anything of ours still buffered belongs on the terminal, not in the trial's output
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        saved = [os.dup(1), os.dup(2)]
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        sys.stdout = sys.stderr = self.stream
+        stop = threading.Event()
+        bounder = threading.Thread(target=self._bound, args=(fd, stop), daemon=True)
+        bounder.start()
+        try:
+            yield
+        finally:
+            self.stream.flush()
+            stop.set()
+            bounder.join()
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+            for target, copy in zip((1, 2), saved):
+                os.dup2(copy, target)
+                os.close(copy)
+            self.last = self._tail(fd)
+
+    def _bound(self, fd: int, stop: threading.Event):
+        """
+        keeps cutting the file back to its last TAIL_BYTES whenever it's past MAX_TRIAL_BYTES, until
+        the trial's over
+        """
+        while not stop.wait(CHECK_INTERVAL):
+            size = os.fstat(fd).st_size
+            if size > MAX_TRIAL_BYTES:
+                self._carried = os.pread(fd, TAIL_BYTES, size - TAIL_BYTES)
+                # whatever's written between reading the tail and here is lost, uncounted
+                os.ftruncate(fd, 0)
+                self._dropped += size - TAIL_BYTES
+
+    def _tail(self, fd: int) -> bytes:
+        size = os.fstat(fd).st_size
+        tail = self._carried + os.pread(fd, min(size, TAIL_BYTES), max(0, size - TAIL_BYTES))
+        dropped = self._dropped + max(0, size - TAIL_BYTES) + max(0, len(tail) - TAIL_BYTES)
+        tail = tail[-TAIL_BYTES:]
+        if dropped:
+            tail = f"[... {dropped} earlier bytes dropped ...]\n".encode() + tail
+        return tail
+
+
+"""
+Decides which trials' output is worth keeping, and keeps it -- in memory up to a point, then in
+gzipped files under directory (unless given, a temporary one that's gone once the store's closed)
+"""
+
+
+class OutputStore:
+    def __init__(self, directory: str = None, spill_bytes: int = SPILL_BYTES):
+        self.directory = directory
+        self.spill_bytes = spill_bytes
+        self.in_memory = []  # records whose text is still in memory
+        self.on_disk = []  # records whose text has been spilled
+        self.memory_bytes = 0  # roughly -- it's counted in characters
+        self.failed = {}  # Dict{test path: failing trials kept}
+        self.slowest = []  # min-heap of (runtime, sequence, test, record)
+        self.kept = 0
+        self._sequence = 0
+        self._temporary = False
+
+    def retain(self, test, trial: int, outcome: str, runtime: float, output: bytes):
+        """
+        keeps the output of a trial of test (a run.Test) in test.outputs if it's worth keeping
+        """
+        if outcome != "passed":  # run.PASSED
+            if self.failed.get(test.test_path, 0) >= MAX_FAILED:
+                return
+            self.failed[test.test_path] = self.failed.get(test.test_path, 0) + 1
+            self._keep(test, trial, outcome, runtime, "failed", output)
+            return
+
+        if len(self.slowest) >= SLOWEST:
+            if runtime <= self.slowest[0][0]:
+                return
+            _, _, faster, record = heapq.heappop(self.slowest)
+            self._drop(faster, record)
+        record = self._keep(test, trial, outcome, runtime, "slowest", output)
+        self._sequence += 1
+        heapq.heappush(self.slowest, (runtime, self._sequence, test, record))
+
+    def close(self):
+        """
+        writes out whatever's still in memory, if there's a directory to keep it in -- or, if the
+        directory is a temporary one, reads what's in it back into the records and removes it
+        """
+        if self._temporary:
+            self._unspill()
+        elif self.directory and self.in_memory:
+            self._spill()
+        if self.kept:
+            where = f" under {self.directory}" if self.directory else ""
+            logger.info(f"Kept the output of {self.kept} failing or slow trial(s){where}")
+
+    def _keep(self, test, trial, outcome, runtime, reason, output: bytes) -> Dict:
+        record = {
+            "trial": trial,
+            "outcome": outcome,
+            "runtime": runtime,
+            "reason": reason,
+            "text": output.decode("utf-8", errors="replace"),
+            "path": None,
+        }
+        test.outputs.append(record)
+        self.in_memory.append(record)
+        self.memory_bytes += len(record["text"])
+        self.kept += 1
+        if self.memory_bytes > self.spill_bytes:
+            self._spill()
+        return record
+
+    def _drop(self, test, record: Dict):
+        test.outputs.remove(record)
+        self.kept -= 1
+        if record["path"]:
+            os.remove(record["path"])
+            self.on_disk.remove(record)
+        else:
+            self.in_memory.remove(record)
+            self.memory_bytes -= len(record["text"])
+
+    def _spill(self):
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="bubblewrap-output-")
+            self._temporary = True
+        os.makedirs(self.directory, exist_ok=True)
+        for record in self.in_memory:
+            self._sequence += 1
+            path = os.path.join(self.directory, f"trial-{self._sequence}.log.gz")
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write(record["text"])
+            record["path"], record["text"] = path, None
+        self.on_disk += self.in_memory
+        self.in_memory, self.memory_bytes = [], 0
+
+    def _unspill(self):
+        for record in self.on_disk:
+            with gzip.open(record["path"], "rt", encoding="utf-8") as f:
+                record["text"], record["path"] = f.read(), None
+        self.on_disk = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory, self._temporary = None, False
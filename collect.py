@@ -9,9 +9,13 @@ import logging
 import multiprocessing
 
 from typing import Dict, List, Set
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool
 from dataclasses import dataclass
 
+import resources
+
+from utils import trace
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,7 +26,8 @@ class ImportParser:
     module_map: None
 
     def run(self):
-        pool = Pool(processes=cpu_count() // 2)
+        # parsing needs next to no memory, so the CPUs we may use are the only limit
+        pool = Pool(processes=resources.usable_cpus())
         for test in self.tests:
             pool.apply_async(self._find_imports, args=(test,), callback=self._add_imports_to_map)
         pool.close()
@@ -53,6 +58,7 @@ class ImportParser:
 
     def _add_imports_to_map(self, found_imports: (Set, str)):
         imports, test_path = found_imports[0], found_imports[1]
+        trace.count("files_parsed")
         for module in imports:
             if module in self.module_map:
                 self.module_map[module].append(test_path)
@@ -93,7 +99,8 @@ def map_tests_to_modules(path: str, exclude: List, tests: List[str]) -> Dict[str
     app_modules = convert_app_paths_to_modules(app_modules_fullpath)
 
     parser = ImportParser(tests=tests, app_modules=app_modules, module_map={})
-    return parser.run()
+    with trace.span("parse_imports", tests=len(tests)):
+        return parser.run()
 
 
 def walk_tree(path: str, exclude: List) -> List[str]:
@@ -109,6 +116,7 @@ def walk_tree(path: str, exclude: List) -> List[str]:
         for f in filenames:
             if f.endswith(".py"):
                 python_files.append(os.path.join(dirpath, f))
+    trace.count("files_walked", len(python_files))
     return python_files
 
 
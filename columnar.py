@@ -0,0 +1,304 @@
+"""
+A compact, versioned binary format for a run's results (.bw files), laid out in columns so it can
+be memory-mapped and read without parsing or copying: the header says where each column starts, and
+each column is cast straight from the mapped file into a typed memoryview. Only the pages actually
+read are ever loaded, so even a huge file opens in milliseconds.
+
+Layout, all in native byte order (recorded in the header) and with every column 8-byte aligned:
+
+    header        magic, version, byte order, counts, and the offset of every section below
+    metadata      JSON: project path, module map, noise profile, module times, failure signatures
+                  and kept output
+    path offsets  uint32 * (tests + 1), into the string table
+    strings       UTF-8 test paths, relative to the project
+    per test      uint32 trials, passes, fails, timeouts, flakes; uint8 passed; float64 runtime_sum
+    trial index   uint64 * (tests + 1), each test's first trial in the per-trial columns
+    per trial     float64 runtime (ms), uint8 outcome
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import logging
+
+from array import array
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BWRC"
+VERSION = 1
+# the same codes as store.OUTCOMES
+OUTCOMES = {"failed": 0, "passed": 1, "timeout": 2}
+
+# magic, version, byte order (0 little, 1 big), tests, trials, then the offset of each section
+HEADER = struct.Struct("<4sHHQQ" + "Q" * 13)
+SECTIONS = [
+    "metadata",
+    "path_offsets",
+    "strings",
+    "trials",
+    "passes",
+    "fails",
+    "timeouts",
+    "flakes",
+    "passed",
+    "runtime_sums",
+    "trial_index",
+    "runtimes",
+    "outcomes",
+]
+# array typecodes per column -- everything but the metadata and strings
+TYPECODES = {
+    "path_offsets": "I",
+    "trials": "I",
+    "passes": "I",
+    "fails": "I",
+    "timeouts": "I",
+    "flakes": "I",
+    "passed": "B",
+    "runtime_sums": "d",
+    "trial_index": "Q",
+    "runtimes": "d",
+    "outcomes": "B",
+}
+
+
+def _relpath(result: Dict) -> str:
+    return os.path.relpath(result["test_path"], result["project_path"] or os.curdir)
+
+
+def write_results(
+    bw_path: str,
+    path: str,
+    module_map: Dict,
+    test_results: Dict,
+    noise: Dict = None,
+    module_times: Dict = None,
+):
+    """
+    writes a run's results (in run_tests' format, history included) as a .bw file
+    """
+    results = list(test_results["tests"].values())
+    columns = {name: array(code) for name, code in TYPECODES.items()}
+    strings = bytearray()
+    columns["path_offsets"].append(0)
+    columns["trial_index"].append(0)
+    for result in results:
+        strings += _relpath(result).encode("utf-8")
+        columns["path_offsets"].append(len(strings))
+        for name in ("trials", "passes", "fails", "flakes"):
+            columns[name].append(result[name])
+        columns["timeouts"].append(result.get("timeouts", 0))
+        columns["passed"].append(1 if result["passed"] else 0)
+        columns["runtime_sums"].append(result["runtime_sum"])
+        for outcome, runtime in result.get("history", []):
+            columns["runtimes"].append(runtime)
+            columns["outcomes"].append(OUTCOMES[outcome])
+        columns["trial_index"].append(len(columns["runtimes"]))
+
+    # failure signatures and kept output are rare and free-form, so they ride along in the metadata
+    failures = {
+        _relpath(result): result["failures"] for result in results if result.get("failures")
+    }
+    outputs = {_relpath(result): result["outputs"] for result in results if result.get("outputs")}
+    metadata = json.dumps(
+        {
+            "path": path,
+            "module_map": module_map,
+            "noise": noise,
+            "module_times": module_times,
+            "failures": failures,
+            "outputs": outputs,
+        }
+    ).encode("utf-8")
+    sections = {"metadata": metadata, "strings": bytes(strings)}
+    sections.update({name: column.tobytes() for name, column in columns.items()})
+
+    offsets, position = [], HEADER.size
+    for name in SECTIONS:
+        position += -position % 8
+        offsets.append(position)
+        position += len(sections[name])
+
+    tmp_path = f"{bw_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        byte_order = 0 if sys.byteorder == "little" else 1
+        f.write(
+            HEADER.pack(
+                MAGIC, VERSION, byte_order, len(results), len(columns["runtimes"]), *offsets
+            )
+        )
+        for name, offset in zip(SECTIONS, offsets):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(sections[name])
+    os.replace(tmp_path, bw_path)
+    logger.info(f"Saved {len(results)} test(s), {len(columns['runtimes'])} trial(s) to {bw_path}")
+
+
+"""
+A memory-mapped .bw file; every column is a memoryview straight onto the mapping
+"""
+
+
+class ColumnarResults:
+    def __init__(self, bw_path: str):
+        self.bw_path = bw_path
+        with open(bw_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, byte_order, self.n_tests, self.n_trials, *offsets = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{bw_path} isn't a bubblewrap results file")
+        if version != VERSION or byte_order != (0 if sys.byteorder == "little" else 1):
+            self.close()
+            raise ValueError(f"{bw_path} is a version {version} file we can't read on this host")
+
+        counts = {"path_offsets": self.n_tests + 1, "trial_index": self.n_tests + 1}
+        counts.update({"runtimes": self.n_trials, "outcomes": self.n_trials})
+        ends = offsets[1:] + [len(self._mmap)]
+        self._raw = {}
+        for name, offset, end in zip(SECTIONS, offsets, ends):
+            if name in TYPECODES:
+                size = array(TYPECODES[name]).itemsize * counts.get(name, self.n_tests)
+                self._raw[name] = self._view[offset : offset + size].cast(TYPECODES[name])
+            else:
+                self._raw[name] = self._view[offset:end]
+        self._paths = None
+        self._metadata = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_tests
+
+    def __getattr__(self, name: str):
+        # the columns: results.trials, results.runtimes, ...
+        raw = self.__dict__.get("_raw", {})
+        if name in raw:
+            return raw[name]
+        raise AttributeError(name)
+
+    def close(self):
+        for view in self.__dict__.get("_raw", {}).values():
+            view.release()
+        self._raw = {}
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # someone still holds a view of some trials -- the mapping goes once they let go
+            pass
+
+    @property
+    def metadata(self) -> Dict:
+        if self._metadata is None:
+            # the metadata section runs up to the padding before the path offsets
+            self._metadata = json.loads(bytes(self._raw["metadata"]).rstrip(b"\0"))
+        return self._metadata
+
+    @property
+    def paths(self) -> List[str]:
+        if self._paths is None:
+            strings, offsets = self._raw["strings"], self._raw["path_offsets"]
+            self._paths = [
+                bytes(strings[offsets[i] : offsets[i + 1]]).decode("utf-8")
+                for i in range(self.n_tests)
+            ]
+        return self._paths
+
+    def trial_runtimes(self, test: int) -> memoryview:
+        index = self._raw["trial_index"]
+        return self._raw["runtimes"][index[test] : index[test + 1]]
+
+    def trial_outcomes(self, test: int) -> memoryview:
+        index = self._raw["trial_index"]
+        return self._raw["outcomes"][index[test] : index[test + 1]]
+
+    def to_test_results(self) -> Dict:
+        """
+        the per-test summaries in run_tests' format, which is what summarize and analyze take --
+        built from the per-test columns alone, so the per-trial columns are never paged in
+        """
+        path = self.metadata["path"]
+        trials, passes, fails = self._raw["trials"], self._raw["passes"], self._raw["fails"]
+        timeouts, flakes, passed = self._raw["timeouts"], self._raw["flakes"], self._raw["passed"]
+        runtime_sums = self._raw["runtime_sums"]
+        failures = self.metadata.get("failures", {})
+        outputs = self.metadata.get("outputs", {})
+        tests = {}
+        for i, relpath in enumerate(self.paths):
+            n = trials[i] or 1
+            test_path = os.path.join(path, relpath)
+            tests[test_path] = {
+                "project_path": path,
+                "test_path": test_path,
+                "trials": trials[i],
+                "runtime_sum": runtime_sums[i],
+                "avg_runtime": runtime_sums[i] / n,
+                "passes": passes[i],
+                "pass_rate": passes[i] / n,
+                "fails": fails[i],
+                "fail_rate": fails[i] / n,
+                "flakes": flakes[i],
+                "flake_rate": flakes[i] / n,
+                "passed": bool(passed[i]),
+                "timeouts": timeouts[i],
+                "failures": failures.get(relpath, {}),
+                "outputs": outputs.get(relpath, []),
+            }
+        return {"tests": tests}
+
+
+def load_results(bw_path: str) -> Dict:
+    """
+    a .bw file in the shape report.load_results() returns
+    """
+    with ColumnarResults(bw_path) as results:
+        metadata = results.metadata
+        return {
+            "path": metadata["path"],
+            "module_map": metadata["module_map"],
+            "test_results": results.to_test_results(),
+            "noise": metadata["noise"],
+            "module_times": metadata["module_times"],
+        }
+
+
+def diff(before: ColumnarResults, after: ColumnarResults, noise_profile=None) -> List[Dict]:
+    """
+    analyze.compare_test_results() for two .bw files, straight off their per-test columns
+    """
+    after_index = {relpath: i for i, relpath in enumerate(after.paths)}
+    changes = []
+    for i, relpath in enumerate(before.paths):
+        j = after_index.get(relpath)
+        if j is None or not before.trials[i] or not after.trials[j]:
+            continue
+        before_ms = before.runtime_sums[i] / before.trials[i]
+        after_ms = after.runtime_sums[j] / after.trials[j]
+        delta = after_ms - before_ms
+        floor = noise_profile.floor_ms(before_ms, after_ms) if noise_profile else 0.0
+        changes.append(
+            {
+                "test": relpath,
+                "before_ms": before_ms,
+                "after_ms": after_ms,
+                "delta_ms": delta,
+                "noise_floor_ms": floor,
+                "significant": abs(delta) > floor,
+                "before_flake_rate": before.flakes[i] / before.trials[i],
+                "after_flake_rate": after.flakes[j] / after.trials[j],
+            }
+        )
+    return sorted(changes, key=lambda c: c["delta_ms"], reverse=True)
@@ -0,0 +1,131 @@
+"""
+Runs trials in a worker process under a deadline, so a hanging test can't stall the whole run: when
+a trial overruns its timeout, the worker is killed, the trial is recorded as a timeout, and the next
+trial gets a fresh worker. The worker leads a process group of its own, and the whole group is
+killed, so processes a hung trial started go with it. A global timeout caps the run as a whole --
+once it's spent, no more trials are started.
+"""
+
+import os
+import time
+import signal
+import logging
+import multiprocessing
+
+from typing import List, Tuple
+
+import run
+import signatures
+
+from utils import trace
+
+logger = logging.getLogger(__name__)
+
+
+def _serve_trials(conn):
+    """
+    the worker: runs one trial per (project path, test path) it receives, until told to stop
+    """
+    os.setpgid(0, 0)
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        project_path, test_path = job
+        test = run.Test(project_path=project_path, test_path=test_path, trials=1)
+        passed, runtime = test.run_trial()
+        # failures go back as their tally, since rendering one needs the worker's pytest objects
+        conn.send((passed, runtime, test.failures, test.footprint))
+
+
+"""
+Hands trials to a worker process one at a time and kills it if a trial takes too long
+"""
+
+
+class Watchdog:
+    def __init__(self, trial_timeout: float = None, global_timeout: float = None):
+        self.trial_timeout = trial_timeout
+        self.deadline = None if global_timeout is None else time.monotonic() + global_timeout
+        self.process = None
+        self.conn = None
+        self.timeouts = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def run_trial(self, project_path: str, test_path: str) -> Tuple[str, float, List, int]:
+        """
+        returns (outcome, runtime in ms, signatures.Failures, footprint in bytes), where outcome is
+        one of run.PASSED, run.FAILED or run.TIMEOUT -- a worker that dies mid-trial counts as a
+        failure. The footprint is 0 where there's none to tell, see run.Test.footprint
+        """
+        timeout = self._timeout()
+        if self.process is None:
+            self._start()
+
+        start = time.perf_counter()
+        self.conn.send((project_path, test_path))
+        if self.conn.poll(timeout):
+            try:
+                passed, runtime, failures, footprint = self.conn.recv()
+                outcome = run.PASSED if passed else run.FAILED
+                return outcome, runtime, signatures.from_summary(failures), footprint
+            except EOFError:
+                logger.warning(f"Worker died running {test_path}, replacing it")
+                self._kill()
+                return run.FAILED, (time.perf_counter() - start) * 1000, [], 0
+
+        runtime = (time.perf_counter() - start) * 1000
+        logger.warning(f"{test_path} timed out after {runtime / 1000:.1f}s, replacing its worker")
+        self.timeouts += 1
+        trace.count("trials_timed_out")
+        self._kill()
+        return run.TIMEOUT, runtime, [], 0
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=1)
+            self._kill()
+
+    def _timeout(self) -> float:
+        timeouts = [self.trial_timeout]
+        if self.deadline is not None:
+            timeouts.append(max(0.0, self.deadline - time.monotonic()))
+        timeouts = [timeout for timeout in timeouts if timeout is not None]
+        return min(timeouts) if timeouts else None
+
+    def _start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve_trials, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        try:
+            # the worker does this itself too, but it may not have got that far when it's killed
+            os.setpgid(self.process.pid, self.process.pid)
+        except OSError:
+            pass  # it already has
+
+    def _kill(self):
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass  # the group's gone already
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join()
+            self.conn.close()
+        self.process, self.conn = None, None
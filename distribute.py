@@ -0,0 +1,362 @@
+"""
+Coordinator/agent mode for spreading (test, trial) work units over any number of agent processes.
+The coordinator serves units one at a time over a TCP or Unix socket, so agents that get through
+their units faster simply ask for more -- load balances itself even when runtimes drift.
+
+The wire protocol is newline-delimited JSON. Agents send "hello", "request", "heartbeat" and
+"result" messages; the coordinator answers requests with a "unit", "wait" or "done" message.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+import socketserver
+
+from typing import Callable, Dict, List, Tuple
+from collections import deque
+from dataclasses import dataclass, asdict
+
+from run import Test, Results
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 2.0  # seconds between agent heartbeats
+HEARTBEAT_TIMEOUT = 10.0  # seconds of silence before an agent is considered dead
+WAIT_INTERVAL = 0.5  # seconds an agent backs off when there's nothing to hand out yet
+
+
+def parse_address(address: str) -> Tuple[int, object]:
+    """
+    "host:port" is TCP, "unix:/some/path" (or anything that looks like a path) is a Unix socket
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:") :]
+    if os.path.sep in address:
+        return socket.AF_UNIX, address
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _send(sock_file, message: Dict):
+    sock_file.write((json.dumps(message) + "\n").encode("utf-8"))
+    sock_file.flush()
+
+
+def _receive(sock_file) -> Dict:
+    line = sock_file.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+"""
+Represents a (test, trial) unit that has been handed to an agent but not yet reported back
+"""
+
+
+@dataclass
+class Lease:
+    agent: str
+    unit: Tuple[str, int]
+
+
+"""
+Holds all of the coordinator's bookkeeping -- pending units, leases, agent liveness, and the
+results streamed back so far. Every method is called from the server's handler threads, so
+everything goes through the lock.
+"""
+
+
+class WorkQueue:
+    def __init__(
+        self,
+        path: str,
+        trials: int,
+        collected_tests: List[str],
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+        on_result: Callable = None,
+    ):
+        self.path = path
+        self.heartbeat_timeout = heartbeat_timeout
+        self.on_result = on_result
+        self.results = Results(tests={})
+        self.pending = deque()
+        self.leases = {}  # Dict{unit: Lease}
+        self.last_seen = {}  # Dict{agent: monotonic time}
+        self.completed = set()
+        self.relpaths = {}  # Dict{relative test path sent over the wire: collected test path}
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+        for test_path in collected_tests:
+            if self.results.get(test_path):
+                continue
+            self.results.put(test_path, Test(project_path=path, trials=trials, test_path=test_path))
+            relpath = os.path.relpath(test_path, path)
+            self.relpaths[relpath] = test_path
+            for trial in range(trials):
+                self.pending.append((relpath, trial))
+        if not self.pending:
+            self.finished.set()
+
+    def checkin(self, agent: str):
+        with self.lock:
+            self.last_seen[agent] = time.monotonic()
+
+    def checkout(self, agent: str) -> Dict:
+        """
+        hand the next pending unit to an agent -- or tell it to wait, if everything left is leased
+        out to other agents that might still die on us, or that we're done
+        """
+        with self.lock:
+            self.last_seen[agent] = time.monotonic()
+            if self.pending:
+                unit = self.pending.popleft()
+                self.leases[unit] = Lease(agent=agent, unit=unit)
+                return {"type": "unit", "test": unit[0], "trial": unit[1]}
+            if self.leases:
+                return {"type": "wait", "seconds": WAIT_INTERVAL}
+            return {"type": "done"}
+
+    def complete(self, agent: str, relpath: str, trial: int, passed: bool, runtime: float):
+        unit = (relpath, trial)
+        with self.lock:
+            self.last_seen[agent] = time.monotonic()
+            self.leases.pop(unit, None)
+            # a unit we reassigned may still come back from its original agent -- first one wins
+            if unit in self.completed or relpath not in self.relpaths:
+                return
+            self.completed.add(unit)
+            try:
+                self.pending.remove(unit)
+            except ValueError:
+                pass
+            test = self.results.get(self.relpaths[relpath])
+            test.record(passed, runtime)
+            if self.on_result:
+                self.on_result(test, trial, passed, runtime)
+            if not self.pending and not self.leases:
+                self.finished.set()
+
+    def release(self, agent: str):
+        """
+        put every unit leased to this agent back at the front of the queue
+        """
+        with self.lock:
+            self._release(agent)
+
+    def reap(self):
+        """
+        release the leases of every agent that has gone quiet for longer than the heartbeat timeout
+        """
+        now = time.monotonic()
+        with self.lock:
+            for agent, seen in list(self.last_seen.items()):
+                if now - seen > self.heartbeat_timeout:
+                    logger.warning(f"Agent {agent} missed its heartbeats, reassigning its units")
+                    self._release(agent)
+                    del self.last_seen[agent]
+
+    def _release(self, agent: str):
+        for unit, lease in list(self.leases.items()):
+            if lease.agent == agent:
+                del self.leases[unit]
+                self.pending.appendleft(unit)
+
+    def summarize(self) -> Dict:
+        for test in self.results.tests.values():
+            test._calculate()
+        return asdict(self.results)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        queue = self.server.queue
+        agent = None
+        try:
+            while True:
+                message = _receive(self.rfile)
+                if message is None:
+                    break
+                kind = message.get("type")
+                if kind == "hello":
+                    agent = message["agent"]
+                    queue.checkin(agent)
+                    logger.info(f"Agent {agent} connected")
+                elif kind == "heartbeat":
+                    queue.checkin(agent)
+                elif kind == "request":
+                    _send(self.wfile, queue.checkout(agent))
+                elif kind == "result":
+                    queue.complete(
+                        agent,
+                        message["test"],
+                        message["trial"],
+                        message["passed"],
+                        message["runtime"],
+                    )
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Lost agent {agent}: {e}")
+        finally:
+            # an agent that hangs up can't finish whatever it was holding
+            if agent is not None:
+                queue.release(agent)
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+"""
+Serves the work units for a run to whichever agents connect, and gathers their results
+"""
+
+
+class Coordinator:
+    def __init__(self, address: str, queue: WorkQueue):
+        self.address = address
+        self.queue = queue
+        family, bind_to = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(bind_to):
+                os.unlink(bind_to)
+            self.server = _UnixServer(bind_to, _Handler)
+        else:
+            self.server = _TCPServer(bind_to, _Handler)
+        self.server.queue = queue
+
+    @property
+    def bound_address(self) -> str:
+        if self.server.socket.family == socket.AF_UNIX:
+            return f"unix:{self.server.server_address}"
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._reap, daemon=True).start()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.queue.finished.wait(timeout)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.server.socket.family == socket.AF_UNIX and os.path.exists(
+            self.server.server_address
+        ):
+            os.unlink(self.server.server_address)
+
+    def _reap(self):
+        while not self.queue.finished.is_set():
+            self.queue.reap()
+            self.queue.finished.wait(self.queue.heartbeat_timeout / 2)
+
+
+"""
+Connects to a coordinator and runs whatever units it hands out until there's nothing left
+"""
+
+
+class Agent:
+    def __init__(self, address: str, path: str, heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.address = address
+        self.path = path
+        self.heartbeat_interval = heartbeat_interval
+        self.name = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.units_run = 0
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        family, connect_to = parse_address(self.address)
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.connect(connect_to)
+            rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+            self._write(wfile, {"type": "hello", "agent": self.name})
+            heartbeat = threading.Thread(target=self._heartbeat, args=(wfile,), daemon=True)
+            heartbeat.start()
+            try:
+                self._work(rfile, wfile)
+            finally:
+                self._stopped.set()
+        return self.units_run
+
+    def run_unit(self, test_path: str, trial: int) -> (bool, float):
+        """
+        runs one trial of a test -- the test path arrives relative to the project root, so the
+        coordinator and agent don't need to have the project checked out at the same location
+        """
+        test = Test(project_path=self.path, test_path=os.path.join(self.path, test_path), trials=1)
+        return test.run_trial()
+
+    def _work(self, rfile, wfile):
+        while True:
+            self._write(wfile, {"type": "request"})
+            message = _receive(rfile)
+            if message is None or message["type"] == "done":
+                return
+            if message["type"] == "wait":
+                time.sleep(message.get("seconds", WAIT_INTERVAL))
+                continue
+            passed, runtime = self.run_unit(message["test"], message["trial"])
+            self.units_run += 1
+            self._write(
+                wfile,
+                {
+                    "type": "result",
+                    "test": message["test"],
+                    "trial": message["trial"],
+                    "passed": passed,
+                    "runtime": runtime,
+                },
+            )
+
+    def _heartbeat(self, wfile):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self._write(wfile, {"type": "heartbeat"})
+            except (OSError, ValueError):
+                return
+
+    def _write(self, wfile, message: Dict):
+        with self._write_lock:
+            _send(wfile, message)
+
+
+def serve_tests(
+    path: str, trials: int, collected_tests: List[str], address: str, on_result: Callable = None
+) -> Dict:
+    """
+    the distributed stand-in for run.run_tests() -- serves every (test, trial) unit to agents
+    connected at address, and returns the same summarized results once they've all come back
+    """
+    queue = WorkQueue(path, trials, collected_tests, on_result=on_result)
+    coordinator = Coordinator(address, queue)
+    coordinator.start()
+    logger.info(f"Serving {len(queue.pending)} trial(s) at {coordinator.bound_address}")
+    try:
+        coordinator.wait()
+    finally:
+        coordinator.stop()
+    return queue.summarize()
+
+
+def run_agent(address: str, path: str) -> int:
+    """
+    connect to the coordinator at address and work until it says we're done
+    """
+    agent = Agent(address, path)
+    logger.info(f"Agent {agent.name} connecting to {address}")
+    units = agent.run()
+    logger.info(f"Agent {agent.name} ran {units} trial(s)")
+    return units
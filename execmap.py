@@ -0,0 +1,224 @@
+"""
+Dynamic mapping of tests to the app modules they actually execute, as opposed to the ones they
+happen to import: traces an extra trial of each test, which isn't recorded, and notes which app
+modules' functions ran, reaching modules the static import parser can't see (transitive and dynamic
+imports).
+
+Tracing still has to be cheap, so:
+- on Python 3.12+, sys.monitoring reports each function's first call, and the callback disables
+  the event for that code object straight away, so it never fires for it again. Events are only
+  re-enabled for the next trial when no other tool (coverage.py, a profiler) is registered, since
+  that re-enables theirs too -- with one around, functions an earlier trial already ran may be
+  missed
+- on older versions, a call-only sys.settrace hook that never returns a local tracer, so no line
+  events are generated at all. It can't be switched off per function, so it still runs for every
+  call, but returns straight away for any file that isn't app code or whose module's already hit
+
+Results are cached per test file content hash, so an unchanged test is only ever traced once.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import threading
+
+from typing import Dict, List
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+TOOL_NAME = "bubblewrap"
+# sys.monitoring ids 0-2 and 5 are reserved for debuggers, coverage, profilers and optimizers
+TOOL_IDS = (3, 4)
+
+# module-level code only runs the first time a module is imported in a process, so counting it
+# would make a test's map depend on which tests ran before it -- only function calls count
+MODULE_CODE = "<module>"
+
+
+"""
+Records the app modules whose code runs while tracing is on
+"""
+
+
+class ModuleTracer:
+    def __init__(self, app_files: Dict[str, str]):
+        self.app_files = app_files  # Dict{absolute path: module name}
+        self.by_filename = {}  # memoized co_filename -> module name (or None)
+        self.hit = set()
+
+    def _module_for(self, code) -> str:
+        filename = code.co_filename
+        if filename not in self.by_filename:
+            self.by_filename[filename] = self.app_files.get(os.path.abspath(filename))
+        return self.by_filename[filename]
+
+    def _record(self, code):
+        if code.co_name != MODULE_CODE:
+            module = self._module_for(code)
+            if module:
+                self.hit.add(module)
+
+    @contextmanager
+    def tracing(self):
+        self.hit = set()
+        if hasattr(sys, "monitoring"):
+            with self._monitoring():
+                yield self.hit
+        else:
+            with self._settrace():
+                yield self.hit
+
+    @contextmanager
+    def _monitoring(self):
+        monitoring = sys.monitoring
+        tool = next((tool for tool in TOOL_IDS if monitoring.get_tool(tool) is None), None)
+        if tool is None:
+            logger.warning("No free sys.monitoring tool id, not tracing this trial")
+            yield
+            return
+
+        def on_start(code, offset):
+            self._record(code)
+            return monitoring.DISABLE
+
+        # the id is taken afresh for every trial and freed after it, so the tool starts over
+        monitoring.use_tool_id(tool, TOOL_NAME)
+        try:
+            # events disabled during an earlier trial have to fire again for this one, but
+            # restart_events() re-enables every tool's -- with coverage.py or a profiler around,
+            # that would slow them down for the rest of the run, so then we do without
+            others = [other for other in range(6) if other != tool and monitoring.get_tool(other)]
+            if not others:
+                monitoring.restart_events()
+            monitoring.register_callback(tool, monitoring.events.PY_START, on_start)
+            monitoring.set_events(tool, monitoring.events.PY_START)
+            yield
+        finally:
+            monitoring.set_events(tool, monitoring.events.NO_EVENTS)
+            monitoring.register_callback(tool, monitoring.events.PY_START, None)
+            monitoring.free_tool_id(tool)
+
+    @contextmanager
+    def _settrace(self):
+        done = set()  # files that aren't app code, or whose module is already recorded
+
+        def on_call(frame, event, arg):
+            # a global tracer only ever sees "call" events
+            code = frame.f_code
+            if code.co_filename not in done:
+                module = self._module_for(code)
+                if module is None:
+                    done.add(code.co_filename)
+                elif code.co_name != MODULE_CODE:
+                    self.hit.add(module)
+                    done.add(code.co_filename)
+            # no local tracer, so the interpreter never generates line events for this frame
+            return None
+
+        previous = sys.gettrace()
+        sys.settrace(on_call)
+        threading.settrace(on_call)
+        try:
+            yield
+        finally:
+            sys.settrace(previous)
+            threading.settrace(previous)
+
+
+def content_hash(test_path: str) -> str:
+    with open(test_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+"""
+Represents the dynamic map for a project: which app modules each test executed, cached on disk
+against the content hash of the test file it came from
+"""
+
+
+class DynamicMapper:
+    def __init__(self, path: str, app_paths: List[str], cache_path: str = None):
+        self.path = path
+        self.cache_path = cache_path
+        app_files = {}
+        for app_path in app_paths:
+            module = os.path.basename(app_path)[:-3]  # same naming as collect's module map
+            app_files[os.path.abspath(app_path)] = module
+        self.tracer = ModuleTracer(app_files)
+        self.cache = self._load()  # Dict{test relpath: {"hash": content hash, "modules": [...]}}
+        self.hashes = {}
+
+    def _key(self, test_path: str) -> str:
+        return os.path.relpath(test_path, self.path)
+
+    def _hash(self, test_path: str) -> str:
+        if test_path not in self.hashes:
+            self.hashes[test_path] = content_hash(test_path)
+        return self.hashes[test_path]
+
+    def needs_trace(self, test_path: str) -> bool:
+        entry = self.cache.get(self._key(test_path))
+        return entry is None or entry["hash"] != self._hash(test_path)
+
+    @contextmanager
+    def tracing(self, test_path: str):
+        """
+        traces whatever runs inside it as a trial of test_path, unless the cache already has it
+        """
+        if not self.needs_trace(test_path):
+            yield
+            return
+        with self.tracer.tracing() as hit:
+            yield
+        self.cache[self._key(test_path)] = {
+            "hash": self._hash(test_path),
+            "modules": sorted(hit),
+        }
+
+    def modules_for(self, test_path: str) -> List[str]:
+        entry = self.cache.get(self._key(test_path))
+        if entry is None or entry["hash"] != self._hash(test_path):
+            return None
+        return entry["modules"]
+
+    def merge(self, static_map: Dict[str, List[str]], tests: List[str]) -> Dict[str, List[str]]:
+        """
+        the module -> tests map, with every test we have dynamic data for mapped by what it
+        executed, and the rest left as the import parser mapped them
+        """
+        mapped = {test for test in tests if self.modules_for(test) is not None}
+        module_map = {}
+        for module, module_tests in static_map.items():
+            kept = [test for test in module_tests if test not in mapped]
+            if kept:
+                module_map[module] = kept
+        for test in sorted(mapped):
+            for module in self.modules_for(test):
+                module_map.setdefault(module, []).append(test)
+        logger.info(f"Mapped {len(mapped)} of {len(tests)} test(s) by the modules they executed")
+        return module_map
+
+    def save(self):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "tests": self.cache}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _load(self) -> Dict:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable dynamic map cache {self.cache_path}: {e}")
+            return {}
+        if saved.get("version") != CACHE_VERSION:
+            return {}
+        return saved["tests"]
@@ -0,0 +1,256 @@
+"""
+Import-time profiling: how much of each test file's runtime is just importing the modules it pulls
+in, and which modules' import cost is paid by the most test files.
+
+Each test file is imported, the way pytest would import it, in a fresh interpreter under
+`-X importtime` that's already imported pytest. In the tree of imports that prints, the subtree
+under the test module is exactly what that file costs on top of pytest itself, since anything pytest
+already imported is cached by then (conftest.py files aren't imported first, so what they import
+counts against each test file). Since every trial runs in a session of its own, a module's import
+cost is paid once per trial by every test file that pulls it in -- so a module imported by many test
+files is where a lazy import, or a slimmer dependency, saves the most across the whole suite.
+"""
+
+import os
+import re
+import sys
+import logging
+import sysconfig
+import functools
+import statistics
+import subprocess
+import importlib.util
+
+from typing import Dict, List, Set
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+APP = "app"
+THIRD_PARTY = "third-party"
+STDLIB = "stdlib"
+
+# import time:       self [us] |  cumulative | imported package
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$")
+
+
+"""
+Represents one import in the tree -importtime prints, and the imports it triggered
+"""
+
+
+@dataclass
+class ImportNode:
+    name: str
+    self_us: int = 0
+    cumulative_us: int = 0
+    children: List = field(default_factory=list)
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def parse_importtime(output: str) -> List[ImportNode]:
+    """
+    the import trees in -X importtime output, which lists each import after the ones it triggered,
+    indented two spaces per level
+    """
+    pending = {}  # Dict{depth: nodes at that depth still waiting for their parent}
+    for line in output.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = len(indent) // 2
+        node = ImportNode(name, int(self_us), int(cumulative_us), pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(node)
+    return pending.get(0, [])
+
+
+def find_module(roots: List[ImportNode], module: str) -> ImportNode:
+    """
+    the node for the import of module (by its last dotted component, as collect names modules)
+    """
+    for root in roots:
+        for node in root.walk():
+            if node.name.split(".")[-1] == module:
+                return node
+    return None
+
+
+def _importable(test_path: str) -> (str, str):
+    """
+    the sys.path entry and dotted name pytest's default (prepend) import mode imports a test file
+    with: up from its directory for as long as there are packages
+    """
+    base, name = os.path.split(os.path.abspath(test_path))
+    parts = [name[:-3]]
+    while os.path.exists(os.path.join(base, "__init__.py")):
+        base, package = os.path.split(base)
+        parts.insert(0, package)
+    return base, ".".join(parts)
+
+
+def profile_test_file(path: str, test_path: str) -> ImportNode:
+    """
+    the import tree of one test file, imported in a fresh interpreter the way pytest would -- once
+    pytest itself is imported, so that's not charged to the file -- or None if it didn't import
+    """
+    base, name = _importable(test_path)
+    # the project is imported the same way as when bubblewrap runs it in-process: from the
+    # directory bubblewrap was invoked in
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    # an import statement, not importlib.import_module, which -X importtime doesn't see
+    script = f"import sys; import pytest; sys.path.insert(0, {base!r}); import {name}"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return find_module(parse_importtime(process.stderr), name.split(".")[-1])
+
+
+def kind_of(name: str, app_modules: Set[str]) -> str:
+    if name.split(".")[-1] in app_modules:
+        return APP
+    if _in_stdlib(name.split(".")[0]):
+        return STDLIB
+    return THIRD_PARTY
+
+
+@functools.lru_cache(maxsize=None)
+def _in_stdlib(top_level: str) -> bool:
+    if hasattr(sys, "stdlib_module_names"):  # 3.10+
+        return top_level in sys.stdlib_module_names
+    # before that, go by where the module would be imported from
+    if top_level in sys.builtin_module_names:
+        return True
+    try:
+        spec = importlib.util.find_spec(top_level)
+    except (ImportError, ValueError):
+        return False
+    if spec is None or not spec.has_location:
+        return spec is not None and spec.origin in ("built-in", "frozen")
+    stdlib = os.path.realpath(sysconfig.get_paths()["stdlib"])
+    origin = os.path.realpath(spec.origin)
+    installed = {"site-packages", "dist-packages"} & set(origin.split(os.sep))
+    return origin.startswith(stdlib + os.sep) and not installed
+
+
+"""
+Represents the import cost of one module across the test files that pay it
+"""
+
+
+@dataclass
+class ModuleImportCost:
+    module: str
+    kind: str
+    self_ms: float = 0.0  # per paying test file, on average
+    cumulative_ms: float = 0.0  # per paying test file, on average -- its own imports included
+    files: List = field(default_factory=list)  # test files whose import pulled it in
+    mapped_tests: int = 0  # tests the module -> tests map says import it (app modules only)
+
+    @property
+    def total_ms(self) -> float:
+        """
+        paid by every one of those test files, on every trial
+        """
+        return self.cumulative_ms * len(self.files)
+
+
+"""
+Represents a whole suite's import profile: each test file's import tree, the trees merged into
+one, and the cost of every module pulled in along the way
+"""
+
+
+@dataclass
+class ImportProfile:
+    files: Dict = field(default_factory=dict)  # Dict{test path: ImportNode}
+    tree: ImportNode = None  # every file's tree merged, in total microseconds across files
+    modules: List = field(default_factory=list)  # List[ModuleImportCost], costliest first
+
+
+def merge_trees(trees: List[ImportNode]) -> ImportNode:
+    merged = ImportNode("<suite>")
+    for tree in trees:
+        _merge_into(merged, tree)
+    return merged
+
+
+def _merge_into(merged: ImportNode, node: ImportNode):
+    merged.self_us += node.self_us
+    merged.cumulative_us += node.cumulative_us
+    by_name = {child.name: child for child in merged.children}
+    for child in node.children:
+        if child.name not in by_name:
+            by_name[child.name] = ImportNode(child.name)
+            merged.children.append(by_name[child.name])
+        _merge_into(by_name[child.name], child)
+
+
+def profile_imports(
+    path: str,
+    tests: List[str],
+    module_map: Dict[str, List[str]],
+    app_modules: Set[str],
+    repeat: int = 1,
+) -> ImportProfile:
+    """
+    profiles each test file's imports (the median of repeat runs, per module) and ranks the modules
+    they pull in by the import time they cost the suite in total
+    """
+    profile = ImportProfile()
+    samples = {}  # Dict{module: Dict{test path: [(self us, cumulative us), ...]}}
+    for test_path in tests:
+        for _ in range(repeat):
+            tree = profile_test_file(path, test_path)
+            if tree is None:
+                logger.warning(f"{test_path} was never imported, so it has no import profile")
+                break
+            profile.files.setdefault(test_path, tree)
+            # everything under the test module itself
+            for node in list(tree.walk())[1:]:
+                per_file = samples.setdefault(node.name, {}).setdefault(test_path, [])
+                per_file.append((node.self_us, node.cumulative_us))
+
+    profile.tree = merge_trees(list(profile.files.values()))
+    for module, per_file in samples.items():
+        self_ms = [statistics.median(s for s, _ in runs) / 1000 for runs in per_file.values()]
+        cumulative_ms = [statistics.median(c for _, c in runs) / 1000 for runs in per_file.values()]
+        kind = kind_of(module, app_modules)
+        profile.modules.append(
+            ModuleImportCost(
+                module=module,
+                kind=kind,
+                self_ms=statistics.mean(self_ms),
+                cumulative_ms=statistics.mean(cumulative_ms),
+                files=sorted(per_file),
+                mapped_tests=len(module_map.get(module.split(".")[-1], [])) if kind == APP else 0,
+            )
+        )
+    profile.modules.sort(key=lambda cost: cost.total_ms, reverse=True)
+    return profile
+
+
+def log_import_profile(profile: ImportProfile, top_n: int = 10):
+    slowest = sorted(profile.files.items(), key=lambda item: item[1].cumulative_us, reverse=True)
+    logger.info(f"Import time of {len(profile.files)} test file(s), slowest first:")
+    for test_path, tree in slowest[:top_n]:
+        logger.info(f"{test_path}: {tree.cumulative_us / 1000:.1f} ms")
+
+    logger.info("Modules whose import costs the suite the most, per trial of every test file:")
+    for cost in profile.modules[:top_n]:
+        mapped = f", {cost.mapped_tests} test(s) in the module map" if cost.kind == APP else ""
+        logger.info(
+            f"{cost.module} ({cost.kind}): {cost.total_ms:.1f} ms in total -- "
+            f"{cost.cumulative_ms:.1f} ms ({cost.self_ms:.1f} ms its own) in each of "
+            f"{len(cost.files)} test file(s){mapped}"
+        )
@@ -0,0 +1,189 @@
+"""
+Imports existing JUnit XML and pytest-json-report files as trial data, so CI history can be
+summarized and analyzed without re-running anything. Each report counts as one trial of every test
+file that appears in it: the file passes the trial if all of its test cases passed, and its
+runtime is the sum of theirs.
+
+Reports are streamed rather than loaded whole -- JUnit XML through iterparse, dropping each test
+case as soon as it's been tallied, and pytest JSON through ijson (in requirements.txt, but if it's
+missing, JSON reports are loaded whole, with a warning).
+"""
+
+import os
+import json
+import logging
+import xml.etree.ElementTree as ET
+
+from typing import Dict, Iterable, List, Tuple
+from dataclasses import asdict
+
+from run import Test, Results
+
+try:
+    import ijson
+except ImportError:  # optional -- without it, pytest JSON reports are loaded whole
+    ijson = None
+_warned_unstreamed = False  # once per run is enough
+
+logger = logging.getLogger(__name__)
+
+# JUnit elements that mark a test case as not passing
+JUNIT_FAILURES = {"failure", "error"}
+# pytest-json-report outcomes that we count as passing
+JSON_PASSES = {"passed", "skipped", "xfailed", "xpassed"}
+
+
+"""
+Resolves the test case identifiers found in reports to test file paths within the project
+"""
+
+
+class PathResolver:
+    def __init__(self, path: str):
+        self.path = path
+        self.cache = {}  # Dict{classname: test file path}
+
+    def from_file(self, file: str) -> str:
+        return os.path.join(self.path, os.path.normpath(file))
+
+    def from_classname(self, classname: str) -> str:
+        """
+        pytest's JUnit output names test cases by dotted classname (tests.test_apple, or
+        tests.test_apple.TestApple for test classes) -- walk back from the longest prefix until one
+        is an actual file in the project
+        """
+        if classname in self.cache:
+            return self.cache[classname]
+        parts = classname.split(".")
+        resolved = os.path.join(self.path, *parts) + ".py"
+        for end in range(len(parts), 0, -1):
+            candidate = os.path.join(self.path, *parts[:end]) + ".py"
+            if os.path.exists(candidate):
+                resolved = candidate
+                break
+        self.cache[classname] = resolved
+        return resolved
+
+    def from_nodeid(self, nodeid: str) -> str:
+        return self.from_file(nodeid.split("::", 1)[0])
+
+
+def iter_junit_cases(report_path: str, resolver: PathResolver) -> Iterable[Tuple[str, bool, float]]:
+    """
+    yields (test file, passed, runtime in ms) for every test case in a JUnit XML report
+    """
+    stack = []
+    for event, elem in ET.iterparse(report_path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag != "testcase":
+            continue
+
+        if elem.get("file"):
+            test_path = resolver.from_file(elem.get("file"))
+        else:
+            test_path = resolver.from_classname(elem.get("classname", ""))
+        passed = not any(child.tag in JUNIT_FAILURES for child in elem)
+        runtime = float(elem.get("time") or 0) * 1000
+        yield test_path, passed, runtime
+
+        # drop the test case now that we're done with it, so memory stays flat however big the
+        # report gets
+        if stack:
+            stack[-1].remove(elem)
+        elem.clear()
+
+
+def _warn_unstreamed(report_path: str):
+    global _warned_unstreamed
+    if not _warned_unstreamed:
+        logger.warning(
+            f"ijson isn't installed, so {report_path} and any other JSON reports are loaded into "
+            "memory whole -- pip install ijson to stream them"
+        )
+        _warned_unstreamed = True
+
+
+def iter_json_cases(report_path: str, resolver: PathResolver) -> Iterable[Tuple[str, bool, float]]:
+    """
+    yields (test file, passed, runtime in ms) for every test in a pytest-json-report report
+    """
+    with open(report_path, "rb") as f:
+        if ijson is not None:
+            tests = ijson.items(f, "tests.item", use_float=True)
+        else:
+            _warn_unstreamed(report_path)
+            tests = json.load(f).get("tests", [])
+        for test in tests:
+            runtime = sum(
+                float(test.get(phase, {}).get("duration", 0))
+                for phase in ("setup", "call", "teardown")
+            )
+            yield (
+                resolver.from_nodeid(test["nodeid"]),
+                test.get("outcome") in JSON_PASSES,
+                runtime * 1000,
+            )
+
+
+def tally_report(report_path: str, resolver: PathResolver) -> Dict[str, List]:
+    """
+    collapses one report's test cases into a single trial per test file: {path: [passed, runtime]}
+    """
+    if report_path.endswith(".json"):
+        cases = iter_json_cases(report_path, resolver)
+    else:
+        cases = iter_junit_cases(report_path, resolver)
+
+    files = {}
+    for test_path, passed, runtime in cases:
+        tally = files.setdefault(test_path, [True, 0.0])
+        tally[0] = tally[0] and passed
+        tally[1] += runtime
+    return files
+
+
+def find_reports(locations: List[str]) -> List[str]:
+    """
+    expands any directories in locations to the .xml and .json reports they contain
+    """
+    reports = []
+    for location in locations:
+        if not os.path.isdir(location):
+            reports.append(location)
+            continue
+        for dirpath, _, filenames in os.walk(location):
+            for f in sorted(filenames):
+                if f.endswith(".xml") or f.endswith(".json"):
+                    reports.append(os.path.join(dirpath, f))
+    return reports
+
+
+def ingest_reports(path: str, locations: List[str]) -> Dict:
+    """
+    the stand-in for run.run_tests() when the trials have already happened in CI -- returns the
+    same summarized results, with one trial per report a test file appeared in
+    """
+    resolver = PathResolver(path)
+    results = Results(tests={})
+    reports = find_reports(locations)
+    for report_path in reports:
+        try:
+            files = tally_report(report_path, resolver)
+        except (ET.ParseError, ValueError, KeyError) as e:
+            logger.warning(f"Skipping unreadable report {report_path}: {e}")
+            continue
+        for test_path, (passed, runtime) in files.items():
+            test = results.get(test_path)
+            if test is None:
+                test = Test(project_path=path, test_path=test_path)
+                results.put(test_path, test)
+            test.trials += 1
+            test.record(passed, runtime)
+
+    for test in results.tests.values():
+        test._calculate()
+    logger.info(f"Imported {len(reports)} report(s) covering {len(results.tests)} test file(s)")
+    return asdict(results)
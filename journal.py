@@ -0,0 +1,161 @@
+"""
+Checkpoints for long runs: every trial is appended to a journal file as soon as it's recorded, so a
+run that's interrupted -- a preempted CI node, a Ctrl-C -- can be resumed from the journal instead
+of starting over. Resuming replays the journaled trials into each test and runs only the ones that
+are left.
+
+Each trial is one JSON line, handed to the OS as soon as it's written, so a killed process loses
+nothing; lines are only fsync'd every SYNC_TRIALS trials or SYNC_INTERVAL seconds, so a crashed
+machine loses at most that much, while the disk never sees a sync per trial. A line cut off
+half-written is dropped on resume, and a journal of another project can't be resumed at all, since
+its tests' relative paths would only match ours by accident.
+"""
+
+import os
+import json
+import time
+import logging
+
+from typing import Dict, List
+
+import signatures
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_VERSION = 1
+# trials, and seconds, we let go by between syncs to disk
+SYNC_TRIALS = 100
+SYNC_INTERVAL = 5.0
+
+
+"""
+Represents the journal of one run: the trials already in it, by test (relative to the project) and
+trial number, and the file further trials are appended to
+"""
+
+
+class Journal:
+    def __init__(self, journal_path: str, path: str, resume: bool = False):
+        self.journal_path = journal_path
+        self.path = path
+        self.completed = {}  # Dict{test path relative to the project: Dict{trial: record}}
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        if resume and os.path.exists(journal_path):
+            end = self._load()
+            # anything past the last complete line was cut off mid-write, and has to go
+            os.truncate(journal_path, end)
+            self._file = open(journal_path, "a", encoding="utf-8")
+            if end == 0:
+                self._write(self._header())
+            logger.info(f"Resuming from {self.trials_completed} trial(s) in {journal_path}")
+        else:
+            if resume:
+                logger.info(f"No journal at {journal_path} yet, starting from scratch")
+            self._file = open(journal_path, "w", encoding="utf-8")
+            self._write(self._header())
+            self.sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def trials_completed(self) -> int:
+        return sum(len(trials) for trials in self.completed.values())
+
+    def completed_trials(self, test_path: str) -> List[Dict]:
+        """
+        the journaled records of a test's trials, in trial order, up to the first one missing
+        """
+        trials = self.completed.get(os.path.relpath(test_path, self.path), {})
+        records = []
+        while len(records) in trials:
+            records.append(trials[len(records)])
+        return records
+
+    def replay(self, test, limit: int = None) -> int:
+        """
+        records a test's journaled trials (no more than limit, or its trials) on it, as though they
+        had just run, returning how many there were
+        """
+        records = self.completed_trials(test.test_path)[: test.trials if limit is None else limit]
+        for record in records:
+            test.record(
+                record["outcome"] == "passed",
+                record["runtime"],
+                timed_out=record["outcome"] == "timeout",
+                failures=signatures.from_summary(record["failures"]),
+            )
+            test.footprint = max(test.footprint, record["footprint"])
+        return len(records)
+
+    def record(self, test, trial: int, failures: List = None):
+        """
+        journals a trial test.record() just recorded, along with the signatures.Failures behind it
+        """
+        outcome, runtime = test.history[-1]
+        failed = {}
+        signatures.add_trial(failed, failures or [])
+        self._write(
+            {
+                "test": os.path.relpath(test.test_path, self.path),
+                "trial": trial,
+                "outcome": outcome,
+                "runtime": runtime,
+                "footprint": test.footprint,
+                "failures": failed,
+            }
+        )
+        self._unsynced += 1
+        if self._unsynced >= SYNC_TRIALS or time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def _header(self) -> Dict:
+        return {"journal": JOURNAL_VERSION, "path": os.path.realpath(self.path)}
+
+    def _write(self, entry: Dict):
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def _load(self) -> int:
+        """
+        reads the journal's trials into completed, returning the offset just past its last
+        complete line
+        """
+        end = 0
+        with open(self.journal_path, "rb") as f:
+            for number, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Dropping the half-written end of {self.journal_path}")
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                if number == 0:
+                    if entry.get("journal") != JOURNAL_VERSION:
+                        raise ValueError(f"{self.journal_path} isn't a bubblewrap journal")
+                    if entry.get("path") != os.path.realpath(self.path):
+                        raise ValueError(
+                            f"{self.journal_path} is the journal of a run of {entry.get('path')}, "
+                            f"not {os.path.realpath(self.path)}"
+                        )
+                    continue
+                self.completed.setdefault(entry["test"], {})[entry["trial"]] = entry
+        return end
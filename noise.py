@@ -0,0 +1,115 @@
+"""
+Keeps measurement noise from passing for regressions: pins the process running trials to a fixed
+set of CPUs, and times a fixed micro-benchmark over and over to estimate how much wall times wobble
+on this host anyway. That estimate becomes the noise floor a runtime delta has to clear before we
+call it a change.
+"""
+
+import os
+import time
+import logging
+import statistics
+
+from typing import Dict, List
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_SAMPLES = 25
+CALIBRATION_ITERATIONS = 20000
+# a delta has to be this many (combined) noise deviations away from zero to count
+NOISE_SIGMAS = 3
+
+
+"""
+Represents how noisy wall-clock timing is on this host, as the spread of a fixed workload's runtime
+relative to its median
+"""
+
+
+@dataclass
+class NoiseProfile:
+    samples: int
+    median_ms: float
+    mad_ms: float  # median absolute deviation
+    relative_noise: float  # robust standard deviation / median
+
+    def floor_ms(self, before_ms: float, after_ms: float) -> float:
+        """
+        the smallest runtime delta between two measurements that this much noise can't explain
+        """
+        spread = (
+            (self.relative_noise * before_ms) ** 2 + (self.relative_noise * after_ms) ** 2
+        ) ** 0.5
+        return NOISE_SIGMAS * spread
+
+
+def parse_cpus(spec: str) -> List[int]:
+    """
+    "0,2-3" -> [0, 2, 3]
+    """
+    cpus = []
+    try:
+        for part in spec.split(","):
+            part = part.strip()
+            if "-" in part:
+                low, high = part.split("-")
+                cpus.extend(range(int(low), int(high) + 1))
+            elif part:
+                cpus.append(int(part))
+    except ValueError:
+        cpus = []
+    if not cpus or min(cpus) < 0:
+        raise ValueError(f"{spec!r} isn't a list of CPUs like 2 or 0,2-3")
+    return cpus
+
+
+def pin(cpus: List[int], pid: int = 0) -> bool:
+    """
+    restricts a process (this one by default) to the given CPUs, so the scheduler can't migrate it
+    mid-trial; returns False where the platform can't do that
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("CPU pinning isn't supported on this platform, running unpinned")
+        return False
+    os.sched_setaffinity(pid, cpus)
+    logger.info(f"Pinned to CPU(s) {sorted(os.sched_getaffinity(pid))}")
+    return True
+
+
+def _workload(iterations: int) -> int:
+    total = 0
+    for i in range(iterations):
+        total += i * i % 7
+    return total
+
+
+def calibrate(
+    samples: int = CALIBRATION_SAMPLES, iterations: int = CALIBRATION_ITERATIONS
+) -> NoiseProfile:
+    """
+    times the same fixed workload $samples times; the workload never changes, so however much its
+    runtime spreads is down to the host (frequency scaling, other processes, interrupts, ...)
+    """
+    _workload(iterations)  # warm up
+    runtimes = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        _workload(iterations)
+        runtimes.append((time.perf_counter() - start) * 1000)
+
+    median = statistics.median(runtimes)
+    mad = statistics.median(abs(runtime - median) for runtime in runtimes)
+    # 1.4826 scales the MAD to a standard deviation for normally distributed noise, without letting
+    # the odd huge outlier blow up the estimate
+    relative_noise = 1.4826 * mad / median if median else 0.0
+    profile = NoiseProfile(samples, median, mad, relative_noise)
+    logger.info(
+        f"Host timing noise is about {relative_noise * 100:.1f}% "
+        f"({samples} samples of a {median:.2f} ms workload)"
+    )
+    return profile
+
+
+def from_dict(profile: Dict) -> NoiseProfile:
+    return NoiseProfile(**profile) if profile else None
@@ -0,0 +1,178 @@
+"""
+Hunts for order-dependent failures: tests that pass on their own but fail when some other test has
+run before them in the same session (shared global state, leftover files, ...). Test files are run
+together in randomized shared sessions, and whenever one fails that passes in isolation, delta
+debugging shrinks the tests that ran before it down to a minimal set of polluters -- for a single
+polluter, that's a binary search, O(log n) sessions rather than trying every permutation.
+
+A test that fails at random would otherwise get pinned on whatever happened to run before it, so
+every verdict is checked REPEATS times over: the victim has to pass alone every time, and fail after
+its predecessors -- all of them before minimizing, then each subset delta debugging tries -- every
+time too.
+"""
+
+import os
+import sys
+import random
+import logging
+import tempfile
+import subprocess
+
+from typing import Callable, Dict, List, Sequence
+from dataclasses import dataclass
+
+import ingest
+
+logger = logging.getLogger(__name__)
+
+REPEATS = 3  # sessions a verdict has to hold for
+
+
+"""
+Represents a test file that fails after a minimal set of other test files has run before it
+"""
+
+
+@dataclass
+class Pollution:
+    victim: str
+    polluters: List[str]
+    sessions: int  # sessions it took to minimize the polluters
+
+
+"""
+Runs sets of test files, in order, in a single fresh pytest session each -- fresh so that nothing
+from one session can leak into the next, which would defeat the whole exercise. Nothing's cached,
+since the same order can come out differently the next time
+"""
+
+
+@dataclass
+class SessionRunner:
+    path: str
+    repeats: int = REPEATS
+    sessions: int = 0
+
+    def fails(self, order: Sequence[str], victim: str) -> bool:
+        """
+        whether victim fails after order in each of self.repeats sessions
+        """
+        return all(not self.run([*order, victim])[victim] for _ in range(self.repeats))
+
+    def passes_alone(self, victim: str) -> bool:
+        """
+        whether victim passes on its own in each of self.repeats sessions
+        """
+        return all(self.run([victim])[victim] for _ in range(self.repeats))
+
+    def run(self, order: Sequence[str]) -> Dict[str, bool]:
+        self.sessions += 1
+
+        with tempfile.TemporaryDirectory() as tmp:
+            junit = os.path.join(tmp, "session.xml")
+            # the project is imported the same way as when bubblewrap runs it in-process: from
+            # the directory bubblewrap was invoked in
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "pytest",
+                    "-q",
+                    "-p",
+                    "no:cacheprovider",
+                    "-p",
+                    "no:randomly",
+                    "--rootdir",
+                    os.path.abspath(self.path),
+                    f"--junitxml={junit}",
+                    *[os.path.abspath(test) for test in order],
+                ],
+                cwd=self.path,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                files = ingest.tally_report(junit, ingest.PathResolver(os.path.abspath(self.path)))
+            except (FileNotFoundError, ingest.ET.ParseError):
+                files = {}
+
+        # a test file missing from the report never got to run its tests -- that's a failure
+        outcome = {}
+        for test in order:
+            passed, _ = files.get(os.path.abspath(test), (False, 0.0))
+            outcome[test] = passed
+        return outcome
+
+
+def ddmin(candidates: List, fails: Callable[[List], bool]) -> List:
+    """
+    Zeller's delta debugging: given candidates for which fails(candidates) holds, returns a subset
+    that still fails but where removing any single element makes it pass. Order within candidates is
+    preserved, since for pollution the order is the whole point.
+    """
+    granularity = 2
+    while len(candidates) >= 2:
+        chunk = max(1, len(candidates) // granularity)
+        subsets = [candidates[i : i + chunk] for i in range(0, len(candidates), chunk)]
+
+        reduced = False
+        for subset in subsets:
+            if fails(subset):
+                candidates, granularity, reduced = subset, 2, True
+                break
+        if not reduced:
+            for i in range(len(subsets)):
+                complement = [c for j, s in enumerate(subsets) if j != i for c in s]
+                if fails(complement):
+                    candidates, granularity, reduced = complement, max(granularity - 1, 2), True
+                    break
+        if not reduced:
+            if granularity >= len(candidates):
+                break
+            granularity = min(granularity * 2, len(candidates))
+    return candidates
+
+
+def find_polluters(
+    path: str, tests: List[str], sessions: int = 10, seed: int = None, runner: SessionRunner = None
+) -> List[Pollution]:
+    """
+    runs the tests in randomized shared sessions and minimizes the polluters of every test file that
+    fails in a session but passes on its own, if it fails after the same tests every time
+    """
+    runner = runner or SessionRunner(path)
+    rng = random.Random(seed)
+    isolated = {}
+    found = {}
+
+    for session in range(sessions):
+        order = list(tests)
+        rng.shuffle(order)
+        outcome = runner.run(order)
+
+        for index, victim in enumerate(order):
+            if outcome[victim] or victim in found or index == 0:
+                continue
+            if victim not in isolated:
+                isolated[victim] = runner.passes_alone(victim)
+            if not isolated[victim]:
+                # fails no matter what ran before it, so it's not order-dependent
+                continue
+
+            before = runner.sessions
+            predecessors = order[:index]
+            if not runner.fails(predecessors, victim):
+                logger.debug(f"{victim} didn't fail after the same tests again, so it's just flaky")
+                continue
+            polluters = ddmin(predecessors, lambda subset: runner.fails(subset, victim))
+            found[victim] = Pollution(victim, polluters, runner.sessions - before)
+            logger.info(
+                f"{victim} fails after {', '.join(polluters)} "
+                f"(minimized in {found[victim].sessions} session(s))"
+            )
+
+    logger.info(f"Ran {runner.sessions} session(s), found {len(found)} order-dependent test(s)")
+    return list(found.values())
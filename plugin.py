@@ -0,0 +1,84 @@
+"""
+Pytest plugins that bubblewrap hands to pytest.main() to see inside a trial -- how long the test
+items themselves took, as opposed to pytest's collection and session overhead around them, and, when
+one session runs many test files, how each file fared -- and, for any that failed, why (see
+signatures.py)
+"""
+
+import os
+
+import signatures
+
+
+def _node_file(node) -> str:
+    # Node.path is pytest 7+; fspath is what 6.2 has
+    return str(getattr(node, "path", None) or node.fspath)
+
+
+def _failure(node, call, report) -> signatures.Failure:
+    return signatures.from_excinfo(
+        call.excinfo, _node_file(node), render=lambda: str(report.longrepr)
+    )
+
+
+def _interrupted(excinfo) -> bool:
+    # pytest stops a session on collection errors with a KeyboardInterrupt subclass of its own
+    return excinfo.type is KeyboardInterrupt
+
+
+"""
+Records the reports pytest produces for each test item during one session
+"""
+
+
+class TrialRecorder:
+    def __init__(self):
+        self.item_runtime = 0.0  # ms spent in setup, call and teardown of every item
+        self.failures = []  # List[signatures.Failure]
+        self.interrupted = False  # by a Ctrl-C, which pytest swallows
+
+    def pytest_keyboard_interrupt(self, excinfo):
+        self.interrupted = _interrupted(excinfo)
+
+    def pytest_runtest_logreport(self, report):
+        self.item_runtime += report.duration * 1000
+
+    def pytest_exception_interact(self, node, call, report):
+        # called for every failure (not skips or xfails) of an item or of collecting a file
+        self.failures.append(_failure(node, call, report))
+
+
+"""
+Records the outcome and item runtime of every test file in a session that runs many of them
+"""
+
+
+class SessionRecorder:
+    def __init__(self):
+        self.rootdir = None
+        self.files = {}  # Dict{absolute test file path: [passed, ms spent in its items]}
+        self.failures = {}  # Dict{absolute test file path: List[signatures.Failure]}
+        self.interrupted = False
+
+    def pytest_sessionstart(self, session):
+        self.rootdir = str(session.config.rootpath)
+
+    def pytest_keyboard_interrupt(self, excinfo):
+        self.interrupted = _interrupted(excinfo)
+
+    def pytest_collectreport(self, report):
+        # a file that can't even be imported fails, just like it would in a session of its own
+        if report.failed:
+            self._tally(report.nodeid, False, 0.0)
+
+    def pytest_runtest_logreport(self, report):
+        self._tally(report.nodeid, not report.failed, report.duration * 1000)
+
+    def pytest_exception_interact(self, node, call, report):
+        self.failures.setdefault(_node_file(node), []).append(_failure(node, call, report))
+
+    def _tally(self, nodeid: str, passed: bool, runtime: float):
+        test_file = os.path.normpath(os.path.join(self.rootdir, nodeid.split("::")[0]))
+        tally = self.files.setdefault(test_file, [True, 0.0])
+        tally[0] = tally[0] and passed
+        tally[1] += runtime
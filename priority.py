@@ -0,0 +1,126 @@
+"""
+Gets a verdict out of a run as early as possible: orders tests so the likeliest offenders -- the
+historically flaky ones, and the ones covering recently changed modules -- run first, and stops
+the run (or cuts the remaining tests down to a single trial) once enough of them have already
+failed the run.
+"""
+
+import os
+import logging
+import subprocess
+
+from typing import Dict, List, Set
+from dataclasses import dataclass
+
+import collect
+
+logger = logging.getLogger(__name__)
+
+# the chance we assume a test fails because code it covers just changed -- only its rank against
+# the flake rates matters, not the exact value
+CHANGE_FAILURE_PRIOR = 0.2
+HISTORY_RUNS = 20  # stored runs to pool flake rates over
+STOP = "stop"
+DOWNGRADE = "downgrade"
+
+
+def changed_files(path: str, since: str) -> List[str]:
+    """
+    the .py files changed between since and the working tree (so uncommitted changes count),
+    or nothing if path isn't a git checkout or since isn't a commit in it
+    """
+    try:
+        root = subprocess.run(
+            ["git", "-C", path, "rev-parse", "--show-toplevel"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        output = subprocess.run(
+            ["git", "-C", path, "diff", "--name-only", since],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Couldn't diff {path} against {since}, ignoring changes: {e}")
+        return []
+    return [os.path.join(root, name) for name in output.splitlines() if name.endswith(".py")]
+
+
+def failure_likelihood(flake_rate: float, covers_change: bool) -> float:
+    """
+    the chance a test fails either way, treating flakiness and breaking changes as independent
+    """
+    change = CHANGE_FAILURE_PRIOR if covers_change else 0.0
+    return 1 - (1 - flake_rate) * (1 - change)
+
+
+def prioritize(
+    path: str,
+    tests: List[str],
+    module_map: Dict[str, List[str]],
+    flake_rates: Dict[str, float],
+    changed: List[str],
+) -> List[str]:
+    """
+    orders tests by failure likelihood, likeliest first; ties keep their original order.
+    flake_rates are keyed by test path relative to the project, as in store.ResultsStore
+    """
+    changed = {os.path.abspath(file) for file in changed}
+    covering_change: Set[str] = set()
+    for file in changed:
+        covering_change.update(module_map.get(collect._module_name_from_path(file), []))
+
+    def likelihood(test: str) -> float:
+        covers_change = test in covering_change or os.path.abspath(test) in changed
+        return failure_likelihood(flake_rates.get(os.path.relpath(test, path), 0.0), covers_change)
+
+    ordered = sorted(tests, key=likelihood, reverse=True)
+    logger.info(
+        f"Prioritized {len(tests)} test(s): {len(covering_change & set(tests))} cover changed "
+        f"modules, {sum(1 for test in tests if flake_rates.get(os.path.relpath(test, path)))} "
+        "have flaked before"
+    )
+    return ordered
+
+
+def warns(result: Dict) -> bool:
+    """
+    whether a test's results (as in run_tests' results) are what --fail-on-warn fails a run for:
+    it failed, flaked or hung
+    """
+    return (not result["passed"]) or result["flakes"] > 0 or result.get("timeouts", 0) > 0
+
+
+"""
+Tracks the failures of a run as it goes, and decides what happens to the tests still to come once
+there are max_failures of them
+"""
+
+
+@dataclass
+class FailFast:
+    max_failures: int = 1
+    mode: str = STOP  # STOP, or DOWNGRADE the remaining tests to a single trial
+    failures: int = 0
+
+    @property
+    def tripped(self) -> bool:
+        return self.failures >= self.max_failures
+
+    @property
+    def stopped(self) -> bool:
+        return self.tripped and self.mode == STOP
+
+    def trials_for(self, trials: int) -> int:
+        return 1 if self.tripped and self.mode == DOWNGRADE else trials
+
+    def observe(self, result):
+        if result.trials and warns(vars(result)):
+            self.failures += 1
+            if self.failures == self.max_failures:
+                action = "stopping" if self.mode == STOP else "running one trial of each test"
+                logger.warning(
+                    f"{self.failures} test(s) already failed the run, {action} from here"
+                )
@@ -0,0 +1,189 @@
+"""
+Machine-readable output for a bubblewrap run: an NDJSON stream of events written as the run goes --
+one as it starts, one per trial and one as it ends -- and a JSON summary document with each test's
+results written once it's over, so dashboards never have to parse our logs. Also saves and loads
+the raw results of a run, so they can be analyzed again later without re-running anything.
+"""
+
+import os
+import json
+import time
+import logging
+
+from typing import Dict, List
+from dataclasses import asdict
+
+import columnar
+
+from summarize import ModuleCollection
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+# results saved with this suffix use the binary columnar format in columnar.py, not JSON
+COLUMNAR_SUFFIX = ".bw"
+
+# bytes of events we let pile up in memory before handing them to the OS, and the longest we'll
+# sit on buffered events -- keeps the per-trial cost to a json.dumps and a list append
+BUFFER_SIZE = 1 << 16
+FLUSH_INTERVAL = 1.0  # seconds
+
+
+def summary_path_for(report_path: str) -> str:
+    """
+    the summary document lives next to the event stream: results.ndjson -> results.summary.json
+    """
+    root, _ = os.path.splitext(report_path)
+    return f"{root}.summary.json"
+
+
+"""
+Streams report events to disk. Events are encoded as they arrive but written in batches, so even
+hundreds of thousands of trials cost next to nothing on top of the trials themselves, while a
+reader tailing the file is never more than FLUSH_INTERVAL behind.
+"""
+
+
+class ReportWriter:
+    def __init__(self, report_path: str):
+        self.report_path = report_path
+        self.summary_path = summary_path_for(report_path)
+        self.events = 0
+        self._file = open(report_path, "w", encoding="utf-8")
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        self._started = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def emit(self, event: str, **fields):
+        line = json.dumps({"event": event, **fields}, separators=(",", ":")) + "\n"
+        self._pending.append(line)
+        self._pending_bytes += len(line)
+        self.events += 1
+        if (
+            self._pending_bytes >= BUFFER_SIZE
+            or time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def start(self, path: str, trials: int, tests: int):
+        self.emit("run_start", path=path, trials=trials, tests=tests, time=self._started)
+
+    def trial(self, test, trial: int, passed: bool, runtime: float):
+        """
+        matches the on_trial callback signature of run.run_tests()
+        """
+        # the trial was just recorded, so its outcome (which may be a timeout) is the latest one
+        outcome = test.history[-1][0] if test.history else ("passed" if passed else "failed")
+        self.emit(
+            "trial",
+            test=test.test_path,
+            trial=trial,
+            outcome=outcome,
+            runtime_ms=runtime,
+        )
+
+    def summary(self, summary: Dict):
+        """
+        writes the summary document in one go -- via a temp file, so a reader never sees half of it
+        -- and closes out the event stream
+        """
+        summary = {"started": self._started, "finished": time.time(), **summary}
+        tmp_path = f"{self.summary_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=list)
+        os.replace(tmp_path, self.summary_path)
+        self.emit("run_end", events=self.events + 1, summary=self.summary_path)
+        self.flush()
+        logger.info(f"Wrote {self.events} report events to {self.report_path}")
+
+    def flush(self):
+        if self._pending:
+            self._file.write("".join(self._pending))
+            self._pending, self._pending_bytes = [], 0
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def summarize_run(
+    test_results: Dict,
+    module_collection: ModuleCollection,
+    flakiest: Dict,
+    slowest,
+    recommendations,
+    noise_profile=None,
+    failure_clusters: List = None,
+) -> Dict:
+    """
+    assembles the summary document from the analysis results, leaving out the per-trial history
+    that's already in the event stream; failure_clusters are signatures.Clusters
+    """
+    tests = {
+        path: {key: value for key, value in result.items() if key != "history"}
+        for path, result in test_results["tests"].items()
+    }
+    return {
+        "tests": tests,
+        "modules": [asdict(module) for module in module_collection.modules],
+        "flakiest_modules": flakiest,
+        "slowest_modules": slowest,
+        "recommendations": sorted(recommendations),
+        "noise": asdict(noise_profile) if noise_profile else None,
+        "failure_clusters": [asdict(cluster) for cluster in failure_clusters or []],
+    }
+
+
+def save_results(
+    results_path: str,
+    path: str,
+    module_map: Dict,
+    test_results: Dict,
+    noise=None,
+    module_times: Dict = None,
+):
+    """
+    writes everything that summarize and analyze need to reproduce this run's findings, plus the
+    host's noise profile (see noise.calibrate) when the trials were timed here, and the time
+    sampled in each app module (see sampler.py) when asked for -- as JSON, or as a columnar .bw
+    file if results_path ends in .bw
+    """
+    if results_path.endswith(COLUMNAR_SUFFIX):
+        noise = asdict(noise) if noise else None
+        columnar.write_results(results_path, path, module_map, test_results, noise, module_times)
+        return
+
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": RESULTS_VERSION,
+                "path": path,
+                "module_map": module_map,
+                "test_results": test_results,
+                "noise": asdict(noise) if noise else None,
+                "module_times": module_times,
+            },
+            f,
+        )
+    logger.info(f"Saved results to {results_path}")
+
+
+def load_results(results_path: str) -> Dict:
+    if results_path.endswith(COLUMNAR_SUFFIX):
+        return columnar.load_results(results_path)
+
+    with open(results_path, encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{results_path} isn't a bubblewrap results file we know how to read")
+    return saved
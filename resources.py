@@ -0,0 +1,215 @@
+"""
+How much of the machine we may actually use, and how to share it between concurrent trials without
+running out of memory.
+
+The CPUs we can use are the ones our affinity mask allows, capped by any cgroup v2 CPU quota (a
+container limited to 2 CPUs on a 64 core host gets 2, not 32); the memory is whatever's left under
+the tightest cgroup v2 memory limit, or what the kernel says is available if that's less.
+
+Each trial's footprint is how far its peak RSS rose above where the process started it. Footprints
+are learned as trials run and can be kept between runs, so concurrent trials are packed so that
+their combined footprint fits the memory we have -- as many at once as fit, never more.
+"""
+
+import os
+import sys
+import json
+import math
+import logging
+
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+PROC_CGROUP = "/proc/self/cgroup"
+MEMINFO = "/proc/meminfo"
+MiB = 1024 * 1024
+# what a test nobody's measured yet is assumed to need, when no test has been measured at all
+DEFAULT_FOOTPRINT = 128 * MiB
+# the share of usable memory trials may take -- the rest is headroom for whatever we misjudged
+MEMORY_HEADROOM = 0.8
+# how much of a test's old footprint survives a new, smaller measurement
+DECAY = 0.9
+FOOTPRINTS_VERSION = 1
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_dirs(root: str = CGROUP_ROOT, proc_cgroup: str = PROC_CGROUP) -> List[str]:
+    """
+    the cgroup v2 directories we're in, innermost first -- a limit on any of them applies to us
+    """
+    contents = _read(proc_cgroup) or ""
+    for line in contents.splitlines():
+        if line.startswith("0::"):
+            relative = line[3:].strip("/")
+            break
+    else:
+        return []
+    dirs, parts = [], relative.split("/") if relative else []
+    while True:
+        dirs.append(os.path.join(root, *parts))
+        if not parts:
+            return dirs
+        parts.pop()
+
+
+def usable_cpus(root: str = CGROUP_ROOT, proc_cgroup: str = PROC_CGROUP) -> int:
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    for cgroup in _cgroup_dirs(root, proc_cgroup):
+        cpu_max = _read(os.path.join(cgroup, "cpu.max"))
+        if cpu_max and not cpu_max.startswith("max"):
+            quota, period = cpu_max.split()
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    return max(1, cpus)
+
+
+def usable_memory(
+    root: str = CGROUP_ROOT, proc_cgroup: str = PROC_CGROUP, meminfo: str = MEMINFO
+) -> int:
+    """
+    bytes of memory we could still use, or None if neither cgroups nor /proc/meminfo say
+    """
+    limits = []
+    for line in (_read(meminfo) or "").splitlines():
+        if line.startswith("MemAvailable:"):
+            limits.append(int(line.split()[1]) * 1024)
+    for cgroup in _cgroup_dirs(root, proc_cgroup):
+        memory_max = _read(os.path.join(cgroup, "memory.max"))
+        current = _read(os.path.join(cgroup, "memory.current"))
+        if memory_max and memory_max != "max" and current:
+            limits.append(max(0, int(memory_max) - int(current)))
+    return min(limits) if limits else None
+
+
+def _status_kb(field: str) -> int:
+    for line in (_read("/proc/self/status") or "").splitlines():
+        if line.startswith(field):
+            return int(line.split()[1]) * 1024
+    return None
+
+
+def reset_peak_rss() -> int:
+    """
+    resets this process's peak RSS to its current RSS (Linux only), returning the current RSS --
+    measure a trial's footprint as peak_rss() afterwards minus this. None if the peak can't be
+    reset, since it would still be the process's lifetime peak, left over from earlier trials
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return None
+    return _status_kb("VmRSS:")
+
+
+def peak_rss() -> int:
+    peak = _status_kb("VmHWM:")
+    if peak is None:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # in bytes on macOS, KiB everywhere else
+        if sys.platform != "darwin":
+            peak *= 1024
+    return peak
+
+
+"""
+Represents the footprint (in bytes) of each test as of the last time it ran, optionally cached on
+disk between runs, keyed by test path relative to the project
+"""
+
+
+class Footprints:
+    def __init__(self, path: str, cache_path: str = None):
+        self.path = path
+        self.cache_path = cache_path
+        self.footprints = self._load()
+
+    def get(self, test_path: str) -> int:
+        footprint = self.footprints.get(os.path.relpath(test_path, self.path))
+        if footprint is None:
+            # assume the worst of a test we know nothing about
+            footprint = max(self.footprints.values(), default=DEFAULT_FOOTPRINT)
+        return footprint
+
+    def update(self, test_path: str, footprint: int):
+        key = os.path.relpath(test_path, self.path)
+        self.footprints[key] = max(footprint, int(self.footprints.get(key, 0) * DECAY))
+
+    def save(self):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": FOOTPRINTS_VERSION, "tests": self.footprints}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _load(self) -> Dict:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable footprints cache {self.cache_path}: {e}")
+            return {}
+        if saved.get("version") != FOOTPRINTS_VERSION:
+            return {}
+        return saved["tests"]
+
+
+"""
+Packs jobs onto a fixed number of slots (CPUs) so the footprints of those running at once stay
+within a memory budget. A job bigger than the whole budget still runs, alone, so nothing starves
+"""
+
+
+class BinPacker:
+    def __init__(self, slots: int, budget: int = None):
+        self.slots = slots
+        self.budget = budget  # bytes, or None for no limit
+        self.running = {}  # Dict{job key: footprint}
+        self.in_use = 0
+
+    def take(self, pending: List[Tuple[object, int]]) -> List[Tuple[object, int]]:
+        """
+        removes from pending, a list of (unique job key, footprint), the jobs to start now: the
+        biggest ones that still fit first, since the small ones can fill in gaps later
+        """
+        started = []
+        pending.sort(key=lambda job: job[1], reverse=True)
+        i = 0
+        while i < len(pending) and len(self.running) < self.slots:
+            key, footprint = pending[i]
+            if self._fits(footprint):
+                self.running[key] = footprint
+                self.in_use += footprint
+                started.append(pending.pop(i))
+            else:
+                i += 1
+        return started
+
+    def finish(self, key):
+        self.in_use -= self.running.pop(key)
+
+    def _fits(self, footprint: int) -> bool:
+        if self.budget is None or not self.running:
+            return True
+        return self.in_use + footprint <= self.budget
+
+
+def memory_budget() -> int:
+    memory = usable_memory()
+    return None if memory is None else int(memory * MEMORY_HEADROOM)
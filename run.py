@@ -1,18 +1,32 @@
 import pytest
 import time
+import random
 import logging
 import os
-import sys
 import json
 
 
-from typing import List, Dict
-from dataclasses import dataclass, asdict
+from typing import Callable, List, Dict, Tuple
+from contextlib import ExitStack
+from dataclasses import dataclass, asdict, field
 from pytest import ExitCode
 
+import budget
+import resources
+import signatures
+
+from capture import OutputCapture
+from plugin import TrialRecorder, SessionRecorder
+from utils import trace
+
 
 logger = logging.getLogger(__name__)
 
+# per-trial outcomes, as kept in Test.history
+PASSED = "passed"
+FAILED = "failed"
+TIMEOUT = "timeout"
+
 
 """
 Represents a collection of runs of a unit test, including methods to run these
@@ -34,15 +48,145 @@ class Test:
     flakes: int = 0
     flake_rate: float = 0.0
     passed: bool = False
+    timeouts: int = 0
+    # trials run (and thrown away) before the measured ones, to get imports and caches warm
+    warmup: int = 0
+    # bytes: the most any of its trials raised the peak RSS of the process running it (0 where the
+    # peak can't be reset between trials, so there's no telling)
+    footprint: int = field(default=0, compare=False)
+    # (low, high): the 95% Wilson interval on the flake rate -- how far off it might be
+    flake_rate_interval: Tuple = field(default=None, compare=False)
+    # (outcome, runtime) for every trial, in the order they were recorded
+    history: List = field(default_factory=list, compare=False, repr=False)
+    # why trials failed: Dict{signature: {"type", "message", "trials", "samples"}}, see signatures
+    failures: Dict = field(default_factory=dict, compare=False, repr=False)
+    # the output of the trials worth keeping -- failing and slow ones, see capture.OutputStore
+    outputs: List = field(default_factory=list, compare=False, repr=False)
+
+    def run(
+        self,
+        on_trial: Callable = None,
+        watchdog=None,
+        mapper=None,
+        profiler=None,
+        outputs=None,
+        journal=None,
+        deadline: float = None,
+    ):
+        """
+        run this test $trials numbers of times and summarize, calling on_trial(test, trial, passed,
+        runtime) as each trial finishes. Given a deadline.Watchdog, trials run in its worker
+        process instead, so a hung one gets cut off -- and once the watchdog's global timeout is
+        spent, the remaining trials are dropped. Given an execmap.DynamicMapper, an extra trial,
+        unrecorded like the warmup, is traced for the app modules it executes (unless the mapper
+        has them cached already), and given a sampler.SamplingProfiler, the time of every
+        measured trial is attributed to the app modules running (inline trials only). Given a
+        capture.OutputStore, the output of failing and slow trials is kept (inline too), and given
+        a journal.Journal, every trial is journaled. Trials already recorded -- replayed from a
+        journal -- aren't run again, and none are started past the deadline, a time.monotonic()
+        time
+        """
+        remaining = range(len(self.history), self.trials)
+        test_dir, restore = self._enter() if watchdog is None and remaining else (None, None)
+        try:
+            for _ in range(self.warmup if remaining else 0):
+                self._run_one(test_dir, watchdog)
+            # tracing slows a trial down, so the traced one isn't measured
+            if mapper and watchdog is None and remaining and mapper.needs_trace(self.test_path):
+                with mapper.tracing(self.test_path):
+                    self._run_one(test_dir, watchdog)
+
+            # trials is selected by the user
+            for trial in remaining:
+                if (watchdog and watchdog.expired()) or _past(deadline):
+                    logger.warning(f"Out of time, stopping {self.test_path} after {trial} trial(s)")
+                    self.trials = trial
+                    break
+                with self._measuring(watchdog, profiler):
+                    outcome, runtime, failures = self._run_one(test_dir, watchdog)
+                succeeded = outcome == PASSED
+                self.record(succeeded, runtime, timed_out=outcome == TIMEOUT, failures=failures)
+                if journal:
+                    journal.record(self, trial, failures)
+                if outputs is not None and watchdog is None:
+                    outputs.retain(self, trial, outcome, runtime, self._capture.last)
+                if on_trial:
+                    on_trial(self, trial, succeeded, runtime)
+        finally:
+            if restore:
+                restore()
+
+        # summarize trial runs
+        if self.trials:
+            self._calculate()
+
+    def run_trial(self) -> (bool, int):
+        """
+        run exactly one trial of this test and record it, without summarizing -- used when
+        trials are handed out one at a time, e.g. by the distributed coordinator
+        """
+        test_dir, restore = self._enter()
+        try:
+            outcome, runtime, failures = self._run_one(test_dir, None)
+        finally:
+            restore()
+        succeeded = outcome == PASSED
+        self.record(succeeded, runtime, failures=failures)
+        return succeeded, runtime
+
+    def record(
+        self, succeeded: bool, runtime: float, timed_out: bool = False, failures: List = None
+    ):
+        """
+        tally the outcome of one trial -- a trial that timed out neither passed nor failed -- and
+        the signatures.Failures behind it, if it failed
+        """
+        if timed_out:
+            self.timeouts += 1
+            outcome = TIMEOUT
+        elif succeeded:
+            self.passes += 1
+            outcome = PASSED
+        else:
+            self.fails += 1
+            outcome = FAILED
+        self.runtime_sum += runtime
+        self.history.append((outcome, runtime))
+        if failures:
+            signatures.add_trial(self.failures, failures)
 
-    def run(self):
+    def _measuring(self, watchdog, profiler) -> ExitStack:
         """
-        run this test $trials numbers of times and summarize
+        the instrumentation to wrap one measured trial in -- none of it can see into a watchdog's
+        worker process
         """
+        stack = ExitStack()
+        if watchdog is None and profiler:
+            stack.enter_context(profiler.measuring())
+        return stack
 
-        # suppress stdout, stderror for clearer logs
-        old_stdout, old_stderr = sys.stdout, sys.stderr
-        sys.stdout, sys.stderr = open(os.devnull, "w"), open(os.devnull, "w")
+    def _run_one(self, test_dir: str, watchdog) -> (str, float, List):
+        if watchdog:
+            outcome, runtime, failures, footprint = watchdog.run_trial(
+                self.project_path, self.test_path
+            )
+            self.footprint = max(self.footprint, footprint)
+            return outcome, runtime, failures
+        with self._capture.trial():
+            rss = resources.reset_peak_rss()
+            succeeded, runtime, failures = self._test(test_dir)
+            # without a reset, the peak isn't this trial's, so there's no footprint to record
+            if rss is not None:
+                self.footprint = max(self.footprint, resources.peak_rss() - rss)
+        return (PASSED if succeeded else FAILED), runtime, failures
+
+    def _enter(self):
+        """
+        sets up the process for running pytest against this test, returning the test dir and a
+        callable that puts everything back the way it was
+        """
+        # keep pytest's output out of our logs -- trials' output is captured, see _run_one
+        self._capture = OutputCapture()
 
         # set working dir and test dir so pytest can collect the files it needs
         # we'll reset this later, so python continues to work out of the directory
@@ -54,35 +198,35 @@ class Test:
             test_dir = os.path.join(working_dir, self.project_path)
         os.chdir(test_dir)
 
-        # trials is selected by the user
-        remaining = self.trials
-        while remaining:
-            succeeded, runtime = self._test(test_dir)
-            if succeeded:
-                self.passes += 1
-            else:
-                self.fails += 1
-            self.runtime_sum += runtime
-            remaining -= 1
+        def restore():
+            # reset sys defaults so we don't cause unnecessary side effects
+            os.chdir(working_dir)
+            self._capture.close()
+            self._capture = None
 
-        # reset sys defaults so we don't cause unnecessary side effects
-        os.chdir(working_dir)
-        sys.stdout, sys.stderr = old_stdout, old_stderr
-
-        # summarize trial runs
-        self._calculate()
+        return test_dir, restore
 
-    def _test(self, test_dir: str) -> (bool, int):  # pass, fail, runtime
+    def _test(self, test_dir: str) -> (bool, int, List):  # pass, fail, runtime, failures
         """
         this is the method where we actually call pytest for one atomic unit test
         """
         test = os.path.relpath(self.test_path, test_dir)
+        recorder = TrialRecorder()
         start = time.perf_counter()
-        retcode = pytest.main([test, "--rootdir", self.project_path])
+        with trace.span("trial", test=test):
+            retcode = pytest.main([test, "--rootdir", self.project_path], plugins=[recorder])
         runtime = time.perf_counter() - start
+        if recorder.interrupted:
+            # pytest swallows a Ctrl-C, but it's not the test failing -- it's the run being stopped
+            raise KeyboardInterrupt
         # runtimes will be in ms for easier reading
         runtime *= 1000
-        return retcode is ExitCode.OK, runtime
+
+        # whatever the test items didn't spend themselves went to pytest's session overhead
+        trace.count("trials_run")
+        trace.count("pytest_ms", runtime)
+        trace.count("test_item_ms", recorder.item_runtime)
+        return retcode is ExitCode.OK, runtime, recorder.failures
 
     def _calculate(self):
         self.avg_runtime = self.runtime_sum / self.trials
@@ -92,8 +236,14 @@ class Test:
 
         # "flakes" are defined as test results that were the opposite of what "should" have happened
         # so, if in general, this test fails, then the passes are considered flakes, and vice versa
-        self.flakes = self.fails if self.passed else self.passes
+        # (a timeout is never what should have happened)
+        self.flakes = self.fails + self.timeouts if self.passed else self.passes
         self.flake_rate = self.flakes / self.trials
+        self.flake_rate_interval = budget.wilson_interval(self.flakes, self.trials)
+
+
+def _past(deadline: float) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
 
 
 """
@@ -113,21 +263,208 @@ class Results:
         self.tests[test_path] = result
 
 
-def run_tests(path: str, trials: int, collected_tests: List[str]) -> Dict:
+def run_tests(
+    path: str,
+    trials: int,
+    collected_tests: List[str],
+    on_trial: Callable = None,
+    warmup: int = 0,
+    watchdog=None,
+    mapper=None,
+    profiler=None,
+    fail_fast=None,
+    outputs=None,
+    journal=None,
+    deadline: float = None,
+) -> Dict:
     """
     This function intakes the tests collected by the collect.collect_tests() function,
-    instantiates containing objects, and executes summaries of both tests and modules
+    instantiates containing objects, and executes summaries of both tests and modules.
+    on_trial, if given, is called with (test, trial, passed, runtime) after every trial, and
+    each test first runs $warmup trials that aren't recorded. See Test.run for the watchdog,
+    the mapper, the profiler and outputs, and priority.FailFast for fail_fast. Given a
+    journal.Journal, the trials already in it are replayed rather than run again. No trial is
+    started past the deadline, a time.monotonic() time
     """
     results = Results(tests={})
     for test_path in collected_tests:
+        if watchdog and watchdog.expired():
+            logger.warning(f"Global timeout reached, skipping the remaining tests from {test_path}")
+            break
+        if _past(deadline):
+            logger.warning(f"Out of time, skipping the remaining tests from {test_path}")
+            break
+        if fail_fast and fail_fast.stopped:
+            logger.warning(f"Failing fast, skipping the remaining tests from {test_path}")
+            break
         # modules will tend to be interdependent, so we'll probably come across tests
         # we've already run, hence the results cache
         if results.get(test_path):
             logger.info(f"Already ran test: {test_path}")
+            trace.count("results_cache_hits")
         else:
-            result = Test(project_path=path, trials=trials, test_path=test_path)
-            logger.info(f"Running test: {test_path}")
+            test_trials = fail_fast.trials_for(trials) if fail_fast else trials
+            result = Test(project_path=path, trials=test_trials, test_path=test_path, warmup=warmup)
+            if journal and journal.replay(result):
+                logger.info(f"Resuming test: {test_path} after {len(result.history)} trial(s)")
+            else:
+                logger.info(f"Running test: {test_path}")
             # actually run the tests $trials number of times
-            result.run()
-            results.put(test_path, result)
+            with trace.span("test", test=test_path):
+                result.run(
+                    on_trial=on_trial,
+                    watchdog=watchdog,
+                    mapper=mapper,
+                    profiler=profiler,
+                    outputs=outputs,
+                    journal=journal,
+                    deadline=deadline,
+                )
+            if result.trials:
+                results.put(test_path, result)
+                if fail_fast:
+                    fail_fast.observe(result)
+    return asdict(results)
+
+
+def run_budgeted(
+    path: str,
+    time_budget: float,
+    collected_tests: List[str],
+    history: Dict = None,
+    on_trial: Callable = None,
+    warmup: int = 0,
+    watchdog=None,
+    mapper=None,
+    profiler=None,
+    outputs=None,
+    journal=None,
+) -> Dict:
+    """
+    The alternative to run_tests() that fits the trials in time_budget seconds instead of running
+    the same number of each test: one trial of every test first, to learn what each costs, then the
+    rest of the budget handed out by budget.allocate, a round at a time -- history, Dict{test path
+    relative to the project: (trials, flakes, average runtime)}, helps it judge. No trial starts
+    past the budget, and every test ends up with the interval its flake rate is known to. See
+    run_tests for the rest
+    """
+    deadline = time.monotonic() + time_budget
+    results = Results(tests={})
+    for test_path in dict.fromkeys(collected_tests):
+        if _past(deadline):
+            logger.warning(f"Out of time, skipping the remaining tests from {test_path}")
+            break
+        test = Test(project_path=path, trials=1, test_path=test_path, warmup=warmup)
+        if journal:
+            test.trials = max(1, len(journal.completed_trials(test_path)))
+            journal.replay(test)
+        logger.info(f"Running test: {test_path}")
+        with trace.span("test", test=test_path):
+            test.run(
+                on_trial=on_trial,
+                watchdog=watchdog,
+                mapper=mapper,
+                profiler=profiler,
+                outputs=outputs,
+                journal=journal,
+                deadline=deadline,
+            )
+        if test.trials:
+            results.put(test_path, test)
+
+    # hand out the budget in rounds, each with a share of what's left, so every round's trials
+    # go where the ones before it showed the most uncertainty is
+    while not _past(deadline):
+        remaining_ms = (deadline - time.monotonic()) * 1000 * budget.BUDGET_HEADROOM
+        estimates = budget.estimates_for(path, results.tests, history or {})
+        added = budget.allocate(estimates, remaining_ms * budget.ROUND_SHARE)
+        if not any(added.values()):
+            break
+        left = f"{remaining_ms / 1000:.0f}s"
+        logger.debug(f"Handing out {sum(added.values())} more trial(s), with {left} left")
+        for test_path, trials in added.items():
+            if _past(deadline):
+                break
+            if not trials:
+                continue
+            test = results.get(test_path)
+            # the process is warm by now
+            test.trials, test.warmup = test.trials + trials, 0
+            with trace.span("test", test=test_path):
+                test.run(
+                    on_trial=on_trial,
+                    watchdog=watchdog,
+                    mapper=mapper,
+                    profiler=profiler,
+                    outputs=outputs,
+                    journal=journal,
+                    deadline=deadline,
+                )
+    return asdict(results)
+
+
+def run_suite(
+    path: str,
+    trials: int,
+    collected_tests: List[str],
+    on_trial: Callable = None,
+    warmup: int = 0,
+    seed: int = None,
+    journal=None,
+) -> Dict:
+    """
+    The alternative to run_tests() that runs each trial as a single pytest session over every test
+    file, in a fresh random order each time, so session setup and session-scoped fixtures are paid
+    for once per trial rather than once per file -- the way they are in CI. Every file still gets
+    its own Test, with one trial recorded per session: passed if all of its items passed, taking
+    as long as its items took. Given a journal.Journal, the sessions every file has a trial of in
+    it are replayed rather than run again
+    """
+    rng = random.Random(seed)
+    tests = {os.path.abspath(test_path): test_path for test_path in dict.fromkeys(collected_tests)}
+    results = Results(tests={})
+    for test_path in tests.values():
+        results.put(test_path, Test(project_path=path, trials=trials, test_path=test_path))
+
+    done = 0
+    if journal:
+        done = min([trials, *(len(journal.completed_trials(test)) for test in tests.values())])
+        for test in results.tests.values():
+            journal.replay(test, done)
+        if done:
+            logger.info(f"Resuming after {done} session(s)")
+    sessions = [*range(-warmup, 0), *range(done, trials)] if done < trials else []
+
+    session = Test(project_path=path)
+    test_dir, restore = session._enter()
+    try:
+        for trial in sessions:
+            order = list(tests)
+            rng.shuffle(order)
+            recorder = SessionRecorder()
+            with trace.span("session", trial=trial), session._capture.trial():
+                pytest.main(
+                    [*[os.path.relpath(test, test_dir) for test in order], "--rootdir", test_dir],
+                    plugins=[recorder],
+                )
+            if recorder.interrupted:
+                raise KeyboardInterrupt
+            trace.count("sessions_run")
+            if trial < 0:
+                continue  # warmup
+
+            for abspath, test_path in tests.items():
+                # a file pytest never reported on didn't get to run its tests, so it failed
+                succeeded, runtime = recorder.files.get(abspath, (False, 0.0))
+                test = results.get(test_path)
+                test.record(succeeded, runtime, failures=recorder.failures.get(abspath))
+                if journal:
+                    journal.record(test, trial, recorder.failures.get(abspath))
+                if on_trial:
+                    on_trial(test, trial, succeeded, runtime)
+    finally:
+        restore()
+
+    for test in results.tests.values():
+        test._calculate()
     return asdict(results)
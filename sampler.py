@@ -0,0 +1,128 @@
+"""
+A sampling profiler that attributes trial wall time to the app modules actually running, rather
+than to every module a test happens to import. A background thread periodically looks at the stack
+of the thread running trials and charges the time since its last look:
+- as self time, to the innermost app module on the stack -- the app code that's running, or that
+  called into whatever library code is running
+- as cumulative time, to every app module anywhere on the stack
+
+Sampling rather than tracing keeps the overhead to a stack walk every few milliseconds, whatever
+the tests do.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+from typing import Dict, List
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 0.005  # seconds between samples
+
+
+"""
+Represents the time attributed to each app module across all the trials profiled
+"""
+
+
+@dataclass
+class ModuleTimes:
+    self_ms: Dict = field(default_factory=dict)  # Dict{module: ms}
+    cumulative_ms: Dict = field(default_factory=dict)  # Dict{module: ms}
+    samples: int = 0
+
+
+"""
+Samples the stack of the thread that starts it, and attributes time only while measuring
+"""
+
+
+class SamplingProfiler:
+    def __init__(self, app_paths: List[str], interval: float = INTERVAL):
+        self.app_files = {
+            os.path.abspath(app_path): os.path.basename(app_path)[:-3] for app_path in app_paths
+        }
+        self.interval = interval
+        self.times = ModuleTimes()
+        self.by_filename = {}  # memoized co_filename -> module name (or None)
+        self._measuring = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="bubblewrap-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def measuring(self):
+        """
+        only time spent inside this context gets attributed, e.g. measured trials but not warmups
+        """
+        self._measuring = True
+        try:
+            yield
+        finally:
+            self._measuring = False
+
+    def _module_for(self, code) -> str:
+        filename = code.co_filename
+        if filename not in self.by_filename:
+            self.by_filename[filename] = self.app_files.get(os.path.abspath(filename))
+        return self.by_filename[filename]
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = (now - last) * 1000, now
+            if not self._measuring:
+                continue
+            frame = sys._current_frames().get(self._target)
+            innermost, on_stack = None, set()
+            while frame is not None:
+                module = self._module_for(frame.f_code)
+                if module:
+                    if innermost is None:
+                        innermost = module
+                    on_stack.add(module)
+                frame = frame.f_back
+            self.times.samples += 1
+            if innermost:
+                self.times.self_ms[innermost] = self.times.self_ms.get(innermost, 0) + elapsed
+            for module in on_stack:
+                self.times.cumulative_ms[module] = self.times.cumulative_ms.get(module, 0) + elapsed
+
+
+def log_module_times(times: Dict, top_n: int = 10):
+    """
+    times is an asdict()-ed ModuleTimes, as saved with a run's results
+    """
+    self_ms, cumulative_ms = times["self_ms"], times["cumulative_ms"]
+    ranked = sorted(self_ms.items(), key=lambda item: item[1], reverse=True)[:top_n]
+    if not ranked:
+        logger.info(f"None of the {times['samples']} samples landed in app module code")
+        return
+    logger.info(f"Time spent in app modules, from {times['samples']} samples:")
+    for module, ms in ranked:
+        logger.info(f"{module}: {ms:.1f} ms self, {cumulative_ms.get(module, 0):.1f} ms cumulative")
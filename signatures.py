@@ -0,0 +1,174 @@
+"""
+Failure signatures: why a trial failed, boiled down to a short fingerprint that's the same every
+time it fails the same way -- the exception type, its message with the volatile parts (numbers,
+addresses) masked out, and the innermost few frames of the traceback outside pytest and the test
+file itself, named by module and function rather than by path and line number. Capturing one is a
+stack walk and a hash; only the first few failures with each signature are kept as full text.
+
+Clustering the flaky trials of every test by signature turns twenty tests that flake on the same
+port-in-use error into one root cause.
+"""
+
+import re
+import hashlib
+import logging
+
+from typing import Callable, Dict, List
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+FRAMES = 3  # innermost frames that go into a signature
+MAX_MESSAGE_CHARS = 200
+MAX_SAMPLES = 3  # full-text failures kept per test and signature
+MAX_SAMPLE_CHARS = 4000
+# frames from these packages are the same for every failure, so they say nothing about its cause
+HARNESS_PACKAGES = {"_pytest", "pytest", "pluggy"}
+
+ADDRESS = re.compile(r"0x[0-9a-fA-F]+")
+NUMBER = re.compile(r"\d+")
+
+
+"""
+Represents one failure seen in a trial; render() gives its full text, and is only called for the
+failures that get kept as samples
+"""
+
+
+@dataclass
+class Failure:
+    signature: str
+    exc_type: str
+    message: str
+    render: Callable = field(default=None, compare=False, repr=False)
+
+
+def normalize_message(message: str) -> str:
+    """
+    the first line of an exception message, with the parts that differ between otherwise identical
+    failures (ports, pids, addresses, timings) masked out
+    """
+    lines = message.strip().splitlines()
+    first = lines[0] if lines else ""
+    return NUMBER.sub("N", ADDRESS.sub("ADDR", first))[:MAX_MESSAGE_CHARS]
+
+
+def fingerprint(exc_type: str, message: str, frames: List[str]) -> str:
+    key = "\n".join([exc_type, message, *frames])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _frames(tb, test_file: str) -> List[str]:
+    """
+    module:function for the innermost FRAMES frames outside the harness and the test file -- or,
+    when the failure never left the test file, its innermost frame there
+    """
+    frames, in_test_file = [], []
+    while tb is not None:
+        code, module = tb.tb_frame.f_code, tb.tb_frame.f_globals.get("__name__", "")
+        if module.split(".")[0] not in HARNESS_PACKAGES:
+            name = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+            (in_test_file if code.co_filename == test_file else frames).append(name)
+        tb = tb.tb_next
+    return frames[-FRAMES:] or in_test_file[-1:]
+
+
+def from_excinfo(excinfo, test_file: str, render: Callable = None) -> Failure:
+    """
+    the signature of a failure pytest caught, given its ExceptionInfo and the test file it came from
+    """
+    exc_type = excinfo.type.__qualname__
+    message = normalize_message(str(excinfo.value))
+    frames = _frames(excinfo.tb, test_file)
+    return Failure(fingerprint(exc_type, message, frames), exc_type, message, render)
+
+
+def add_trial(failures: Dict, trial_failures: List[Failure]):
+    """
+    tallies one trial's failures into a test's failures, Dict{signature: {"type", "message",
+    "trials", "samples"}}, counting each signature once per trial however many items it failed
+    """
+    seen = {}
+    for failure in trial_failures:
+        seen.setdefault(failure.signature, failure)
+    for signature, failure in seen.items():
+        entry = failures.setdefault(
+            signature,
+            {"type": failure.exc_type, "message": failure.message, "trials": 0, "samples": []},
+        )
+        entry["trials"] += 1
+        if len(entry["samples"]) < MAX_SAMPLES and failure.render:
+            entry["samples"].append(failure.render()[:MAX_SAMPLE_CHARS])
+
+
+def from_summary(failures: Dict) -> List[Failure]:
+    """
+    one trial's failures back out of the failures it was tallied into, e.g. by a worker process
+    """
+    return [
+        Failure(
+            signature,
+            entry["type"],
+            entry["message"],
+            (lambda text=entry["samples"][0]: text) if entry["samples"] else None,
+        )
+        for signature, entry in failures.items()
+    ]
+
+
+"""
+Represents one root cause: a failure signature, and the flaky tests and modules it turned up in
+"""
+
+
+@dataclass
+class Cluster:
+    signature: str
+    exc_type: str
+    message: str
+    trials: int = 0
+    tests: List = field(default_factory=list)
+    modules: List = field(default_factory=list)
+    sample: str = None
+
+
+def cluster_failures(
+    test_results: Dict, module_map: Dict = None, flaky_only: bool = True
+) -> List[Cluster]:
+    """
+    groups the failures of every test (of only the ones that usually pass, when flaky_only, so
+    their failures are flakes) by signature, the signatures that hit the most tests first
+    """
+    modules_for = {}
+    for module, tests in (module_map or {}).items():
+        for test in tests:
+            modules_for.setdefault(test, []).append(module)
+
+    clusters = {}
+    for test_path, result in test_results["tests"].items():
+        if flaky_only and not result["passed"]:
+            continue
+        for signature, entry in result.get("failures", {}).items():
+            cluster = clusters.setdefault(
+                signature, Cluster(signature, entry["type"], entry["message"])
+            )
+            cluster.trials += entry["trials"]
+            cluster.tests.append(test_path)
+            for module in modules_for.get(test_path, []):
+                if module not in cluster.modules:
+                    cluster.modules.append(module)
+            if cluster.sample is None and entry["samples"]:
+                cluster.sample = entry["samples"][0]
+    return sorted(clusters.values(), key=lambda c: (len(c.tests), c.trials), reverse=True)
+
+
+def log_clusters(clusters: List[Cluster], top_n: int = 10):
+    if not clusters:
+        return
+    logger.info(f"Flaky failures come down to {len(clusters)} distinct signature(s):")
+    for cluster in clusters[:top_n]:
+        logger.info(
+            f"[{cluster.signature}] {cluster.exc_type}: {cluster.message} -- "
+            f"{cluster.trials} trial(s) across {len(cluster.tests)} test(s) and "
+            f"{len(cluster.modules)} module(s): {', '.join(sorted(cluster.tests))}"
+        )
@@ -0,0 +1,275 @@
+"""
+Persists every run's per-test and per-module trial data into a SQLite database, so results outlive
+the run that produced them, and provides the queries we need for looking at trends over time
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import subprocess
+
+from typing import Dict, Iterable, List, Tuple
+
+from summarize import ModuleCollection
+
+logger = logging.getLogger(__name__)
+
+# rows per executemany() call -- big enough to amortize the per-statement overhead, small enough
+# that we never hold more than a sliver of a huge run's trials in memory at once
+BATCH_SIZE = 5000
+
+# per-trial outcomes are stored as small ints rather than strings
+OUTCOMES = {"failed": 0, "passed": 1, "timeout": 2}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    commit_sha TEXT,
+    path TEXT,
+    started_at REAL
+);
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    run_id INTEGER NOT NULL,
+    test_id INTEGER NOT NULL,
+    trial INTEGER NOT NULL,
+    outcome INTEGER NOT NULL,
+    runtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS test_runs (
+    run_id INTEGER NOT NULL,
+    test_id INTEGER NOT NULL,
+    trials INTEGER NOT NULL,
+    passes INTEGER NOT NULL,
+    flakes INTEGER NOT NULL,
+    runtime_sum REAL NOT NULL,
+    avg_runtime REAL NOT NULL,
+    PRIMARY KEY (test_id, run_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS module_runs (
+    run_id INTEGER NOT NULL,
+    module TEXT NOT NULL,
+    trials INTEGER NOT NULL,
+    flakes REAL NOT NULL,
+    flake_rate REAL NOT NULL,
+    runtime REAL NOT NULL,
+    PRIMARY KEY (module, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trials_by_test ON trials (test_id, run_id);
+CREATE INDEX IF NOT EXISTS trials_by_run ON trials (run_id);
+CREATE INDEX IF NOT EXISTS test_runs_by_run ON test_runs (run_id);
+CREATE INDEX IF NOT EXISTS runs_by_commit ON runs (commit_sha);
+"""
+
+
+def current_commit(path: str) -> str:
+    """
+    the commit checked out at path, or None if it isn't a git repo (or git isn't around)
+    """
+    try:
+        output = subprocess.run(
+            ["git", "-C", path, "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def _batched(rows: Iterable, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+"""
+Represents the on-disk history of bubblewrap runs. Per-trial rows are kept for anything that needs
+the raw data, but the trend queries all go through the much smaller per-run summary tables, which
+are keyed (test, run) so a single test's history is one index range scan.
+"""
+
+
+class ResultsStore:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._test_ids = {}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_run(
+        self,
+        test_results: Dict,
+        module_collection: ModuleCollection = None,
+        commit: str = None,
+        path: str = None,
+    ) -> int:
+        """
+        persist one run's results -- the dict returned by run.run_tests() and, optionally, the
+        summarized modules -- in a single transaction, returning the new run's id
+        """
+        tests = test_results["tests"]
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (commit_sha, path, started_at) VALUES (?, ?, ?)",
+                (commit, path, time.time()),
+            )
+            run_id = cursor.lastrowid
+
+            test_ids = self._ensure_tests(self._test_key(result) for result in tests.values())
+            for batch in _batched(self._trial_rows(run_id, tests, test_ids)):
+                self.conn.executemany(
+                    "INSERT INTO trials (run_id, test_id, trial, outcome, runtime) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    batch,
+                )
+            for batch in _batched(self._test_run_rows(run_id, tests, test_ids)):
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO test_runs "
+                    "(run_id, test_id, trials, passes, flakes, runtime_sum, avg_runtime) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    batch,
+                )
+            if module_collection is not None:
+                for batch in _batched(
+                    (run_id, m.name, m.trials, m.flakes, m.flake_rate, m.runtime)
+                    for m in module_collection.modules
+                ):
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO module_runs "
+                        "(run_id, module, trials, flakes, flake_rate, runtime) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+        logger.info(f"Stored run {run_id} ({len(tests)} tests) in {self.db_path}")
+        return run_id
+
+    def runtime_history(self, test_path: str, limit: int = None) -> List[Tuple[int, str, float]]:
+        """
+        (run id, commit, average runtime) for every run of a test, oldest first
+        """
+        query = (
+            "SELECT r.id, r.commit_sha, tr.avg_runtime FROM test_runs tr "
+            "JOIN tests t ON t.id = tr.test_id JOIN runs r ON r.id = tr.run_id "
+            "WHERE t.path = ? ORDER BY tr.run_id DESC"
+        )
+        params = [test_path]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return list(reversed(self.conn.execute(query, params).fetchall()))
+
+    def flake_rates(self, last_n: int) -> Dict[str, float]:
+        """
+        each test's flake rate, pooled over all of its trials in the last_n runs
+        """
+        rows = self.conn.execute(
+            "SELECT t.path, SUM(tr.flakes), SUM(tr.trials) FROM test_runs tr "
+            "JOIN tests t ON t.id = tr.test_id "
+            "WHERE tr.run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?) "
+            "GROUP BY tr.test_id",
+            (last_n,),
+        )
+        return {path: flakes / trials for path, flakes, trials in rows if trials}
+
+    def test_stats(self, last_n: int) -> Dict[str, Tuple[int, int, float]]:
+        """
+        each test's (trials, flakes, average runtime), pooled over the last_n runs
+        """
+        rows = self.conn.execute(
+            "SELECT t.path, SUM(tr.trials), SUM(tr.flakes), SUM(tr.runtime_sum) FROM test_runs tr "
+            "JOIN tests t ON t.id = tr.test_id "
+            "WHERE tr.run_id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?) "
+            "GROUP BY tr.test_id",
+            (last_n,),
+        )
+        return {
+            path: (trials, flakes, runtime_sum / trials)
+            for path, trials, flakes, runtime_sum in rows
+            if trials
+        }
+
+    def top_regressions(self, since_commit: str, limit: int = 10) -> List[Dict]:
+        """
+        the tests whose average runtime grew the most between the latest run at since_commit and
+        the latest run overall
+        """
+        # since_commit may be an abbreviated sha -- a range over the hex digits matches every sha
+        # it prefixes while still using the commit index, which LIKE wouldn't
+        baseline = self.conn.execute(
+            "SELECT MAX(id) FROM runs WHERE commit_sha >= ? AND commit_sha < ?",
+            (since_commit, f"{since_commit}g"),
+        ).fetchone()[0]
+        latest = self.conn.execute("SELECT MAX(id) FROM runs").fetchone()[0]
+        if baseline is None or latest is None or baseline == latest:
+            return []
+        rows = self.conn.execute(
+            "SELECT t.path, old.avg_runtime, new.avg_runtime, "
+            "new.avg_runtime - old.avg_runtime AS delta "
+            "FROM test_runs new "
+            "JOIN test_runs old ON old.test_id = new.test_id AND old.run_id = ? "
+            "JOIN tests t ON t.id = new.test_id "
+            "WHERE new.run_id = ? AND delta > 0 "
+            "ORDER BY delta DESC LIMIT ?",
+            (baseline, latest, limit),
+        )
+        return [
+            {"test": path, "before_ms": before, "after_ms": after, "delta_ms": delta}
+            for path, before, after, delta in rows
+        ]
+
+    def _ensure_tests(self, paths: Iterable[str]) -> Dict[str, int]:
+        missing = [(path,) for path in set(paths) if path not in self._test_ids]
+        if missing:
+            self.conn.executemany("INSERT OR IGNORE INTO tests (path) VALUES (?)", missing)
+            for test_id, path in self.conn.execute("SELECT id, path FROM tests"):
+                self._test_ids[path] = test_id
+        return self._test_ids
+
+    def _test_key(self, result: Dict) -> str:
+        """
+        tests are stored relative to their project, so history lines up no matter where the
+        project was checked out
+        """
+        if not result["project_path"]:
+            return result["test_path"]
+        return os.path.relpath(result["test_path"], result["project_path"])
+
+    def _trial_rows(self, run_id: int, tests: Dict, test_ids: Dict):
+        for result in tests.values():
+            test_id = test_ids[self._test_key(result)]
+            for trial, (outcome, runtime) in enumerate(result.get("history", [])):
+                yield run_id, test_id, trial, OUTCOMES[outcome], runtime
+
+    def _test_run_rows(self, run_id: int, tests: Dict, test_ids: Dict):
+        for result in tests.values():
+            yield (
+                run_id,
+                test_ids[self._test_key(result)],
+                result["trials"],
+                result["passes"],
+                result["flakes"],
+                result["runtime_sum"],
+                result["avg_runtime"],
+            )
@@ -0,0 +1,236 @@
+"""
+Stress mode: runs trials while deliberately loading the machine -- busy CPU processes, memory
+churn, disk I/O and other tests' trials co-scheduled alongside -- to surface tests that only flake
+on a crowded CI runner. Each test runs at every load level, and its failure rate and runtime are
+reported against the idle baseline.
+"""
+
+import os
+import time
+import logging
+import tempfile
+import multiprocessing
+
+from typing import Dict, List
+from dataclasses import dataclass, field
+
+import resources
+
+from run import Test
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 4096
+IO_CHUNK = 1024 * 1024
+RAMP_UP = 0.2  # seconds
+# the share of the memory we could still use that each level's memory load takes, leaving the rest
+# for the trials -- or, where there's no telling how much that is, a fixed amount
+MODERATE_MEMORY_SHARE = 0.1
+HEAVY_MEMORY_SHARE = 0.4
+FALLBACK_MEMORY_MB = {"moderate": 256, "heavy": 1024}
+
+
+"""
+Represents one level of background load: how many processes of each kind to run next to the trials
+"""
+
+
+@dataclass
+class LoadLevel:
+    name: str
+    cpu: int = 0  # processes spinning on the CPU
+    memory_mb: int = 0  # memory held and continually re-touched, split over the memory processes
+    memory: int = 0  # processes churning memory
+    io: int = 0  # processes writing, fsyncing and reading back a scratch file
+    co_scheduled: int = 0  # processes running trials of the project's tests alongside
+
+
+def default_levels(cpus: int = None, memory: int = None) -> List[LoadLevel]:
+    """
+    the load levels, scaled to the CPUs and the bytes of memory we may use (by default, what
+    resources.usable_cpus and resources.usable_memory say, cgroup limits included)
+    """
+    cpus = cpus or resources.usable_cpus()
+    memory = memory or resources.usable_memory()
+    if memory:
+        moderate_mb = max(1, int(memory * MODERATE_MEMORY_SHARE) >> 20)
+        heavy_mb = max(2, int(memory * HEAVY_MEMORY_SHARE) >> 20)
+    else:
+        moderate_mb, heavy_mb = FALLBACK_MEMORY_MB["moderate"], FALLBACK_MEMORY_MB["heavy"]
+    return [
+        LoadLevel("idle"),
+        LoadLevel("moderate", cpu=max(1, cpus // 2), memory=1, memory_mb=moderate_mb, io=1),
+        LoadLevel("heavy", cpu=cpus, memory=2, memory_mb=heavy_mb, io=2, co_scheduled=1),
+    ]
+
+
+def parse_levels(spec: str, cpus: int = None, memory: int = None) -> List[LoadLevel]:
+    """
+    picks default levels by name, e.g. "idle,heavy"
+    """
+    levels = {level.name: level for level in default_levels(cpus, memory)}
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in levels]
+    if unknown:
+        raise ValueError(f"unknown load level(s) {unknown}, pick from {list(levels)}")
+    return [levels[name] for name in names]
+
+
+def _cpu_load(stop):
+    while not stop.is_set():
+        for _ in range(100000):
+            pass
+
+
+def _memory_load(stop, megabytes: int):
+    # write one byte per page so the memory is actually resident, and keep doing it so it stays
+    # that way and keeps the memory bus busy
+    buffer = bytearray(megabytes * 1024 * 1024)
+    value = 0
+    while not stop.is_set():
+        value = (value + 1) % 256
+        for offset in range(0, len(buffer), PAGE_SIZE):
+            buffer[offset] = value
+
+
+def _io_load(stop, directory: str):
+    chunk = os.urandom(IO_CHUNK)
+    with tempfile.NamedTemporaryFile(dir=directory) as f:
+        while not stop.is_set():
+            f.seek(0)
+            for _ in range(16):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            while f.read(IO_CHUNK):
+                pass
+
+
+def _co_scheduled_load(stop, project_path: str, test_paths: List[str]):
+    trial = 0
+    while not stop.is_set() and test_paths:
+        test_path = test_paths[trial % len(test_paths)]
+        Test(project_path=project_path, test_path=test_path, trials=1).run_trial()
+        trial += 1
+
+
+"""
+Runs the background processes for a load level for as long as the context is open
+"""
+
+
+class LoadGenerator:
+    def __init__(self, level: LoadLevel, project_path: str = "", test_paths: List[str] = None):
+        self.level = level
+        self.project_path = project_path
+        self.test_paths = test_paths or []
+        self.processes = []
+        self.stop = multiprocessing.Event()
+
+    def __enter__(self):
+        level = self.level
+        loads = [(_cpu_load, ())] * level.cpu
+        if level.memory:
+            loads += [(_memory_load, (max(1, level.memory_mb // level.memory),))] * level.memory
+        loads += [(_io_load, (tempfile.gettempdir(),))] * level.io
+        loads += [(_co_scheduled_load, (self.project_path, self.test_paths))] * level.co_scheduled
+
+        for target, args in loads:
+            process = multiprocessing.Process(target=target, args=(self.stop, *args), daemon=True)
+            process.start()
+            self.processes.append(process)
+        if self.processes:
+            # give the load a moment to get going before anything is measured under it
+            time.sleep(RAMP_UP)
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.processes = []
+
+
+"""
+Represents one test's results at every load level, and how they moved relative to the lightest one
+"""
+
+
+@dataclass
+class StressResult:
+    test_path: str
+    levels: Dict = field(default_factory=dict)  # Dict{level name: Test}
+
+    def flake_rates(self) -> Dict[str, float]:
+        return {name: test.flake_rate for name, test in self.levels.items()}
+
+    def runtimes(self) -> Dict[str, float]:
+        return {name: test.avg_runtime for name, test in self.levels.items()}
+
+    def failure_rates(self) -> Dict[str, float]:
+        """
+        the share of trials that didn't pass at each level -- unlike the flake rate, which counts
+        whichever outcome is in the minority, this sees a test that passes idle and always fails
+        under load
+        """
+        return {name: 1 - test.pass_rate for name, test in self.levels.items()}
+
+    def flake_sensitivity(self) -> float:
+        """
+        how much the failure rate rose from the lightest to the worst load level
+        """
+        rates = list(self.failure_rates().values())
+        return max(rates) - rates[0] if rates else 0.0
+
+    def runtime_sensitivity(self) -> float:
+        """
+        slowdown of the heaviest load level relative to the lightest, e.g. 2.0 for twice as slow
+        """
+        runtimes = list(self.runtimes().values())
+        if not runtimes or not runtimes[0]:
+            return 1.0
+        return runtimes[-1] / runtimes[0]
+
+
+def stress_tests(
+    path: str, trials: int, collected_tests: List[str], levels: List[LoadLevel] = None
+) -> Dict[str, StressResult]:
+    """
+    runs every test $trials times at each load level, lightest first; the load is started once per
+    level and kept up for all the tests run under it
+    """
+    levels = levels or default_levels()
+    results = {test_path: StressResult(test_path) for test_path in collected_tests}
+    for level in levels:
+        logger.info(f"Applying {level.name} load: {level}")
+        with LoadGenerator(level, path, collected_tests):
+            for test_path in collected_tests:
+                test = Test(project_path=path, trials=trials, test_path=test_path)
+                test.run()
+                results[test_path].levels[level.name] = test
+    return results
+
+
+def log_stress_results(results: Dict[str, StressResult]):
+    ranked = sorted(
+        results.values(),
+        key=lambda r: (r.flake_sensitivity(), r.runtime_sensitivity()),
+        reverse=True,
+    )
+    for result in ranked:
+        levels = ", ".join(
+            f"{name}: failure rate {1 - test.pass_rate:.2f}, {test.avg_runtime:.1f} ms"
+            for name, test in result.levels.items()
+        )
+        message = (
+            f"{result.test_path}: failure rate +{result.flake_sensitivity():.2f}, "
+            f"{result.runtime_sensitivity():.2f}x runtime under load ({levels})"
+        )
+        if result.flake_sensitivity() > 0:
+            logger.warning(message)
+        else:
+            logger.info(message)
@@ -18,6 +18,9 @@ class Module:
     total_runtime: float = 0.0
     flake_rate: float = 0.0
     runtime: float = 0.0
+    # ms sampled in this module's own code, and with it anywhere on the stack (see sampler.py)
+    self_time: float = 0.0
+    cumulative_time: float = 0.0
 
 
 """
@@ -83,28 +86,58 @@ class ModuleCollection:
             return self._runtimes_insert_index(runtime, midpt + 1, high)
 
 
-def summarize_module_test_results(app_modules_map: Dict, test_results: Dict) -> ModuleCollection:
+def summarize_module_test_results(
+    app_modules_map: Dict, test_results: Dict, module_times: Dict = None
+) -> ModuleCollection:
     """
     Generates a cache of possible test result combos (yes... it's a lot...), then, from looking up the
     actual tests that were run per module, generates and a ModuleCollection of summarized results from
-    the real project at hand
+    the real project at hand. With module_times from the sampling profiler, a module's runtime is the
+    time actually spent in its code per trial, instead of the whole runtime of the tests covering it
     """
 
     results = test_results["tests"]
     module_collection = ModuleCollection(modules=[], runtimes=[])
+    # lots of modules are covered by exactly the same tests, so each distinct set of tests is only
+    # summed up once: Dict{keyify(tests): (trials, flakes, total runtime)}
+    aggregates = {}
+    # keyify sorts, so skip it for lists we've seen in the very same order (the usual case, since
+    # collect appends tests to every module's list in the same order)
+    keys = {}  # Dict{tuple(tests): keyify(tests)}
     for module_name, tests in app_modules_map.items():
         module = Module(name=module_name)
-        for test in tests:
-            result_vals = results[test]
-            module.trials += result_vals["trials"]
-            module.flakes += result_vals["flakes"]
-            module.total_runtime += result_vals["runtime_sum"]
+        ordered = tuple(tests)
+        key = keys.get(ordered)
+        if key is None:
+            key = keys[ordered] = keyify(tests)
+        if key not in aggregates:
+            aggregates[key] = _aggregate(results, tests)
+        module.trials, module.flakes, module.total_runtime = aggregates[key]
+        if not module.trials:
+            continue
         module.flake_rate = module.flakes / module.trials
         module.runtime = module.total_runtime / module.trials
+        if module_times:
+            module.self_time = module_times["self_ms"].get(module_name, 0.0)
+            module.cumulative_time = module_times["cumulative_ms"].get(module_name, 0.0)
+            module.runtime = module.self_time / module.trials
         module_collection.add(module)
     return module_collection
 
 
+def _aggregate(results: Dict, tests: List[str]) -> (int, float, float):
+    trials, flakes, total_runtime = 0, 0.0, 0.0
+    for test in tests:
+        # results imported from reports only cover the tests that actually ran in CI
+        result_vals = results.get(test)
+        if result_vals is None:
+            continue
+        trials += result_vals["trials"]
+        flakes += result_vals["flakes"]
+        total_runtime += result_vals["runtime_sum"]
+    return trials, flakes, total_runtime
+
+
 def keyify(test_paths: List[str]) -> bytes:
     """
     creates an md5 hash of a sorted list of test paths to serve as a unique key for test result
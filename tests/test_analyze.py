@@ -3,6 +3,7 @@ import os
 import dataclasses
 
 import analyze
+import noise
 
 from random import randint
 from run import Test
@@ -335,3 +336,35 @@ def test_recommend_tests_for_optimization(stable_test_results_mock):
 
     assert isinstance(output, set)
     assert expected in output
+
+
+def test_compare_test_results():
+    def results(project_path, runtimes):
+        return {
+            "tests": {
+                f"{project_path}/tests/{name}": {
+                    "project_path": project_path,
+                    "test_path": f"{project_path}/tests/{name}",
+                    "avg_runtime": runtime,
+                    "flake_rate": 0.0,
+                }
+                for name, runtime in runtimes.items()
+            }
+        }
+
+    # the two runs were made from different checkouts, and test_c.py didn't exist yet
+    before = results("old/checkout", {"test_a.py": 10.0, "test_b.py": 10.0})
+    after = results("new/checkout", {"test_a.py": 12.0, "test_b.py": 30.0, "test_c.py": 5.0})
+    output = analyze.compare_test_results(before, after)
+
+    assert [change["test"] for change in output] == [
+        os.path.join("tests", "test_b.py"),
+        os.path.join("tests", "test_a.py"),
+    ]
+    assert output[0]["delta_ms"] == 20.0
+
+    # with 5% noise, test_a.py's 2 ms doesn't clear the floor, test_b.py's 20 ms does
+    noisy = noise.NoiseProfile(samples=10, median_ms=1.0, mad_ms=0.03, relative_noise=0.05)
+    output = analyze.compare_test_results(before, after, noisy)
+    assert [change["significant"] for change in output] == [True, False]
+    assert output[1]["noise_floor_ms"] > 2.0
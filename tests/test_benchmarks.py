@@ -0,0 +1,46 @@
+import pytest
+
+import collect
+
+from benchmarks import bench
+from benchmarks.synthetic import generate_project
+
+
+@pytest.fixture
+def project(tmp_path):
+    return generate_project(
+        str(tmp_path / "synthetic"), app_modules=20, test_files=10, fanout=3, flake_probability=1.0
+    )
+
+
+def test_generate_project(project):
+    all_files = collect.walk_tree(project.root, bench.EXCLUDE)
+    tests = collect.filter_tests(all_files)
+    assert len(all_files) == 30
+    assert sorted(tests) == sorted(project.tests)
+
+    imports, _ = collect.ImportParser(
+        tests=tests,
+        app_modules=collect.convert_app_paths_to_modules(set(all_files) - set(tests)),
+        module_map={},
+    )._find_imports(tests[0])
+    assert len(imports) == 3
+
+    # every test was made flaky
+    assert all(fail_probability > 0 for _, fail_probability in project.tests.values())
+
+
+def test_simulated_trials(project):
+    test_path = sorted(project.tests)[0]
+    with bench.simulated_trials(project):
+        output = bench.run.run_tests(project.root, 2, [test_path])["tests"][test_path]
+    assert output["trials"] == 2
+    assert output["avg_runtime"] == pytest.approx(project.tests[test_path][0])
+
+
+def test_measure():
+    result, output = bench.measure("sum", 1000, lambda: sum(range(1000)), repeats=2)
+    assert output == sum(range(1000))
+    assert result.items == 1000
+    assert result.seconds > 0
+    assert result.peak_memory_kb >= 0
@@ -0,0 +1,64 @@
+import pytest
+import time
+
+import run
+import budget
+
+
+def test_parse_duration():
+    assert budget.parse_duration("90") == 90
+    assert budget.parse_duration("15m") == 900
+    assert budget.parse_duration("1.5h") == 5400
+    with pytest.raises(ValueError):
+        budget.parse_duration("soon")
+
+
+def test_wilson_interval():
+    low, high = budget.wilson_interval(0, 10)
+    assert low == 0.0
+    assert high == pytest.approx(0.2775, abs=1e-4)
+    low, high = budget.wilson_interval(5, 10)
+    assert (low, high) == (pytest.approx(0.2366, abs=1e-4), pytest.approx(0.7634, abs=1e-4))
+    # more trials, narrower interval
+    assert budget.expected_width(0.5, 100) < budget.expected_width(0.5, 10)
+
+
+def test_allocate():
+    estimates = {
+        "cheap_flaky": budget.Estimate(
+            runtime_ms=10, trials=1, flakes=0, history_trials=50, history_flakes=20
+        ),
+        "cheap_stable": budget.Estimate(runtime_ms=10, trials=1, history_trials=50),
+        "slow_stable": budget.Estimate(runtime_ms=1000, trials=1, history_trials=50),
+    }
+    added = budget.allocate(estimates, 5000)
+
+    cost = sum(added[test] * estimate.runtime_ms for test, estimate in estimates.items())
+    assert cost <= 5000
+    assert added["cheap_flaky"] > added["cheap_stable"] > added["slow_stable"]
+    # nothing left that could still be afforded
+    assert 5000 - cost < 10
+
+
+def test_run_budgeted(monkeypatch):
+    def _test(self, test_dir):
+        time.sleep(0.005)
+        # test_b flakes every third trial
+        return not (self.test_path == "test_b.py" and len(self.history) % 3 == 2), 5.0, []
+
+    monkeypatch.setattr(run.Test, "_test", _test)
+    started = time.monotonic()
+    results = run.run_budgeted("", 0.5, ["test_a.py", "test_b.py"])
+
+    assert time.monotonic() - started < 0.6
+    a, b = results["tests"]["test_a.py"], results["tests"]["test_b.py"]
+    assert b["trials"] > a["trials"] > 1
+    low, high = b["flake_rate_interval"]
+    assert low < b["flake_rate"] < high
+
+
+def test_Test_run_stops_at_deadline(monkeypatch):
+    monkeypatch.setattr(run.Test, "_test", lambda self, test_dir: (True, 1.0, []))
+    test = run.Test(project_path="", test_path="test_x.py", trials=5)
+    test.run(deadline=time.monotonic() - 1)
+    assert test.trials == 0
@@ -0,0 +1,117 @@
+import pytest
+import os
+import gzip
+import time
+
+import run
+import capture
+
+
+@pytest.fixture
+def project(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    # pytest captures what the tests themselves write, but not what its hooks do
+    (tests / "conftest.py").write_text(
+        "import os\n"
+        "import subprocess\n\n"
+        "def pytest_sessionfinish(session):\n"
+        "    os.write(1, b'written to fd 1\\n')\n"
+        "    subprocess.run(['echo', 'from a subprocess'])\n"
+    )
+    (tests / "test_noisy.py").write_text("def test_noisy():\n    assert False\n")
+    return tmp_path
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_OutputCapture_catches_fd_output():
+    output = capture.OutputCapture()
+    try:
+        with output.trial():
+            print("from print")
+            os.write(2, b"from fd 2\n")
+        assert output.last == b"from print\nfrom fd 2\n"
+
+        # each trial starts from scratch, and only its tail is kept
+        with output.trial():
+            os.write(1, b"x" * (capture.TAIL_BYTES + 10))
+        assert output.last.startswith(b"[... 10 earlier bytes dropped ...]\n")
+        assert output.last.endswith(b"x" * capture.TAIL_BYTES)
+    finally:
+        output.close()
+
+
+def test_OutputCapture_bounds_a_flooding_trial(monkeypatch):
+    monkeypatch.setattr(capture, "MAX_TRIAL_BYTES", 4 * capture.TAIL_BYTES)
+    monkeypatch.setattr(capture, "CHECK_INTERVAL", 0.01)
+    output = capture.OutputCapture()
+    written, largest = 0, 0
+    try:
+        with output.trial():
+            for i in range(200):
+                chunk = b"%d\n" % i * 1000
+                os.write(1, chunk)
+                written += len(chunk)
+                largest = max(largest, os.fstat(output.file.fileno()).st_size)
+                time.sleep(0.001)
+    finally:
+        output.close()
+    assert largest < written / 2
+    header, tail = output.last.split(b"\n", 1)
+    assert header.startswith(b"[... ") and header.endswith(b" earlier bytes dropped ...]")
+    assert len(tail) == capture.TAIL_BYTES
+    assert tail.endswith(b"199\n" * 1000)
+
+
+def test_keeps_output_of_failing_trials(project):
+    test_path = str(project / "tests" / "test_noisy.py")
+    outputs = capture.OutputStore()
+    results = run.run_tests(str(project), 2, [test_path], outputs=outputs)
+
+    kept = results["tests"][test_path]["outputs"]
+    assert [record["reason"] for record in kept] == ["failed", "failed"]
+    assert "written to fd 1" in kept[0]["text"]
+    assert "from a subprocess" in kept[0]["text"]
+
+
+def test_no_descriptors_leak(project):
+    test_path = str(project / "tests" / "test_noisy.py")
+    run.run_tests(str(project), 1, [test_path])
+    before = open_fds()
+    for _ in range(5):
+        run.Test(project_path=str(project), test_path=test_path, trials=1).run()
+    assert open_fds() == before
+
+
+def test_OutputStore_keeps_slowest_and_spills(tmp_path):
+    store = capture.OutputStore(str(tmp_path / "output"), spill_bytes=100)
+    tests = [run.Test(test_path=f"test_{i}.py") for i in range(capture.SLOWEST + 5)]
+    for i, test in enumerate(tests):
+        store.retain(test, 0, run.PASSED, float(i), b"y" * 30)
+    store.close()
+
+    kept = [record for test in tests for record in test.outputs]
+    assert len(kept) == capture.SLOWEST
+    assert sorted(record["runtime"] for record in kept) == [float(i) for i in range(5, 15)]
+    # everything ended up on disk, and nothing dropped was left behind
+    assert all(record["text"] is None for record in kept)
+    assert len(os.listdir(tmp_path / "output")) == capture.SLOWEST
+    with gzip.open(kept[0]["path"], "rt") as f:
+        assert f.read() == "y" * 30
+
+
+def test_OutputStore_reads_back_its_own_directory():
+    store = capture.OutputStore(spill_bytes=10)
+    test = run.Test(test_path="test_a.py")
+    store.retain(test, 0, run.FAILED, 1.0, b"z" * 30)
+    directory = store.directory
+    assert os.path.exists(test.outputs[0]["path"])
+    store.close()
+
+    # a temporary directory doesn't outlive the run, so nothing may point into it
+    assert test.outputs[0]["path"] is None
+    assert test.outputs[0]["text"] == "z" * 30
+    assert not os.path.exists(directory)
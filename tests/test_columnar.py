@@ -0,0 +1,79 @@
+import pytest
+
+import run
+import noise
+import report
+import columnar
+
+from dataclasses import asdict
+
+
+def make_results(runtimes):
+    tests = {}
+    for name, trial_runtimes in runtimes.items():
+        test = run.Test(project_path="/project", test_path=f"/project/tests/{name}", trials=0)
+        for trial, runtime in enumerate(trial_runtimes):
+            test.record(trial % 3 != 2, runtime)
+        test.trials = len(trial_runtimes)
+        test._calculate()
+        tests[test.test_path] = test
+    return asdict(run.Results(tests=tests))
+
+
+@pytest.fixture
+def saved(tmp_path):
+    test_results = make_results({"test_a.py": [10.0, 12.0, 11.0], "test_b.py": [5.0]})
+    bw_path = str(tmp_path / "results.bw")
+    columnar.write_results(
+        bw_path, "/project", {"a": ["/project/tests/test_a.py"]}, test_results, None, None
+    )
+    return bw_path, test_results
+
+
+def test_round_trip(saved):
+    bw_path, test_results = saved
+    loaded = report.load_results(bw_path)
+
+    assert loaded["path"] == "/project"
+    assert loaded["module_map"] == {"a": ["/project/tests/test_a.py"]}
+    for test_path, expected in test_results["tests"].items():
+        output = loaded["test_results"]["tests"][test_path]
+        for key in ("trials", "passes", "fails", "flakes", "passed", "runtime_sum", "timeouts"):
+            assert output[key] == expected[key]
+
+
+def test_columns_are_mapped(saved):
+    bw_path, _ = saved
+    with columnar.ColumnarResults(bw_path) as results:
+        assert len(results) == 2
+        assert results.paths == ["tests/test_a.py", "tests/test_b.py"]
+        assert isinstance(results.trials, memoryview)
+        assert results.trials.readonly
+        assert list(results.trials) == [3, 1]
+        assert list(results.trial_runtimes(0)) == [10.0, 12.0, 11.0]
+        assert list(results.trial_outcomes(0)) == [1, 1, 0]
+        assert list(results.trial_runtimes(1)) == [5.0]
+
+
+def test_rejects_other_files(tmp_path):
+    bw_path = tmp_path / "results.bw"
+    bw_path.write_bytes(b"{}" + b"\0" * columnar.HEADER.size)
+    with pytest.raises(ValueError):
+        columnar.ColumnarResults(str(bw_path))
+
+
+def test_diff(tmp_path):
+    before_path, after_path = str(tmp_path / "before.bw"), str(tmp_path / "after.bw")
+    before = make_results({"test_a.py": [10.0, 10.0], "test_b.py": [5.0]})
+    after = make_results({"test_a.py": [30.0, 30.0], "test_c.py": [5.0]})
+    profile = noise.NoiseProfile(samples=10, median_ms=1.0, mad_ms=0.01, relative_noise=0.01)
+    columnar.write_results(before_path, "/project", {}, before, asdict(profile))
+    columnar.write_results(after_path, "/project", {}, after)
+
+    with columnar.ColumnarResults(before_path) as b, columnar.ColumnarResults(after_path) as a:
+        assert noise.from_dict(b.metadata["noise"]) == profile
+        changes = columnar.diff(b, a, profile)
+
+    assert [change["test"] for change in changes] == ["tests/test_a.py"]
+    assert changes[0]["delta_ms"] == 20.0
+    assert changes[0]["significant"]
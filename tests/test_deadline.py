@@ -0,0 +1,89 @@
+import pytest
+import os
+import time
+
+import run
+import deadline
+
+
+@pytest.fixture
+def project(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "test_hangs.py").write_text("import time\n\ndef test_hang():\n    time.sleep(60)\n")
+    (tests / "test_quick.py").write_text("def test_quick():\n    pass\n")
+    return tmp_path
+
+
+def test_Watchdog_times_out_and_replaces_worker(project):
+    with deadline.Watchdog(trial_timeout=2) as watchdog:
+        start = time.monotonic()
+        outcome, runtime, _, _ = watchdog.run_trial(
+            str(project), str(project / "tests/test_hangs.py")
+        )
+        assert outcome == run.TIMEOUT
+        assert time.monotonic() - start < 10
+        assert watchdog.process is None
+
+        # the next trial gets a fresh worker
+        outcome, _, _, _ = watchdog.run_trial(str(project), str(project / "tests/test_quick.py"))
+        assert outcome == run.PASSED
+        assert watchdog.timeouts == 1
+
+
+def test_run_tests_with_watchdog(project):
+    tests = [str(project / "tests/test_hangs.py"), str(project / "tests/test_quick.py")]
+    with deadline.Watchdog(trial_timeout=1) as watchdog:
+        results = run.run_tests(str(project), 2, tests, watchdog=watchdog)
+
+    hangs = results["tests"][tests[0]]
+    assert hangs["timeouts"] == 2
+    assert hangs["passes"] == 0 and hangs["fails"] == 0
+    assert [outcome for outcome, _ in hangs["history"]] == [run.TIMEOUT, run.TIMEOUT]
+    assert results["tests"][tests[1]]["passes"] == 2
+
+
+def test_run_tests_global_timeout(project):
+    tests = [str(project / "tests/test_hangs.py"), str(project / "tests/test_quick.py")]
+    with deadline.Watchdog(trial_timeout=30, global_timeout=1) as watchdog:
+        start = time.monotonic()
+        results = run.run_tests(str(project), 3, tests, watchdog=watchdog)
+        assert time.monotonic() - start < 10
+
+    # the hanging test used up the whole budget on its first trial, so nothing else ran
+    assert results["tests"][tests[0]]["trials"] == 1
+    assert results["tests"][tests[0]]["timeouts"] == 1
+    assert tests[1] not in results["tests"]
+
+
+def test_Watchdog_kills_what_a_hung_trial_started(project):
+    pid_path = project / "child.pid"
+    (project / "tests" / "test_spawns.py").write_text(
+        "import subprocess, time\n\n"
+        "def test_spawn():\n"
+        "    child = subprocess.Popen(['sleep', '60'])\n"
+        f"    open({str(pid_path)!r}, 'w').write(str(child.pid))\n"
+        "    time.sleep(60)\n"
+    )
+    with deadline.Watchdog(trial_timeout=3) as watchdog:
+        outcome, _, _, _ = watchdog.run_trial(str(project), str(project / "tests/test_spawns.py"))
+    assert outcome == run.TIMEOUT
+
+    child = int(pid_path.read_text())
+    for _ in range(50):
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("the hung trial's child process outlived its worker")
+
+
+def test_run_tests_with_watchdog_records_footprints(project, monkeypatch):
+    monkeypatch.setattr(run.resources, "reset_peak_rss", lambda: 1000)
+    monkeypatch.setattr(run.resources, "peak_rss", lambda: 5000)
+    test_path = str(project / "tests/test_quick.py")
+    with deadline.Watchdog(trial_timeout=30) as watchdog:
+        results = run.run_tests(str(project), 1, [test_path], watchdog=watchdog)
+    assert results["tests"][test_path]["footprint"] == 4000
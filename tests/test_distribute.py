@@ -0,0 +1,72 @@
+import pytest
+import socket
+import threading
+
+import distribute
+
+
+# stands in for a remote agent without actually calling into pytest
+class StubAgent(distribute.Agent):
+    def run_unit(self, test_path, trial):
+        return not test_path.endswith("test_fails.py"), 2.0
+
+
+@pytest.fixture
+def tests():
+    return ["project/tests/test_one.py", "project/tests/test_fails.py"]
+
+
+def test_parse_address():
+    assert distribute.parse_address("localhost:8765") == (socket.AF_INET, ("localhost", 8765))
+    assert distribute.parse_address(":8765") == (socket.AF_INET, ("127.0.0.1", 8765))
+    assert distribute.parse_address("unix:/tmp/bw.sock") == (socket.AF_UNIX, "/tmp/bw.sock")
+    assert distribute.parse_address("/tmp/bw.sock") == (socket.AF_UNIX, "/tmp/bw.sock")
+
+
+def test_WorkQueue_reassigns_dead_agent(tests):
+    queue = distribute.WorkQueue("project", 1, tests, heartbeat_timeout=0.0)
+    unit = queue.checkout("dead")
+    assert unit["type"] == "unit"
+
+    # the dead agent never checks back in, so its unit goes back to the front of the queue
+    queue.reap()
+    assert queue.checkout("alive") == unit
+
+
+def test_WorkQueue_ignores_duplicate_results(tests):
+    queue = distribute.WorkQueue("project", 1, tests[:1])
+    unit = queue.checkout("slow")
+    queue.release("slow")
+    assert queue.checkout("fast") == unit
+
+    queue.complete("fast", unit["test"], unit["trial"], True, 1.0)
+    queue.complete("slow", unit["test"], unit["trial"], False, 1.0)
+    assert queue.finished.is_set()
+
+    results = queue.summarize()["tests"][tests[0]]
+    assert results["passes"] == 1
+    assert results["fails"] == 0
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1:0", "unix"])
+def test_Coordinator_end_to_end(tests, tmp_path, address):
+    if address == "unix":
+        address = f"unix:{tmp_path / 'bw.sock'}"
+    queue = distribute.WorkQueue("project", 3, tests)
+    coordinator = distribute.Coordinator(address, queue)
+    coordinator.start()
+
+    agents = [StubAgent(coordinator.bound_address, "project") for _ in range(2)]
+    threads = [threading.Thread(target=agent.run) for agent in agents]
+    for thread in threads:
+        thread.start()
+    assert coordinator.wait(timeout=10)
+    for thread in threads:
+        thread.join(timeout=10)
+    coordinator.stop()
+
+    assert sum(agent.units_run for agent in agents) == 6
+    results = queue.summarize()["tests"]
+    assert results[tests[0]]["passes"] == 3
+    assert results[tests[0]]["avg_runtime"] == 2.0
+    assert results[tests[1]]["fails"] == 3
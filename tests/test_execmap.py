@@ -0,0 +1,83 @@
+import pytest
+import sys
+
+import run
+import execmap
+
+
+@pytest.fixture
+def project(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "dynhelper_a.py").write_text("def f():\n    return 1\n")
+    (tests / "dynhelper_b.py").write_text(
+        "import dynhelper_a\n\ndef g():\n    return dynhelper_a.f() + 1\n"
+    )
+    (tests / "dynhelper_unused.py").write_text("def h():\n    return 3\n")
+    # imports its helper dynamically, so the static import parser can't see it
+    (tests / "test_dynamic.py").write_text(
+        "import importlib\n\n"
+        "def test_g():\n"
+        "    assert importlib.import_module('dynhelper_b').g() == 2\n"
+    )
+    return tmp_path
+
+
+def app_paths(project):
+    return [str(path) for path in (project / "tests").glob("dynhelper_*.py")]
+
+
+def test_ModuleTracer_skips_module_level_code(project):
+    tracer = execmap.ModuleTracer({str(project / "tests" / "mod.py"): "mod"})
+    namespace = {}
+    code = compile("def f():\n    return 1\n", str(project / "tests" / "mod.py"), "exec")
+    with tracer.tracing() as hit:
+        exec(code, namespace)
+    assert hit == set()
+    with tracer.tracing() as hit:
+        namespace["f"]()
+    assert hit == {"mod"}
+
+
+def test_DynamicMapper_maps_executed_modules(project, tmp_path):
+    cache_path = str(tmp_path / "execmap.json")
+    test_path = str(project / "tests" / "test_dynamic.py")
+    mapper = execmap.DynamicMapper(str(project), app_paths(project), cache_path)
+
+    results = run.run_tests(str(project), 2, [test_path], mapper=mapper)
+    assert results["tests"][test_path]["passes"] == 2
+    assert mapper.modules_for(test_path) == ["dynhelper_a", "dynhelper_b"]
+
+    static_map = {"dynhelper_unused": [test_path]}
+    assert mapper.merge(static_map, [test_path]) == {
+        "dynhelper_a": [test_path],
+        "dynhelper_b": [test_path],
+    }
+
+    # the cache holds until the test file changes
+    mapper.save()
+    cached = execmap.DynamicMapper(str(project), app_paths(project), cache_path)
+    assert not cached.needs_trace(test_path)
+    with open(test_path, "a") as f:
+        f.write("\n# changed\n")
+    cached = execmap.DynamicMapper(str(project), app_paths(project), cache_path)
+    assert cached.needs_trace(test_path)
+    assert cached.modules_for(test_path) is None
+
+
+def test_traced_trial_isnt_recorded(project, monkeypatch):
+    test_path = str(project / "tests" / "test_dynamic.py")
+    mapper = execmap.DynamicMapper(str(project), app_paths(project))
+    traced = []
+
+    def _test(self, test_dir):
+        traced.append(sys.gettrace() is not None)
+        return True, 10.0, []
+
+    monkeypatch.setattr(run.Test, "_test", _test)
+    results = run.run_tests(str(project), 3, [test_path], mapper=mapper)
+    if not hasattr(sys, "monitoring"):
+        assert traced == [True, False, False, False]
+    assert len(traced) == 4
+    assert results["tests"][test_path]["trials"] == 3
+    assert results["tests"][test_path]["runtime_sum"] == 30.0
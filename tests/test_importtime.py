@@ -0,0 +1,73 @@
+import pytest
+
+import importtime
+
+OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     heavy_dep
+import time:       500 |        600 |   slow
+import time:        50 |        650 | tests.test_a
+import time:        20 |         20 | json
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "slow.py").write_text("import time\ntime.sleep(0.05)\n")
+    (tmp_path / "fast.py").write_text("")
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "__init__.py").write_text("")
+    (tests / "test_a.py").write_text("import slow\nimport fast\n")
+    (tests / "test_b.py").write_text("import slow\n")
+    (tests / "test_c.py").write_text("import fast\n")
+    return tmp_path
+
+
+def test_parse_importtime():
+    roots = importtime.parse_importtime(OUTPUT)
+    assert [root.name for root in roots] == ["tests.test_a", "json"]
+    test_a = importtime.find_module(roots, "test_a")
+    assert [node.name for node in test_a.walk()] == ["tests.test_a", "slow", "heavy_dep"]
+    assert test_a.children[0].cumulative_us == 600
+
+
+def test_merge_trees():
+    first, second = importtime.parse_importtime(OUTPUT)[0], importtime.parse_importtime(OUTPUT)[0]
+    merged = importtime.merge_trees([first, second])
+    assert merged.cumulative_us == 1300
+    # each file's tree is folded into the root, so the same import is summed across files
+    assert [child.name for child in merged.children] == ["slow"]
+    assert merged.children[0].self_us == 1000
+
+
+def test_profile_imports(project, monkeypatch):
+    monkeypatch.syspath_prepend(str(project))
+    tests = [str(project / "tests" / name) for name in ("test_a.py", "test_b.py", "test_c.py")]
+    module_map = {"slow": tests[:2], "fast": [tests[0], tests[2]]}
+
+    profile = importtime.profile_imports(str(project), tests, module_map, {"slow", "fast"})
+
+    assert set(profile.files) == set(tests)
+    costs = {cost.module: cost for cost in profile.modules}
+    # slow costs ~50 ms in each of the two files that import it, which makes it the costliest
+    assert profile.modules[0].module == "slow"
+    assert costs["slow"].kind == importtime.APP
+    assert costs["slow"].files == tests[:2]
+    assert costs["slow"].mapped_tests == 2
+    assert costs["slow"].cumulative_ms >= 40
+    assert costs["fast"].files == [tests[0], tests[2]]
+
+
+def test_kind_of_without_stdlib_module_names(monkeypatch):
+    # sys.stdlib_module_names is 3.10+, before that it goes by where a module is imported from
+    monkeypatch.delattr(importtime.sys, "stdlib_module_names", raising=False)
+    importtime._in_stdlib.cache_clear()
+    try:
+        assert importtime.kind_of("json.decoder", set()) == importtime.STDLIB
+        assert importtime.kind_of("sys", set()) == importtime.STDLIB
+        assert importtime.kind_of("pytest", set()) == importtime.THIRD_PARTY
+        assert importtime.kind_of("no_such_module", set()) == importtime.THIRD_PARTY
+        assert importtime.kind_of("tests.slow", {"slow"}) == importtime.APP
+    finally:
+        importtime._in_stdlib.cache_clear()
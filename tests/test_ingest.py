@@ -0,0 +1,110 @@
+import pytest
+import os
+import json
+
+import ingest
+import summarize
+
+JUNIT = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites>
+  <testsuite name="pytest" tests="3">
+    <testcase classname="tests.test_apple" name="test_hello" time="0.010" />
+    <testcase classname="tests.test_apple.TestApple" name="test_more" time="0.020" />
+    <testcase classname="tests.test_banana" name="test_hello" time="0.005">
+      <failure message="assert 1 == 0">assert 1 == 0</failure>
+    </testcase>
+  </testsuite>
+</testsuites>
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    tests = tmp_path / "project" / "tests"
+    tests.mkdir(parents=True)
+    for name in ("test_apple.py", "test_banana.py"):
+        (tests / name).write_text("")
+    return str(tmp_path / "project")
+
+
+@pytest.fixture
+def reports(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    (reports / "run1.xml").write_text(JUNIT)
+    (reports / "run2.xml").write_text(
+        JUNIT.replace("<failure", "<skipped").replace("failure>", "skipped>")
+    )
+    (reports / "run3.json").write_text(
+        json.dumps(
+            {
+                "tests": [
+                    {
+                        "nodeid": "tests/test_apple.py::test_hello",
+                        "outcome": "failed",
+                        "setup": {"duration": 0.001},
+                        "call": {"duration": 0.002},
+                        "teardown": {"duration": 0.001},
+                    },
+                    {
+                        "nodeid": "tests/test_banana.py::test_hello",
+                        "outcome": "passed",
+                        "call": {"duration": 0.004},
+                    },
+                ]
+            }
+        )
+    )
+    return str(reports)
+
+
+def test_PathResolver_from_classname(project):
+    resolver = ingest.PathResolver(project)
+    expected = os.path.join(project, "tests", "test_apple.py")
+    assert resolver.from_classname("tests.test_apple") == expected
+    assert resolver.from_classname("tests.test_apple.TestApple") == expected
+
+
+def test_tally_report(project, reports):
+    resolver = ingest.PathResolver(project)
+    output = ingest.tally_report(os.path.join(reports, "run1.xml"), resolver)
+    apple = output[os.path.join(project, "tests", "test_apple.py")]
+    banana = output[os.path.join(project, "tests", "test_banana.py")]
+    assert apple[0] is True
+    assert apple[1] == pytest.approx(30.0)
+    assert banana[0] is False
+
+
+def test_ingest_reports(project, reports):
+    output = ingest.ingest_reports(project, [reports])["tests"]
+    apple = output[os.path.join(project, "tests", "test_apple.py")]
+    banana = output[os.path.join(project, "tests", "test_banana.py")]
+
+    assert apple["trials"] == 3
+    assert apple["passes"] == 2
+    assert apple["fails"] == 1
+    assert banana["trials"] == 3
+    assert banana["fails"] == 1
+    assert banana["runtime_sum"] == pytest.approx(14.0)
+
+
+def test_ingested_results_summarize(project, reports):
+    test_results = ingest.ingest_reports(project, [reports])
+    module_map = {
+        "apple": [os.path.join(project, "tests", "test_apple.py")],
+        "cherry": [os.path.join(project, "tests", "test_cherry.py")],
+    }
+    output = summarize.summarize_module_test_results(module_map, test_results)
+    # cherry's tests never showed up in CI, so there's nothing to summarize for it
+    assert [module.name for module in output.modules] == ["apple"]
+
+
+def test_warns_when_json_reports_cant_stream(project, reports, monkeypatch, caplog):
+    monkeypatch.setattr(ingest, "ijson", None)
+    monkeypatch.setattr(ingest, "_warned_unstreamed", False)
+    resolver = ingest.PathResolver(project)
+    for _ in range(2):
+        cases = list(ingest.iter_json_cases(os.path.join(reports, "run3.json"), resolver))
+        assert len(cases) == 2
+    # once per run, not once per report
+    assert len([r for r in caplog.records if "ijson isn't installed" in r.message]) == 1
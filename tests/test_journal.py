@@ -0,0 +1,104 @@
+import pytest
+import os
+
+import run
+import journal
+import signatures
+
+
+@pytest.fixture
+def project(tmp_path):
+    return str(tmp_path), [
+        str(tmp_path / "tests" / "test_a.py"),
+        str(tmp_path / "tests" / "test_b.py"),
+    ]
+
+
+@pytest.fixture
+def trials(monkeypatch):
+    """
+    fakes trials: test_b fails every other trial, and the run is interrupted at trial number stop
+    """
+    calls = []
+
+    def _test(self, test_dir):
+        calls.append(self.test_path)
+        if len(calls) == trials.stop:
+            raise KeyboardInterrupt
+        if self.test_path.endswith("test_b.py") and len(self.history) % 2:
+            failure = signatures.Failure("abc123", "OSError", "port N in use", lambda: "trace")
+            return False, 20.0, [failure]
+        return True, 10.0, []
+
+    monkeypatch.setattr(run.Test, "_test", _test)
+    trials.calls, trials.stop = calls, None
+    return trials
+
+
+def test_resume_skips_completed_trials(tmp_path, project, trials):
+    path, tests = project
+    journal_path = str(tmp_path / "run.journal")
+    uninterrupted = run.run_tests(path, 4, tests)
+    trials.calls.clear()
+
+    trials.stop = 6
+    with pytest.raises(KeyboardInterrupt):
+        with journal.Journal(journal_path, path) as first:
+            run.run_tests(path, 4, tests, journal=first)
+    assert len(trials.calls) == 6
+
+    trials.calls.clear()
+    trials.stop = None
+    with journal.Journal(journal_path, path, resume=True) as resumed:
+        assert resumed.trials_completed == 5
+        results = run.run_tests(path, 4, tests, journal=resumed)
+
+    # only the trials that never finished ran again
+    assert trials.calls == [tests[1]] * 3
+    for test_path in tests:
+        for key in ("trials", "passes", "fails", "runtime_sum", "history"):
+            assert results["tests"][test_path][key] == uninterrupted["tests"][test_path][key]
+    b = results["tests"][tests[1]]
+    assert b["failures"]["abc123"]["trials"] == b["fails"]
+    assert b["failures"]["abc123"]["samples"] == ["trace"] * b["fails"]
+
+
+def test_resume_drops_half_written_line(tmp_path, project, trials):
+    path, tests = project
+    journal_path = str(tmp_path / "run.journal")
+    with journal.Journal(journal_path, path) as first:
+        run.run_tests(path, 2, tests[:1], journal=first)
+    with open(journal_path, "a") as f:
+        f.write('{"test":"tests/test_a.py","tri')
+
+    with journal.Journal(journal_path, path, resume=True) as resumed:
+        assert resumed.trials_completed == 2
+        run.run_tests(path, 3, tests[:1], journal=resumed)
+
+    with journal.Journal(journal_path, path, resume=True) as reloaded:
+        assert [record["trial"] for record in reloaded.completed_trials(tests[0])] == [0, 1, 2]
+
+
+def test_syncs_in_batches(tmp_path, project, trials, monkeypatch):
+    path, tests = project
+    syncs = []
+    monkeypatch.setattr(os, "fsync", syncs.append)
+    monkeypatch.setattr(journal, "SYNC_TRIALS", 5)
+    with journal.Journal(str(tmp_path / "run.journal"), path) as run_journal:
+        syncs.clear()
+        run.run_tests(path, 12, tests[:1], journal=run_journal)
+        assert len(syncs) == 2
+    # and once more on the way out
+    assert len(syncs) == 3
+
+
+def test_refuses_to_resume_another_projects_journal(tmp_path, project, trials):
+    path, tests = project
+    journal_path = str(tmp_path / "run.journal")
+    with journal.Journal(journal_path, path) as first:
+        run.run_tests(path, 2, tests[:1], journal=first)
+
+    other = tmp_path / "other"
+    other.mkdir()
+    with pytest.raises(ValueError, match="journal of a run of"):
+        journal.Journal(journal_path, str(other), resume=True)
@@ -0,0 +1,39 @@
+import pytest
+import os
+
+import noise
+
+
+def test_parse_cpus():
+    assert noise.parse_cpus("2") == [2]
+    assert noise.parse_cpus("0,2-3") == [0, 2, 3]
+    for spec in ("two", "1-x", "3-1", ","):
+        with pytest.raises(ValueError, match="list of CPUs"):
+            noise.parse_cpus(spec)
+
+
+def test_calibrate():
+    profile = noise.calibrate(samples=5, iterations=1000)
+    assert profile.samples == 5
+    assert profile.median_ms > 0
+    assert profile.relative_noise >= 0
+
+
+def test_NoiseProfile_floor_ms():
+    quiet = noise.NoiseProfile(samples=10, median_ms=1.0, mad_ms=0.0, relative_noise=0.0)
+    assert quiet.floor_ms(100.0, 120.0) == 0.0
+
+    noisy = noise.NoiseProfile(samples=10, median_ms=1.0, mad_ms=0.01, relative_noise=0.01)
+    # 3 sigmas of 1% on two 100 ms measurements
+    assert noisy.floor_ms(100.0, 100.0) == pytest.approx(3 * 2**0.5)
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="needs sched_setaffinity")
+def test_pin():
+    original = os.sched_getaffinity(0)
+    try:
+        cpu = min(original)
+        assert noise.pin([cpu])
+        assert os.sched_getaffinity(0) == {cpu}
+    finally:
+        os.sched_setaffinity(0, original)
@@ -0,0 +1,70 @@
+import pytest
+import os
+
+import orderdep
+
+
+def test_ddmin_single_culprit_takes_log_n_checks():
+    candidates = list(range(64))
+    checks = []
+
+    def fails(subset):
+        checks.append(subset)
+        return 37 in subset
+
+    assert orderdep.ddmin(candidates, fails) == [37]
+    assert len(checks) <= 2 * 6 + 2
+
+
+def test_ddmin_needs_both_culprits():
+    def fails(subset):
+        return 3 in subset and 12 in subset
+
+    assert orderdep.ddmin(list(range(16)), fails) == [3, 12]
+
+
+@pytest.fixture
+def polluted_project(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "shared.py").write_text("STATE = []\n")
+    (tests / "test_polluter.py").write_text(
+        "import shared\n\ndef test_pollute():\n    shared.STATE.append(1)\n"
+    )
+    (tests / "test_victim.py").write_text(
+        "import shared\n\ndef test_clean():\n    assert shared.STATE == []\n"
+    )
+    for i in range(6):
+        (tests / f"test_innocent_{i}.py").write_text("def test_nothing():\n    pass\n")
+    return tmp_path
+
+
+def test_find_polluters(polluted_project):
+    tests = sorted(str(path) for path in (polluted_project / "tests").glob("test_*.py"))
+    runner = orderdep.SessionRunner(str(polluted_project))
+    found = orderdep.find_polluters(str(polluted_project), tests, sessions=4, seed=1, runner=runner)
+
+    assert len(found) == 1
+    assert os.path.basename(found[0].victim) == "test_victim.py"
+    assert [os.path.basename(p) for p in found[0].polluters] == ["test_polluter.py"]
+    assert runner.sessions < 30
+
+
+def test_random_failures_arent_blamed_on_predecessors(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    # fails every third session it's in, whatever ran before it
+    (tests / "test_flaky.py").write_text(
+        "import pathlib\n\n"
+        "def test_flaky():\n"
+        "    counter = pathlib.Path(__file__).with_name('runs')\n"
+        "    runs = int(counter.read_text()) if counter.exists() else 0\n"
+        "    counter.write_text(str(runs + 1))\n"
+        "    assert runs % 3 != 1\n"
+    )
+    for i in range(6):
+        (tests / f"test_innocent_{i}.py").write_text("def test_nothing():\n    pass\n")
+    paths = sorted(str(path) for path in tests.glob("test_*.py"))
+
+    for seed in (1, 2, 3):
+        assert orderdep.find_polluters(str(tmp_path), paths, sessions=4, seed=seed) == []
@@ -0,0 +1,65 @@
+import pytest
+import os
+import subprocess
+
+import run
+import priority
+
+
+def test_prioritize():
+    tests = ["proj/tests/test_a.py", "proj/tests/test_b.py", "proj/tests/test_c.py"]
+    module_map = {"apple": ["proj/tests/test_c.py"], "banana": ["proj/tests/test_a.py"]}
+    flake_rates = {os.path.join("tests", "test_b.py"): 0.5, os.path.join("tests", "test_a.py"): 0.1}
+    changed = ["proj/app/apple.py"]
+
+    output = priority.prioritize("proj", tests, module_map, flake_rates, changed)
+    # test_b.py flaked half the time, test_c.py covers a change, test_a.py only flaked a little
+    assert output == ["proj/tests/test_b.py", "proj/tests/test_c.py", "proj/tests/test_a.py"]
+
+
+def test_changed_files(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True, capture_output=True)
+
+    git("init", "-q")
+    git("config", "user.email", "test@example.com")
+    git("config", "user.name", "test")
+    (tmp_path / "apple.py").write_text("A = 1\n")
+    (tmp_path / "banana.py").write_text("B = 1\n")
+    git("add", ".")
+    git("commit", "-qm", "first")
+    (tmp_path / "apple.py").write_text("A = 2\n")  # uncommitted changes count too
+
+    output = priority.changed_files(str(tmp_path), "HEAD")
+    assert [os.path.basename(path) for path in output] == ["apple.py"]
+    assert priority.changed_files(str(tmp_path), "not-a-commit") == []
+
+
+@pytest.fixture
+def failing_tests(monkeypatch):
+    def _test(self, test_dir):
+        return not self.test_path.startswith("bad"), 1.0, []
+
+    monkeypatch.setattr(run.Test, "_test", _test)
+    return ["bad_1.py", "good_1.py", "bad_2.py", "good_2.py"]
+
+
+def test_FailFast_stop(failing_tests):
+    fail_fast = priority.FailFast(max_failures=2, mode=priority.STOP)
+    results = run.run_tests("", 3, failing_tests, fail_fast=fail_fast)
+    assert list(results["tests"]) == ["bad_1.py", "good_1.py", "bad_2.py"]
+    assert fail_fast.stopped
+
+
+def test_FailFast_downgrade(failing_tests):
+    fail_fast = priority.FailFast(max_failures=1, mode=priority.DOWNGRADE)
+    results = run.run_tests("", 3, failing_tests, fail_fast=fail_fast)
+    trials = {test: result["trials"] for test, result in results["tests"].items()}
+    assert trials == {"bad_1.py": 3, "good_1.py": 1, "bad_2.py": 1, "good_2.py": 1}
+
+
+def test_warns():
+    assert not priority.warns({"passed": True, "flakes": 0, "timeouts": 0})
+    assert priority.warns({"passed": True, "flakes": 1, "timeouts": 0})
+    assert priority.warns({"passed": False, "flakes": 0})
+    assert priority.warns({"passed": True, "flakes": 0, "timeouts": 2})
@@ -0,0 +1,80 @@
+import pytest
+import json
+
+import run
+import report
+
+from dataclasses import asdict
+from summarize import Module, ModuleCollection
+
+
+def test_summary_path_for():
+    assert report.summary_path_for("out/results.ndjson") == "out/results.summary.json"
+
+
+def test_ReportWriter(tmp_path):
+    report_path = str(tmp_path / "results.ndjson")
+    test = run.Test(project_path="project", test_path="project/tests/test_a.py", trials=2)
+    with report.ReportWriter(report_path) as writer:
+        writer.start("project", 2, 1)
+        for trial, passed in enumerate([True, False]):
+            test.record(passed, 5.0)
+            writer.trial(test, trial, passed, 5.0)
+        test._calculate()
+
+        results = asdict(run.Results(tests={test.test_path: test}))
+        modules = ModuleCollection(modules=[Module(name="a", trials=2)], runtimes=[])
+        writer.summary(report.summarize_run(results, modules, {}, [], {test.test_path}))
+
+    with open(report_path) as f:
+        events = [json.loads(line) for line in f]
+    assert [e["event"] for e in events] == ["run_start", "trial", "trial", "run_end"]
+    assert events[2]["outcome"] == "failed"
+    assert events[2]["runtime_ms"] == 5.0
+
+    with open(writer.summary_path) as f:
+        summary = json.load(f)
+    assert "history" not in summary["tests"][test.test_path]
+    assert summary["tests"][test.test_path]["fails"] == 1
+    assert summary["modules"][0]["name"] == "a"
+    assert summary["recommendations"] == [test.test_path]
+
+
+def test_ReportWriter_buffers(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, "FLUSH_INTERVAL", 3600)
+    report_path = tmp_path / "results.ndjson"
+    writer = report.ReportWriter(str(report_path))
+    writer.emit("trial", test="a")
+    # still sitting in the buffer until we flush, or it fills up
+    assert report_path.read_text() == ""
+    writer.close()
+    assert json.loads(report_path.read_text())["test"] == "a"
+
+
+def test_ReportWriter_keeps_events_of_an_interrupted_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, "FLUSH_INTERVAL", 3600)
+    report_path = tmp_path / "results.ndjson"
+    with pytest.raises(KeyboardInterrupt):
+        with report.ReportWriter(str(report_path)) as writer:
+            writer.start("project", 2, 1)
+            raise KeyboardInterrupt
+    assert json.loads(report_path.read_text())["event"] == "run_start"
+
+
+def test_save_results_round_trip(tmp_path):
+    results_path = str(tmp_path / "results.json")
+    module_map = {"a": ["project/tests/test_a.py"]}
+    test_results = {"tests": {"project/tests/test_a.py": {"trials": 3}}}
+    report.save_results(results_path, "project", module_map, test_results)
+
+    saved = report.load_results(results_path)
+    assert saved["path"] == "project"
+    assert saved["module_map"] == module_map
+    assert saved["test_results"] == test_results
+
+
+def test_load_results_rejects_other_files(tmp_path):
+    results_path = tmp_path / "results.json"
+    results_path.write_text(json.dumps({"tests": {}}))
+    with pytest.raises(ValueError):
+        report.load_results(str(results_path))
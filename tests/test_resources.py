@@ -0,0 +1,105 @@
+import pytest
+import os
+
+import run
+import resources
+
+
+@pytest.fixture
+def cgroups(tmp_path):
+    # a container in /sys/fs/cgroup/ci/job: 1.5 CPUs and 1 GiB on the job, 512 MiB left on ci
+    root = tmp_path / "cgroup"
+    job = root / "ci" / "job"
+    job.mkdir(parents=True)
+    (root / "cpu.max").write_text("max 100000\n")
+    (root / "ci" / "cpu.max").write_text("max 100000\n")
+    (root / "ci" / "memory.max").write_text(f"{2048 * resources.MiB}\n")
+    (root / "ci" / "memory.current").write_text(f"{1536 * resources.MiB}\n")
+    (job / "cpu.max").write_text("150000 100000\n")
+    (job / "memory.max").write_text(f"{1024 * resources.MiB}\n")
+    (job / "memory.current").write_text(f"{256 * resources.MiB}\n")
+    proc_cgroup = tmp_path / "proc_cgroup"
+    proc_cgroup.write_text("0::/ci/job\n")
+    meminfo = tmp_path / "meminfo"
+    meminfo.write_text(f"MemTotal: 67108864 kB\nMemAvailable: {8 * 1024 * 1024} kB\n")
+    return str(root), str(proc_cgroup), str(meminfo)
+
+
+def test_usable_cpus(cgroups):
+    root, proc_cgroup, _ = cgroups
+    assert resources.usable_cpus(root, proc_cgroup) == min(2, len(os.sched_getaffinity(0)))
+    # outside any cgroup, it's just the affinity mask
+    assert resources.usable_cpus(root, "/nonexistent") == len(os.sched_getaffinity(0))
+
+
+def test_usable_memory(cgroups):
+    root, proc_cgroup, meminfo = cgroups
+    # the tightest limit is what's left on the parent cgroup
+    assert resources.usable_memory(root, proc_cgroup, meminfo) == 512 * resources.MiB
+    assert resources.usable_memory(root, "/nonexistent", meminfo) == 8 * 1024 * resources.MiB
+    assert resources.usable_memory(root, "/nonexistent", "/nonexistent") is None
+
+
+def test_peak_rss_measures_a_trial():
+    rss = resources.reset_peak_rss()
+    ballast = bytearray(64 * resources.MiB)
+    ballast[::4096] = b"x" * len(ballast[::4096])  # touch every page
+    footprint = resources.peak_rss() - rss
+    del ballast
+    assert footprint >= 60 * resources.MiB
+
+
+def test_peak_rss_without_proc(monkeypatch):
+    import resource
+
+    monkeypatch.setattr(resources, "_status_kb", lambda field: None)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    monkeypatch.setattr(resources.sys, "platform", "darwin")  # where ru_maxrss is in bytes
+    assert maxrss <= resources.peak_rss() < maxrss * 1024
+    monkeypatch.setattr(resources.sys, "platform", "linux")
+    assert resources.peak_rss() >= maxrss * 1024
+
+
+def test_no_footprint_without_reset(monkeypatch):
+    monkeypatch.setattr(resources, "reset_peak_rss", lambda: None)
+    monkeypatch.setattr(run.Test, "_test", lambda self, test_dir: (True, 1.0, []))
+    test = run.Test(project_path="", test_path="test_x.py", trials=2)
+    test.run()
+    assert test.footprint == 0
+
+
+def test_BinPacker():
+    packer = resources.BinPacker(slots=3, budget=100)
+    pending = [("a", 60), ("b", 50), ("c", 30), ("d", 10), ("e", 10)]
+
+    # the biggest that fit go first, and small ones fill the gap
+    assert packer.take(pending) == [("a", 60), ("c", 30), ("d", 10)]
+    assert packer.take(pending) == []
+    packer.finish("a")
+    assert packer.take(pending) == [("b", 50)]
+    assert pending == [("e", 10)]
+
+    # a job bigger than the whole budget still runs, but alone
+    packer = resources.BinPacker(slots=2, budget=100)
+    pending = [("huge", 500), ("small", 1)]
+    assert packer.take(pending) == [("huge", 500)]
+    packer.finish("huge")
+    assert packer.take(pending) == [("small", 1)]
+
+
+def test_Footprints(tmp_path):
+    cache_path = str(tmp_path / "footprints.json")
+    footprints = resources.Footprints("/project", cache_path)
+    assert footprints.get("/project/tests/test_a.py") == resources.DEFAULT_FOOTPRINT
+
+    footprints.update("/project/tests/test_a.py", 1000)
+    footprints.update("/project/tests/test_b.py", 300)
+    # a smaller measurement only wears the old footprint down gradually
+    footprints.update("/project/tests/test_a.py", 100)
+    footprints.save()
+
+    reloaded = resources.Footprints("/project", cache_path)
+    assert reloaded.get("/project/tests/test_a.py") == 900
+    assert reloaded.get("/project/tests/test_b.py") == 300
+    # unknown tests are assumed to be as big as the biggest we know
+    assert reloaded.get("/project/tests/test_new.py") == 900
@@ -55,3 +55,64 @@ def test_run_tests(paths):
 
     assert isinstance(module_list, dict)
     assert len(module_list.get("tests")) == 4
+
+
+def test_Test_run_warmup(monkeypatch):
+    calls = []
+
+    def _test(self, test_dir):
+        calls.append(test_dir)
+        # the first (warmup) trial is the slow, cold one
+        return True, 100.0 if len(calls) == 1 else 10.0, []
+
+    monkeypatch.setattr(run.Test, "_test", _test)
+    test = run.Test(project_path="", test_path="test_x.py", trials=3, warmup=1)
+    test.run()
+
+    assert len(calls) == 4
+    assert test.trials == 3
+    assert test.avg_runtime == 10.0
+
+
+def test_Test_record_timeout():
+    test = run.Test(trials=4)
+    test.record(True, 10.0)
+    test.record(True, 10.0)
+    test.record(True, 10.0)
+    test.record(False, 1000.0, timed_out=True)
+    test._calculate()
+
+    assert (test.passes, test.fails, test.timeouts) == (3, 0, 1)
+    assert test.history[-1] == (run.TIMEOUT, 1000.0)
+    assert test.passed
+    assert test.flakes == 1
+
+
+def test_run_suite(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    # a session-scoped fixture that logs each time it's set up
+    (tests / "conftest.py").write_text(
+        "import pytest\n\n"
+        "@pytest.fixture(scope='session')\n"
+        "def expensive():\n"
+        f"    with open({str(tmp_path / 'setups.log')!r}, 'a') as f:\n"
+        "        f.write('x')\n"
+    )
+    (tests / "test_suite_one.py").write_text("def test_one(expensive):\n    pass\n")
+    (tests / "test_suite_two.py").write_text("def test_two(expensive):\n    pass\n")
+    (tests / "test_suite_bad.py").write_text("def test_bad():\n    assert False\n")
+    collected = sorted(str(path) for path in tests.glob("test_suite_*.py"))
+
+    trials = []
+    results = run.run_suite(
+        str(tmp_path), 3, collected, on_trial=lambda *args: trials.append(args), seed=1
+    )
+
+    assert (tmp_path / "setups.log").read_text() == "xxx"  # once per session, not per file
+    assert len(trials) == 3 * 3
+    bad = results["tests"][str(tests / "test_suite_bad.py")]
+    one = results["tests"][str(tests / "test_suite_one.py")]
+    assert (bad["trials"], bad["fails"], bad["passed"]) == (3, 3, False)
+    assert (one["trials"], one["passes"], one["passed"]) == (3, 3, True)
+    assert one["runtime_sum"] > 0
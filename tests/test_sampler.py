@@ -0,0 +1,40 @@
+import pytest
+import time
+
+import sampler
+
+
+@pytest.fixture
+def modules(tmp_path):
+    """
+    outer.py spends a little time itself, and calls into inner.py, which spends a lot more
+    """
+    namespace = {"time": time}
+    inner = tmp_path / "inner.py"
+    outer = tmp_path / "outer.py"
+    inner_code = (
+        "def spin(seconds):\n"
+        "    end = time.perf_counter() + seconds\n"
+        "    while time.perf_counter() < end:\n"
+        "        pass\n"
+    )
+    outer_code = "def work():\n    spin(0.3)\n    end = time.perf_counter() + 0.05\n"
+    outer_code += "    while time.perf_counter() < end:\n        pass\n"
+    exec(compile(inner_code, str(inner), "exec"), namespace)
+    exec(compile(outer_code, str(outer), "exec"), namespace)
+    return [str(inner), str(outer)], namespace["work"]
+
+
+def test_SamplingProfiler_self_and_cumulative(modules):
+    app_paths, work = modules
+    with sampler.SamplingProfiler(app_paths, interval=0.002) as profiler:
+        work()  # not measuring, so not attributed
+        with profiler.measuring():
+            work()
+
+    times = profiler.times
+    assert times.samples > 0
+    assert times.self_ms["inner"] > times.self_ms["outer"]
+    # outer is on the stack the whole time, inner only while it's called
+    assert times.cumulative_ms["outer"] >= times.cumulative_ms["inner"]
+    assert times.cumulative_ms["outer"] == pytest.approx(350, rel=0.5)
@@ -0,0 +1,89 @@
+import pytest
+
+import run
+import plugin
+import deadline
+import signatures
+
+from types import SimpleNamespace
+
+
+@pytest.fixture
+def project(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "conftest.py").write_text(
+        "import random\n"
+        "import pytest\n\n"
+        "def bind(port):\n"
+        "    raise OSError(98, f'Address already in use: 127.0.0.1:{port}')\n\n"
+        "@pytest.fixture\n"
+        "def server():\n"
+        "    bind(random.randint(1024, 65535))\n"
+    )
+    (tests / "test_api.py").write_text("def test_api(server):\n    pass\n")
+    (tests / "test_db.py").write_text("def test_db(server):\n    pass\n")
+    (tests / "test_math.py").write_text("def test_math():\n    assert 1 + 1 == 3\n")
+    return tmp_path
+
+
+def test_normalize_message():
+    assert signatures.normalize_message("[Errno 98] port 8080 in use\nmore") == (
+        "[Errno N] port N in use"
+    )
+    assert signatures.normalize_message("<object at 0x7f3a2b>") == "<object at ADDR>"
+
+
+def test_node_file_before_pytest_7():
+    # pytest 6.2 nodes only have fspath
+    assert plugin._node_file(SimpleNamespace(fspath="/p/tests/test_a.py")) == "/p/tests/test_a.py"
+
+
+def test_same_cause_same_signature(project):
+    tests = [
+        str(project / "tests" / name) for name in ("test_api.py", "test_db.py", "test_math.py")
+    ]
+    results = run.run_tests(str(project), 2, tests)
+
+    api, db, math = (results["tests"][test]["failures"] for test in tests)
+    assert len(api) == len(db) == len(math) == 1
+    # both die binding a port, whatever the port, so they share a signature; the assert doesn't
+    assert api.keys() == db.keys() != math.keys()
+    entry = next(iter(api.values()))
+    assert entry["type"] == "OSError"
+    assert entry["trials"] == 2
+    assert len(entry["samples"]) == 2
+    assert "Address already in use" in entry["samples"][0]
+
+
+def test_watchdog_brings_failures_back(project):
+    test = str(project / "tests" / "test_api.py")
+    with deadline.Watchdog(trial_timeout=30) as watchdog:
+        in_worker = run.run_tests(str(project), 1, [test], watchdog=watchdog)
+    inline = run.run_tests(str(project), 1, [test])
+    assert in_worker["tests"][test]["failures"].keys() == inline["tests"][test]["failures"].keys()
+
+
+def test_cluster_failures():
+    port_in_use = {"type": "OSError", "message": "[Errno N] in use", "trials": 1, "samples": ["x"]}
+    timeout = {"type": "TimeoutError", "message": "", "trials": 2, "samples": []}
+    test_results = {
+        "tests": {
+            "test_a.py": {"passed": True, "failures": {"abc": port_in_use}},
+            "test_b.py": {"passed": True, "failures": {"abc": port_in_use, "def": timeout}},
+            # always fails, so its failures aren't flakes
+            "test_c.py": {"passed": False, "failures": {"def": timeout}},
+            "test_d.py": {"passed": True},
+        }
+    }
+    module_map = {"server": ["test_a.py", "test_b.py"], "client": ["test_b.py"]}
+
+    clusters = signatures.cluster_failures(test_results, module_map)
+
+    assert [cluster.signature for cluster in clusters] == ["abc", "def"]
+    assert clusters[0].tests == ["test_a.py", "test_b.py"]
+    assert sorted(clusters[0].modules) == ["client", "server"]
+    assert clusters[0].trials == 2
+    assert clusters[0].sample == "x"
+    assert clusters[1].tests == ["test_b.py"]
+    assert len(signatures.cluster_failures(test_results, flaky_only=False)[1].tests) == 2
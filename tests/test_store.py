@@ -0,0 +1,83 @@
+import pytest
+import os
+
+import run
+import store
+
+from dataclasses import asdict
+from summarize import Module, ModuleCollection
+
+
+def make_results(runtimes, passes=None):
+    # builds run.run_tests()-shaped results without calling pytest
+    results = run.Results(tests={})
+    for name, runtime in runtimes.items():
+        test = run.Test(project_path="project", test_path=f"project/tests/{name}", trials=2)
+        test.record(True, runtime)
+        test.record(name not in (passes or []), runtime)
+        test._calculate()
+        results.put(test.test_path, test)
+    return asdict(results)
+
+
+@pytest.fixture
+def results_store(tmp_path):
+    with store.ResultsStore(str(tmp_path / "history.db")) as results_store:
+        yield results_store
+
+
+def test_record_run(results_store):
+    modules = ModuleCollection(modules=[Module(name="apple", trials=2, runtime=3.0)], runtimes=[])
+    run_id = results_store.record_run(make_results({"test_a.py": 3.0}), modules, commit="abc123")
+
+    trials = results_store.conn.execute("SELECT COUNT(*) FROM trials WHERE run_id = ?", (run_id,))
+    assert trials.fetchone()[0] == 2
+    module = results_store.conn.execute("SELECT module, runtime FROM module_runs").fetchall()
+    assert module == [("apple", 3.0)]
+
+
+def test_runtime_history(results_store):
+    for commit, runtime in [("aaa", 1.0), ("bbb", 2.0), ("ccc", 4.0)]:
+        results_store.record_run(make_results({"test_a.py": runtime}), commit=commit)
+
+    history = results_store.runtime_history(os.path.join("tests", "test_a.py"))
+    assert [(commit, runtime) for _, commit, runtime in history] == [
+        ("aaa", 1.0),
+        ("bbb", 2.0),
+        ("ccc", 4.0),
+    ]
+    assert len(results_store.runtime_history(os.path.join("tests", "test_a.py"), limit=2)) == 2
+
+
+def test_flake_rates(results_store):
+    results_store.record_run(make_results({"test_a.py": 1.0, "test_b.py": 1.0}, ["test_b.py"]))
+    results_store.record_run(make_results({"test_a.py": 1.0, "test_b.py": 1.0}))
+
+    rates = results_store.flake_rates(last_n=1)
+    assert rates[os.path.join("tests", "test_b.py")] == 0.0
+
+    rates = results_store.flake_rates(last_n=2)
+    assert rates[os.path.join("tests", "test_a.py")] == 0.0
+    assert rates[os.path.join("tests", "test_b.py")] == 0.25
+
+
+def test_test_stats(results_store):
+    results_store.record_run(make_results({"test_a.py": 1.0, "test_b.py": 1.0}, ["test_b.py"]))
+    results_store.record_run(make_results({"test_a.py": 3.0, "test_b.py": 1.0}))
+
+    stats = results_store.test_stats(last_n=2)
+    assert stats[os.path.join("tests", "test_a.py")] == (4, 0, 2.0)
+    assert stats[os.path.join("tests", "test_b.py")] == (4, 1, 1.0)
+
+
+def test_top_regressions(results_store):
+    results_store.record_run(make_results({"test_a.py": 1.0, "test_b.py": 5.0}), commit="abc123")
+    results_store.record_run(make_results({"test_a.py": 9.0, "test_b.py": 6.0}), commit="def456")
+
+    regressions = results_store.top_regressions("abc")
+    assert [r["test"] for r in regressions] == [
+        os.path.join("tests", "test_a.py"),
+        os.path.join("tests", "test_b.py"),
+    ]
+    assert regressions[0]["delta_ms"] == 8.0
+    assert results_store.top_regressions("def456") == []
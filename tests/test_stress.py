@@ -0,0 +1,66 @@
+import pytest
+
+import run
+import stress
+
+
+def test_parse_levels():
+    levels = stress.parse_levels("idle, heavy", cpus=4)
+    assert [level.name for level in levels] == ["idle", "heavy"]
+    assert levels[1].cpu == 4
+
+    with pytest.raises(ValueError):
+        stress.parse_levels("idle,apocalyptic")
+
+
+def test_default_levels_scale_memory_load(monkeypatch):
+    # a container with 1 GiB to spare gets a tenth of it, and then two fifths
+    levels = {level.name: level for level in stress.default_levels(cpus=4, memory=1 << 30)}
+    assert levels["moderate"].memory_mb == 102
+    assert levels["heavy"].memory_mb == 409
+
+    monkeypatch.setattr(stress.resources, "usable_memory", lambda: None)
+    levels = {level.name: level for level in stress.default_levels(cpus=4)}
+    assert levels["heavy"].memory_mb == stress.FALLBACK_MEMORY_MB["heavy"]
+
+
+def test_LoadGenerator_starts_and_stops_processes():
+    level = stress.LoadLevel("busy", cpu=1, memory=1, memory_mb=1, io=1)
+    with stress.LoadGenerator(level) as load:
+        assert len(load.processes) == 3
+        assert all(process.is_alive() for process in load.processes)
+        processes = list(load.processes)
+    assert not any(process.is_alive() for process in processes)
+
+
+def test_stress_tests(monkeypatch):
+    # a test that slows down and starts failing once there's load in the background
+    def _test(self, test_dir):
+        loaded = bool(stress_level["load"])
+        if self.test_path == "sensitive":
+            return not (loaded and len(self.history) % 2), 20.0 if loaded else 10.0, []
+        if self.test_path == "broken":
+            return not loaded, 10.0, []
+        return True, 10.0, []
+
+    stress_level = {"load": 0}
+    original_enter = stress.LoadGenerator.__enter__
+
+    def __enter__(self):
+        stress_level["load"] = self.level.cpu
+        return original_enter(self)
+
+    monkeypatch.setattr(run.Test, "_test", _test)
+    monkeypatch.setattr(stress.LoadGenerator, "__enter__", __enter__)
+
+    levels = [stress.LoadLevel("idle"), stress.LoadLevel("busy", cpu=1)]
+    results = stress.stress_tests("", 4, ["sensitive", "sturdy", "broken"], levels)
+
+    assert results["sensitive"].flake_rates() == {"idle": 0.0, "busy": 0.5}
+    assert results["sensitive"].flake_sensitivity() == 0.5
+    assert results["sensitive"].runtime_sensitivity() == 2.0
+    assert results["sturdy"].flake_sensitivity() == 0.0
+    assert results["sturdy"].runtime_sensitivity() == 1.0
+    # failing every trial under load is no flake, but it's as load-sensitive as a test gets
+    assert results["broken"].flake_rates() == {"idle": 0.0, "busy": 0.0}
+    assert results["broken"].flake_sensitivity() == 1.0
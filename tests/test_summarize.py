@@ -74,3 +74,49 @@ def test_floor():
     output = summarize.floor(2.7360)
     expected = 2
     assert output == expected
+
+
+def test_summarize_with_module_times():
+    test_results = {
+        "tests": {
+            "test_slow.py": {"trials": 2, "flakes": 0, "runtime_sum": 200.0},
+        }
+    }
+    module_map = {"slow": ["test_slow.py"], "helper": ["test_slow.py"]}
+    module_times = {"self_ms": {"slow": 180.0, "helper": 2.0}, "cumulative_ms": {}, "samples": 10}
+
+    output = summarize.summarize_module_test_results(module_map, test_results, module_times)
+    runtimes = {module.name: module.runtime for module in output.modules}
+    # without module times, both would have the test's whole 100 ms per trial
+    assert runtimes == {"slow": 90.0, "helper": 1.0}
+
+
+def test_summarize_shares_aggregates(monkeypatch):
+    test_results = {
+        "tests": {
+            "test_a.py": {"trials": 2, "flakes": 1, "runtime_sum": 20.0},
+            "test_b.py": {"trials": 2, "flakes": 0, "runtime_sum": 40.0},
+        }
+    }
+    # apple and banana are covered by the same tests, just listed in a different order
+    module_map = {
+        "apple": ["test_a.py", "test_b.py"],
+        "banana": ["test_b.py", "test_a.py"],
+        "cherry": ["test_b.py"],
+    }
+    calls = []
+    aggregate = summarize._aggregate
+
+    def counting_aggregate(results, tests):
+        calls.append(tests)
+        return aggregate(results, tests)
+
+    monkeypatch.setattr(summarize, "_aggregate", counting_aggregate)
+    output = summarize.summarize_module_test_results(module_map, test_results)
+
+    assert len(calls) == 2
+    modules = {module.name: module for module in output.modules}
+    assert modules["apple"].trials == modules["banana"].trials == 4
+    assert modules["apple"].flake_rate == modules["banana"].flake_rate == 0.25
+    assert modules["banana"].runtime == 15.0
+    assert modules["cherry"].runtime == 20.0
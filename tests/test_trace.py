@@ -0,0 +1,35 @@
+from utils import trace
+
+
+def test_Tracer_disabled_records_counters_only():
+    tracer = trace.Tracer()
+    with tracer.span("phase"):
+        tracer.count("files_parsed")
+        tracer.count("files_parsed", 2)
+    assert tracer.spans == []
+    assert tracer.counters == {"files_parsed": 3}
+
+
+def test_Tracer_spans():
+    tracer = trace.Tracer()
+    tracer.enable()
+    with tracer.span("run"):
+        with tracer.span("trial", test="test_a.py"):
+            pass
+    names = [span[0] for span in tracer.spans]
+    # spans are recorded as they finish, innermost first
+    assert names == ["trial", "run"]
+    assert tracer.spans[0][4] == {"test": "test_a.py"}
+    assert tracer.totals()["run"] >= tracer.totals()["trial"]
+
+
+def test_Tracer_to_chrome_trace():
+    tracer = trace.Tracer()
+    tracer.enable()
+    with tracer.span("collect"):
+        tracer.count("files_walked", 10)
+    output = tracer.to_chrome_trace()
+    phases = [event["ph"] for event in output["traceEvents"]]
+    assert phases == ["X", "C"]
+    assert output["traceEvents"][0]["name"] == "collect"
+    assert output["traceEvents"][1]["args"] == {"files_walked": 10}
@@ -0,0 +1,74 @@
+import pytest
+import os
+
+import run
+import store
+import trend
+
+from dataclasses import asdict
+
+
+def store_run(results_store, commit, runtime, fails=0):
+    test = run.Test(project_path="project", test_path="project/tests/test_a.py", trials=4)
+    for trial in range(4):
+        test.record(trial >= fails, runtime)
+    test._calculate()
+    results = run.Results(tests={test.test_path: test})
+    results_store.record_run(asdict(results), commit=commit)
+
+
+@pytest.fixture
+def results_store(tmp_path):
+    with store.ResultsStore(str(tmp_path / "history.db")) as results_store:
+        yield results_store
+
+
+def test_CusumDetector_steady_series():
+    detector = trend.CusumDetector()
+    state = trend.SeriesState()
+    for i, value in enumerate([10.0, 10.2, 9.9, 10.1, 10.0, 9.8, 10.3, 10.1]):
+        assert detector.update(state, i, str(i), value, min_sigma=0.5) is None
+
+
+def test_CusumDetector_finds_start_of_shift():
+    detector = trend.CusumDetector()
+    state = trend.SeriesState()
+    shifts = []
+    for i, value in enumerate([10.0, 10.1, 9.9, 10.0, 10.0, 15.0, 15.1, 14.9, 15.0]):
+        shift = detector.update(state, i, str(i), value, min_sigma=0.5)
+        if shift:
+            shifts.append(shift)
+
+    assert len(shifts) == 1
+    before, after, start = shifts[0]
+    assert start == (5, "5")
+    assert round(before) == 10
+    assert round(after) == 15
+
+
+def test_TrendAnalyzer_runtime_changepoint(results_store):
+    for i, runtime in enumerate([100.0, 101.0, 99.0, 100.0, 150.0, 151.0]):
+        store_run(results_store, f"commit{i}", runtime)
+
+    changes = trend.TrendAnalyzer(results_store).update()
+    test_changes = [c for c in changes if c.kind == "test" and c.metric == "runtime"]
+    assert len(test_changes) == 1
+    assert test_changes[0].name == os.path.join("tests", "test_a.py")
+    assert test_changes[0].commit == "commit4"
+
+
+def test_TrendAnalyzer_is_incremental(results_store):
+    for i in range(4):
+        store_run(results_store, f"commit{i}", 100.0)
+    analyzer = trend.TrendAnalyzer(results_store)
+    assert analyzer.update() == []
+    # nothing new was stored, so there's nothing to look at
+    assert analyzer._new_points(4) == {}
+    assert analyzer.update() == []
+
+    # the flake rate shifts, and the saved state carries the baseline across updates
+    for i in range(4, 8):
+        store_run(results_store, f"commit{i}", 100.0, fails=2)
+    changes = analyzer.update()
+    assert [(c.metric, c.commit) for c in changes] == [("flake_rate", "commit4")]
+    assert analyzer.changepoints(kind="test") == changes
@@ -0,0 +1,82 @@
+import pytest
+import os
+import sys
+
+import watch
+import collect
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    (tmp_path / "app").mkdir()
+    (tmp_path / "tests").mkdir()
+    for name in ("app/apple.py", "app/banana.py", "tests/test_apple.py", "tests/test_fruit.py"):
+        (tmp_path / name).write_text("")
+
+    def map_tests_to_modules(path, exclude, tests):
+        return {
+            "apple": [str(tmp_path / "tests/test_apple.py"), str(tmp_path / "tests/test_fruit.py")],
+            "banana": [str(tmp_path / "tests/test_fruit.py")],
+        }
+
+    # keep the import parser's process pool out of these tests
+    monkeypatch.setattr(collect, "map_tests_to_modules", map_tests_to_modules)
+    return tmp_path
+
+
+def test_WatchSession_affected_tests(project):
+    session = watch.WatchSession(str(project), trials=1, exclude=[])
+    assert session.affected_tests([str(project / "app/banana.py")]) == {
+        str(project / "tests/test_fruit.py")
+    }
+    assert session.affected_tests([str(project / "app/apple.py")]) == {
+        str(project / "tests/test_apple.py"),
+        str(project / "tests/test_fruit.py"),
+    }
+    # a test file that changed affects itself, and nothing else
+    assert session.affected_tests([str(project / "tests/test_apple.py")]) == {
+        str(project / "tests/test_apple.py")
+    }
+
+
+def test_WatchSession_reindexes_new_files(project):
+    session = watch.WatchSession(str(project), trials=1, exclude=[])
+    new_test = project / "tests/test_cherry.py"
+    new_test.write_text("")
+    session.run = lambda tests: None
+    session.handle({str(new_test)})
+    assert str(new_test) in session.tests
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_InotifyWatcher(project):
+    watcher = watch.InotifyWatcher(str(project), exclude=[])
+    try:
+        (project / "app/apple.py").write_text("x = 1\n")
+        (project / "app/notes.txt").write_text("not python")
+        (project / "app/sub").mkdir()
+        assert watcher.changes(timeout=5) == {str(project / "app/apple.py")}
+
+        # new directories get watched too
+        (project / "app/sub/cherry.py").write_text("")
+        assert watcher.changes(timeout=5) == {str(project / "app/sub/cherry.py")}
+    finally:
+        watcher.close()
+
+
+def test_PollingWatcher(project):
+    watcher = watch.PollingWatcher(str(project), exclude=[])
+    assert watcher.changes(timeout=0) == set()
+    path = project / "app/apple.py"
+    path.write_text("x = 1\n")
+    os.utime(path, ns=(0, 0))
+    assert watcher.changes(timeout=0) == {str(path)}
+
+
+def test_evict_project_modules(project, monkeypatch):
+    module = type(sys)("watched_module")
+    module.__file__ = str(project / "app/apple.py")
+    monkeypatch.setitem(sys.modules, "watched_module", module)
+    watch._evict_project_modules(str(project))
+    assert "watched_module" not in sys.modules
+    assert "pytest" in sys.modules
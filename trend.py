@@ -0,0 +1,271 @@
+"""
+Finds the commits where a test's or module's runtime or flake rate shifted, by running a two-sided
+CUSUM changepoint detector over the per-run history kept in the results store. The detector is
+online: each series' state is saved alongside the history, so every update only reads the runs
+added since the last one and only touches the series those runs contain.
+"""
+
+import json
+import logging
+
+from typing import Dict, List, Tuple
+from dataclasses import dataclass, asdict
+
+from store import ResultsStore
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trend_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trend_state (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (kind, name, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changepoints (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    commit_sha TEXT,
+    before REAL NOT NULL,
+    after REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changepoints_by_series ON changepoints (kind, name, metric);
+"""
+
+# the smallest standard deviation we'll believe for each metric -- without a floor, a perfectly
+# steady series would flag the first microsecond of jitter as a shift
+MIN_SIGMA = {"runtime": 0.05, "flake_rate": 0.05}  # runtime is relative to the mean
+
+
+"""
+Represents a detected shift in one series: the first run of the shifted regime, and the series'
+mean before and after
+"""
+
+
+@dataclass
+class Changepoint:
+    kind: str  # test or module
+    name: str
+    metric: str  # runtime or flake_rate
+    run_id: int
+    commit: str
+    before: float
+    after: float
+
+
+"""
+Represents the running state of the CUSUM detector for one series. The baseline is tracked with
+Welford's algorithm, and each side of the detector remembers where its current excursion began,
+since that -- not the point where the alarm finally fires -- is where the shift happened.
+"""
+
+
+@dataclass
+class SeriesState:
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    high: float = 0.0
+    low: float = 0.0
+    high_start: Tuple = None  # (run_id, commit) where the upward excursion began
+    low_start: Tuple = None
+    high_values: Tuple = (0.0, 0)  # (sum, count) of values since the upward excursion began
+    low_values: Tuple = (0.0, 0)
+
+    def sigma(self, min_sigma: float) -> float:
+        variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+        return max(variance**0.5, min_sigma)
+
+    def add_to_baseline(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def restart(self, values: Tuple):
+        """
+        start a fresh baseline from the values seen since the changepoint
+        """
+        total, count = values
+        self.__init__()
+        self.count, self.mean = count, total / count
+
+
+"""
+Two-sided CUSUM: accumulates how far each new point sits above (or below) the baseline, in standard
+deviations less a drift allowance, and flags a shift once either sum passes the threshold
+"""
+
+
+class CusumDetector:
+    def __init__(self, threshold: float = 5.0, drift: float = 0.5, min_points: int = 3):
+        self.threshold = threshold  # h, in standard deviations
+        self.drift = drift  # k, the slack we give the series before accumulating evidence
+        self.min_points = min_points  # baseline points required before we start testing
+
+    def update(self, state: SeriesState, run_id: int, commit: str, value: float, min_sigma: float):
+        """
+        feed one new point through the detector, returning (before, after, start) if it confirms
+        a shift, or None
+        """
+        if state.count < self.min_points:
+            state.add_to_baseline(value)
+            return None
+
+        z = (value - state.mean) / state.sigma(min_sigma)
+        state.high, state.high_start, state.high_values = self._step(
+            state.high, z - self.drift, state.high_start, state.high_values, run_id, commit, value
+        )
+        state.low, state.low_start, state.low_values = self._step(
+            state.low, -z - self.drift, state.low_start, state.low_values, run_id, commit, value
+        )
+
+        for score, start, values in [
+            (state.high, state.high_start, state.high_values),
+            (state.low, state.low_start, state.low_values),
+        ]:
+            if score > self.threshold:
+                before, after = state.mean, values[0] / values[1]
+                state.restart(values)
+                return before, after, start
+
+        # nothing's drifting, so this point is just more evidence about the baseline
+        if state.high == 0.0 and state.low == 0.0:
+            state.add_to_baseline(value)
+        return None
+
+    def _step(self, score, increment, start, values, run_id, commit, value):
+        score = max(0.0, score + increment)
+        if score == 0.0:
+            return score, None, (0.0, 0)
+        if start is None:
+            start = (run_id, commit)
+        return score, start, (values[0] + value, values[1] + 1)
+
+
+"""
+Keeps the CUSUM state for every test and module series in the results store up to date
+"""
+
+
+class TrendAnalyzer:
+    def __init__(self, results_store: ResultsStore, detector: CusumDetector = None):
+        self.conn = results_store.conn
+        self.detector = detector or CusumDetector()
+        self.conn.executescript(SCHEMA)
+
+    def update(self) -> List[Changepoint]:
+        """
+        run every run stored since the last update through the detectors of the series they
+        touch, returning any newly found changepoints
+        """
+        last_run = self.conn.execute(
+            "SELECT value FROM trend_meta WHERE key = 'last_run_id'"
+        ).fetchone()
+        last_run = last_run[0] if last_run else 0
+
+        series = self._new_points(last_run)
+        if not series:
+            return []
+        states = self._load_states(series.keys())
+
+        found, latest = [], last_run
+        for key, points in series.items():
+            kind, name, metric = key
+            state = states.get(key) or SeriesState()
+            for run_id, commit, value in points:
+                latest = max(latest, run_id)
+                min_sigma = MIN_SIGMA[metric]
+                if metric == "runtime":
+                    min_sigma *= abs(state.mean) if state.count else abs(value)
+                shift = self.detector.update(state, run_id, commit, value, min_sigma)
+                if shift:
+                    before, after, (start_run, start_commit) = shift
+                    found.append(
+                        Changepoint(kind, name, metric, start_run, start_commit, before, after)
+                    )
+            states[key] = state
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO trend_state (kind, name, metric, state) VALUES (?, ?, ?, ?)",
+                [(*key, json.dumps(asdict(states[key]))) for key in series],
+            )
+            self.conn.executemany(
+                "INSERT INTO changepoints (kind, name, metric, run_id, commit_sha, before, after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(c.kind, c.name, c.metric, c.run_id, c.commit, c.before, c.after) for c in found],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO trend_meta (key, value) VALUES ('last_run_id', ?)",
+                (latest,),
+            )
+        logger.info(f"Updated {len(series)} series, found {len(found)} changepoint(s)")
+        return found
+
+    def changepoints(self, kind: str = None, name: str = None) -> List[Changepoint]:
+        """
+        every changepoint found so far, optionally just those of one test or module
+        """
+        query = (
+            "SELECT kind, name, metric, run_id, commit_sha, before, after FROM changepoints "
+            "WHERE (? IS NULL OR kind = ?) AND (? IS NULL OR name = ?) ORDER BY run_id"
+        )
+        rows = self.conn.execute(query, (kind, kind, name, name))
+        return [Changepoint(*row) for row in rows]
+
+    def _new_points(self, last_run: int) -> Dict[Tuple, List]:
+        series = {}
+        tests = self.conn.execute(
+            "SELECT t.path, r.id, r.commit_sha, tr.avg_runtime, tr.flakes, tr.trials "
+            "FROM test_runs tr JOIN tests t ON t.id = tr.test_id JOIN runs r ON r.id = tr.run_id "
+            "WHERE tr.run_id > ? ORDER BY tr.run_id",
+            (last_run,),
+        )
+        for path, run_id, commit, runtime, flakes, trials in tests:
+            series.setdefault(("test", path, "runtime"), []).append((run_id, commit, runtime))
+            if trials:
+                series.setdefault(("test", path, "flake_rate"), []).append(
+                    (run_id, commit, flakes / trials)
+                )
+        modules = self.conn.execute(
+            "SELECT m.module, r.id, r.commit_sha, m.runtime, m.flake_rate "
+            "FROM module_runs m JOIN runs r ON r.id = m.run_id "
+            "WHERE m.run_id > ? ORDER BY m.run_id",
+            (last_run,),
+        )
+        for name, run_id, commit, runtime, flake_rate in modules:
+            series.setdefault(("module", name, "runtime"), []).append((run_id, commit, runtime))
+            series.setdefault(("module", name, "flake_rate"), []).append(
+                (run_id, commit, flake_rate)
+            )
+        return series
+
+    def _load_states(self, keys) -> Dict[Tuple, SeriesState]:
+        states = {}
+        for key in keys:
+            row = self.conn.execute(
+                "SELECT state FROM trend_state WHERE kind = ? AND name = ? AND metric = ?", key
+            ).fetchone()
+            if row:
+                state = json.loads(row[0])
+                for side in ("high_start", "low_start", "high_values", "low_values"):
+                    if state[side] is not None:
+                        state[side] = tuple(state[side])
+                states[key] = SeriesState(**state)
+        return states
+
+
+def find_changepoints(results_store: ResultsStore) -> List[Changepoint]:
+    """
+    Wraps TrendAnalyzer for picking up whatever's been stored since the last time we looked
+    """
+    return TrendAnalyzer(results_store).update()
@@ -1,20 +1,26 @@
 import logging
 
-import coloredlogs
-
 from dataclasses import dataclass
 
 
-def init_logger():
+def init_logger(colored: bool = True):
+    """
+    coloredlogs takes longer to import than most of bubblewrap does to run an analysis, so quick
+    commands can ask for plain logs instead
+    """
     level = logging.INFO
     logger = logging.getLogger()
     logger.setLevel(level)
 
-    console = logging.StreamHandler()
-    console.setLevel(level)
-    logger.addHandler(console)
-
     log_format = "%(asctime)s [%(levelname)s] - %(message)s"
-    coloredlogs.install(level="INFO", logger=logger, fmt=log_format)
+    if colored:
+        import coloredlogs
+
+        coloredlogs.install(level="INFO", logger=logger, fmt=log_format)
+    else:
+        console = logging.StreamHandler()
+        console.setLevel(level)
+        console.setFormatter(logging.Formatter(log_format, "%Y-%m-%d %H:%M:%S"))
+        logger.addHandler(console)
 
     return logger
@@ -0,0 +1,106 @@
+"""
+Lightweight instrumentation for bubblewrap's own pipeline: timed spans around each phase and
+counters for the work done in them, exportable as a Chrome trace (chrome://tracing, Perfetto) so we
+can see where a run's time actually goes
+"""
+
+import os
+import json
+import time
+import threading
+
+from typing import Dict
+from contextlib import contextmanager, nullcontext
+
+"""
+Collects spans and counters for a run. Counters are always kept, since they're just additions; spans
+are only recorded once the tracer is enabled, so an untraced run pays for a single attribute check.
+"""
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.spans = []  # List[(name, start_us, duration_us, thread id, args)]
+        self.counters = {}  # Dict{name: value}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, args)
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def totals(self) -> Dict[str, float]:
+        """
+        total milliseconds spent in spans of each name
+        """
+        totals = {}
+        for name, _, duration, _, _ in self.spans:
+            totals[name] = totals.get(name, 0) + duration / 1000
+        return totals
+
+    def to_chrome_trace(self) -> Dict:
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start,
+                "dur": duration,
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+            for name, start, duration, tid, args in self.spans
+        ]
+        end = max((start + duration for _, start, duration, _, _ in self.spans), default=0)
+        events += [
+            {"name": name, "ph": "C", "ts": end, "pid": pid, "args": {name: value}}
+            for name, value in self.counters.items()
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": self.counters}
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def reset(self):
+        self.__init__()
+
+    @contextmanager
+    def _span(self, name: str, args: Dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            span = (
+                name,
+                (start - self._origin) * 1e6,
+                (end - start) * 1e6,
+                threading.get_ident(),
+                args,
+            )
+            with self._lock:
+                self.spans.append(span)
+
+
+# the process-wide tracer that the pipeline modules report to
+tracer = Tracer()
+
+
+def span(name: str, **args):
+    return tracer.span(name, **args)
+
+
+def count(name: str, value: float = 1):
+    tracer.count(name, value)
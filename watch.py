@@ -0,0 +1,306 @@
+"""
+Watch mode: keeps the collected tests, the module -> tests map and a pool of warm pytest workers
+alive, and whenever files are saved, re-runs trials for just the tests they affect, folding the new
+trials into the running flake rate and runtime stats for each test.
+
+File changes come from inotify where it's available (Linux), and from polling mtimes anywhere else.
+"""
+
+import os
+import sys
+import time
+import queue
+import errno
+import ctypes
+import select
+import struct
+import logging
+import ctypes.util
+
+from typing import Dict, Iterable, List, Set
+from multiprocessing import Pool
+
+import collect
+import resources
+
+from run import Test, Results
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 0.1  # seconds to wait for an editor to finish a burst of writes
+POLL_INTERVAL = 0.5
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+"""
+Reports the .py files saved under a directory tree via inotify, one watch per directory
+"""
+
+
+class InotifyWatcher:
+    def __init__(self, path: str, exclude: List[str]):
+        self.exclude = set(exclude)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}  # Dict{watch descriptor: directory}
+        self._watch_tree(path)
+
+    def close(self):
+        os.close(self.fd)
+
+    def changes(self, timeout: float = None) -> Set[str]:
+        """
+        blocks until something changes (or timeout passes), then gathers everything else that
+        changes within the debounce window
+        """
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        while ready:
+            changed |= self._read()
+            ready, _, _ = select.select([self.fd], [], [], DEBOUNCE)
+        return changed
+
+    def _read(self) -> Set[str]:
+        changed = set()
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset : offset + length].rstrip(b"\0").decode()
+            offset += length
+            if wd not in self.dirs:
+                continue
+            full_path = os.path.join(self.dirs[wd], name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(full_path)
+                    changed.update(collect.walk_tree(full_path, list(self.exclude)))
+            elif name.endswith(".py"):
+                changed.add(full_path)
+        return changed
+
+    def _watch_tree(self, path: str):
+        for dirpath, dirnames, _ in os.walk(path, topdown=True):
+            dirnames[:] = [dirname for dirname in dirnames if dirname not in self.exclude]
+            wd = self.libc.inotify_add_watch(self.fd, dirpath.encode(), WATCH_MASK)
+            if wd < 0:
+                # the directory may have vanished already -- anything else we want to hear about
+                if ctypes.get_errno() != errno.ENOENT:
+                    raise OSError(ctypes.get_errno(), f"couldn't watch {dirpath}")
+                continue
+            self.dirs[wd] = dirpath
+
+
+"""
+Reports the .py files saved under a directory tree by comparing mtimes -- the fallback for
+platforms without inotify
+"""
+
+
+class PollingWatcher:
+    def __init__(self, path: str, exclude: List[str]):
+        self.path = path
+        self.exclude = exclude
+        self.mtimes = self._scan()
+
+    def close(self):
+        pass
+
+    def changes(self, timeout: float = None) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            mtimes = self._scan()
+            changed = {
+                path
+                for path in mtimes.keys() | self.mtimes.keys()
+                if mtimes.get(path) != self.mtimes.get(path)
+            }
+            self.mtimes = mtimes
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+            time.sleep(POLL_INTERVAL)
+
+    def _scan(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in collect.walk_tree(self.path, self.exclude):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+
+def make_watcher(path: str, exclude: List[str]):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path, exclude)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(path, exclude)
+
+
+def _warm_up():
+    """
+    runs once in each worker -- paying for the pytest import here is what makes the workers warm
+    """
+    import pytest  # noqa: F401
+
+
+def _evict_project_modules(project_path: str):
+    """
+    a warm worker has the project's modules cached from the last trial, so drop them -- pytest
+    and third-party imports stay, the code we're watching gets imported fresh
+    """
+    root = os.path.abspath(project_path) + os.sep
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, "__file__", None)
+        if module_file and os.path.abspath(module_file).startswith(root):
+            del sys.modules[name]
+
+
+def _run_trial(job) -> (str, bool, float, int):
+    project_path, test_path = job
+    _evict_project_modules(project_path)
+    test = Test(project_path=project_path, test_path=test_path, trials=1)
+    passed, runtime = test.run_trial()
+    return test_path, passed, runtime, test.footprint
+
+
+"""
+Represents a watch session: the collection index, the warm worker pool, and every trial run so far
+"""
+
+
+class WatchSession:
+    def __init__(
+        self,
+        path: str,
+        trials: int,
+        exclude: List[str],
+        workers: int = None,
+        footprints_path: str = None,
+    ):
+        self.path = path
+        self.trials = trials
+        self.exclude = exclude
+        self.workers = workers or resources.usable_cpus()
+        self.footprints = resources.Footprints(path, footprints_path)
+        self.results = Results(tests={})
+        self.pool = None
+        self.reindex()
+
+    def reindex(self):
+        logger.info("Indexing tests and app modules in %s", self.path)
+        self.files = set(collect.walk_tree(self.path, self.exclude))
+        self.tests = set(collect.filter_tests(self.files))
+        self.module_map = collect.map_tests_to_modules(self.path, self.exclude, list(self.tests))
+
+    def affected_tests(self, changed: Iterable[str]) -> Set[str]:
+        """
+        maps changed files through the module -> tests map; a changed test file affects itself
+        """
+        affected = set()
+        for path in changed:
+            if path in self.tests:
+                affected.add(path)
+                continue
+            affected.update(self.module_map.get(collect._module_name_from_path(path), []))
+        return affected
+
+    def handle(self, changed: Set[str]):
+        # a file we've never seen (or one that's gone) changes the shape of the project
+        if any(path not in self.files or not os.path.exists(path) for path in changed):
+            self.reindex()
+
+        affected = self.affected_tests(changed)
+        if not affected:
+            return
+        logger.info(f"{len(changed)} file(s) changed, re-running {len(affected)} test(s)")
+        self.run(affected)
+
+    def run(self, tests: Iterable[str]):
+        if self.pool is None:
+            self.pool = Pool(processes=self.workers, initializer=_warm_up)
+        jobs = [(self.path, test) for test in sorted(tests) for _ in range(self.trials)]
+        for test_path, passed, runtime, footprint in self._packed(jobs):
+            if footprint:  # 0 where it couldn't be measured
+                self.footprints.update(test_path, footprint)
+            test = self.results.get(test_path)
+            if test is None:
+                test = Test(project_path=self.path, test_path=test_path)
+                self.results.put(test_path, test)
+            test.trials += 1
+            test.record(passed, runtime)
+        self.footprints.save()
+
+        for test_path in sorted(tests):
+            test = self.results.get(test_path)
+            test._calculate()
+            logger.info(
+                f"{test_path}: {test.trials} trial(s), flake rate {test.flake_rate:.2f}, "
+                f"avg runtime {test.avg_runtime:.1f} ms, last trial "
+                f"{'passed' if test.history[-1][0] == 'passed' else 'failed'}"
+            )
+
+    def _packed(self, jobs: List):
+        """
+        runs the jobs on the pool, only ever as many at once as there are workers free and memory
+        for (see resources.BinPacker), yielding their results as they finish
+        """
+        packer = resources.BinPacker(self.workers, resources.memory_budget())
+        pending = [(key, self.footprints.get(test_path)) for key, (_, test_path) in enumerate(jobs)]
+        finished = queue.Queue()
+        while pending or packer.running:
+            for key, _ in packer.take(pending):
+                self.pool.apply_async(
+                    _run_trial,
+                    (jobs[key],),
+                    callback=lambda result, key=key: finished.put((key, result)),
+                    error_callback=lambda error, key=key: finished.put((key, error)),
+                )
+            key, result = finished.get()
+            packer.finish(key)
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+
+def watch(
+    path: str, trials: int, exclude: List[str], workers: int = None, footprints_path: str = None
+):
+    """
+    re-runs affected tests on every save until interrupted
+    """
+    session = WatchSession(path, trials, exclude, workers, footprints_path)
+    watcher = make_watcher(path, exclude)
+    logger.info(f"Watching {path} with {session.workers} warm worker(s), Ctrl-C to stop")
+    try:
+        while True:
+            changed = watcher.changes()
+            if changed:
+                session.handle(changed)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+    finally:
+        watcher.close()
+        session.close()
+    return session.results